@@ -0,0 +1,47 @@
+from typing import Optional
+
+from docker.errors import DockerException
+from fastapi import APIRouter, HTTPException, Query
+
+from services.analytics import fleet_analytics, GROUP_BY_DIMENSIONS, ANALYTICS_MAX_GROUPS
+from services.docker import get_running_containers
+from services.executors import run_db, run_docker
+from services.risk import SEVERITIES
+
+router = APIRouter()
+
+ANALYTICS_SCOPES = ("all", "running")
+
+def _parse_list(value: Optional[str], allowed, name: str) -> list:
+    items = [item.strip().lower() for item in (value or "").split(",") if item.strip()]
+    unknown = [item for item in items if item not in allowed]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown {name}: {', '.join(unknown)}. Expected any of {', '.join(allowed)}.")
+    return items
+
+@router.get("/analytics/findings")
+async def fleet_findings(group_by: str = "package", severity: Optional[str] = None, fixable: Optional[bool] = None,
+                         scope: str = "all",
+                         limit: int = Query(50, ge=1, le=ANALYTICS_MAX_GROUPS)):
+    """
+    Aggregates the latest findings of every image (scope=all) or of the images of running
+    containers (scope=running), grouped by a comma-separated list of package, version,
+    vulnerability, severity, fixable and image, and optionally filtered by a comma-separated
+    list of severities and by fixability. Served from the in-memory columnar store.
+    scope=running answers 503 when Docker cannot be reached to list the containers.
+    """
+    if scope not in ANALYTICS_SCOPES:
+        raise HTTPException(status_code=400, detail=f"Unknown scope '{scope}'. Expected one of {', '.join(ANALYTICS_SCOPES)}.")
+    dimensions = _parse_list(group_by, GROUP_BY_DIMENSIONS, "group_by dimension(s)")
+    if not dimensions:
+        raise HTTPException(status_code=400, detail="group_by needs at least one dimension.")
+    severities = _parse_list(severity, SEVERITIES, "severities")
+    image_ids = None
+    if scope == "running":
+        try:
+            running = await run_docker(get_running_containers)
+        except DockerException as e:
+            print(f"Error getting running containers for analytics: {e}")
+            raise HTTPException(status_code=503, detail="Docker is unreachable, so the running containers are unknown; use scope=all.")
+        image_ids = {container.image_details.short_id for container in running}
+    return await run_db(fleet_analytics.query, list(dict.fromkeys(dimensions)), severities, fixable, image_ids, limit)
@@ -0,0 +1,30 @@
+import asyncio
+
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+
+from services.events import event_broker
+
+router = APIRouter()
+
+# Idle connections get a ping this often, so dead ones are noticed and unsubscribed
+EVENT_PING_SECONDS = 30
+
+@router.websocket("/events")
+async def dashboard_events(websocket: WebSocket):
+    """
+    Pushes dashboard changes as JSON messages: scan_started, scan_progress, scan_finished, scan_failed,
+    container_started, container_stopped, and resync (reload the page; events were dropped).
+    """
+    await websocket.accept()
+    queue = event_broker.subscribe()
+    try:
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=EVENT_PING_SECONDS)
+            except asyncio.TimeoutError:
+                event = {"type": "ping"}
+            await websocket.send_json(event)
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        event_broker.unsubscribe(queue)
@@ -0,0 +1,35 @@
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+
+from database import get_db
+from services.export import stream_findings, export_scope_exists, export_filename, EXPORT_FORMATS
+
+router = APIRouter()
+
+def _export_response(db: Session, scope: str, key, format: str, not_found: str) -> StreamingResponse:
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown format '{format}'. Expected one of {', '.join(EXPORT_FORMATS)}.")
+    if not export_scope_exists(db, scope, key):
+        raise HTTPException(status_code=404, detail=not_found)
+    # Rows are written as they come off the cursor; nothing is collected in memory first
+    return StreamingResponse(
+        stream_findings(scope, key, format),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{export_filename(scope, key, format)}"'},
+    )
+
+@router.get("/export/scans/{scan_id}")
+def export_scan_findings(scan_id: int, format: str = "ndjson", db: Session = Depends(get_db)):
+    """Streams one scan's findings as NDJSON (default) or CSV, one row per finding."""
+    return _export_response(db, "scan", scan_id, format, f"Scan with ID {scan_id} not found.")
+
+@router.get("/export/images/{image_id}")
+def export_image_findings(image_id: str, format: str = "ndjson", db: Session = Depends(get_db)):
+    """Streams the findings of every completed scan of an image (its scan history)."""
+    return _export_response(db, "image", image_id, format, f"Image with ID {image_id} not found in database.")
+
+@router.get("/export/latest")
+def export_latest_findings(format: str = "ndjson", db: Session = Depends(get_db)):
+    """Streams the findings of each image's latest completed scan, i.e. the fleet's current exposure."""
+    return _export_response(db, "latest", None, format, "")
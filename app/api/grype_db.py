@@ -0,0 +1,23 @@
+from fastapi import APIRouter, HTTPException
+
+from services.executors import run_maintenance
+from services.grype_db import grype_db_manager
+
+router = APIRouter()
+
+@router.get("/grype-db")
+def get_grype_db_status():
+    """Returns the Grype DB build scans are currently pinned to and the last refresh outcome."""
+    return grype_db_manager.status()
+
+@router.post("/grype-db/refresh")
+async def refresh_grype_db(force: bool = False):
+    """
+    Refreshes the Grype DB now (from the configured archive, or upstream if allowed).
+    Waits for running scans to finish before swapping the DB.
+    """
+    try:
+        await run_maintenance(grype_db_manager.refresh, force)
+    except FileNotFoundError:
+        raise HTTPException(status_code=500, detail="Scanner tool (Grype) not found on server.")
+    return grype_db_manager.status()
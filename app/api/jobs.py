@@ -0,0 +1,58 @@
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+
+from database import get_db
+from models.database import Image as DBImage
+from models.schemas import ScanJobRequest, ScanJobSchema
+from services.executors import run_db
+from services.job_queue import enqueue_job, get_job, list_jobs, cancel_job
+
+router = APIRouter()
+
+JOB_KINDS = ("scan", "rematch")
+
+def _enqueue(db: Session, request: ScanJobRequest):
+    if not db.query(DBImage.id).filter(DBImage.id == request.image_id).first():
+        return None
+    job = enqueue_job(db, request.image_id, kind=request.kind, force=request.force,
+                      timeout=request.timeout, priority=request.priority)
+    return ScanJobSchema.model_validate(job)
+
+@router.post("/jobs", response_model=ScanJobSchema)
+async def create_scan_job(request: ScanJobRequest):
+    """
+    Queues a scan (or re-match) for the scan workers. An image already queued or being
+    scanned returns its existing job.
+    """
+    if request.kind not in JOB_KINDS:
+        raise HTTPException(status_code=400, detail=f"Unknown job kind '{request.kind}'. Expected one of {', '.join(JOB_KINDS)}.")
+    job = await run_db(_enqueue, request)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Image with ID {request.image_id} not found in database.")
+    return job
+
+@router.get("/jobs/{job_id}", response_model=ScanJobSchema)
+def get_scan_job(job_id: int, db: Session = Depends(get_db)):
+    job = get_job(db, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Job with ID {job_id} not found.")
+    return job
+
+@router.post("/jobs/{job_id}/cancel", response_model=ScanJobSchema)
+def cancel_scan_job(job_id: int, db: Session = Depends(get_db)):
+    """
+    Cancels a job: a queued job is closed right away, a running scan is stopped by its worker
+    within a few seconds (re-matches run to the end). Finished jobs answer 409.
+    """
+    job = get_job(db, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Job with ID {job_id} not found.")
+    if job.status not in ("queued", "claimed"):
+        raise HTTPException(status_code=409, detail=f"Job {job_id} is not active (status: {job.status}).")
+    return cancel_job(db, job_id)
+
+@router.get("/jobs", response_model=List[ScanJobSchema])
+def list_scan_jobs(status: Optional[str] = None, limit: int = 100, db: Session = Depends(get_db)):
+    """Lists the most recent jobs, optionally only those with the given status."""
+    return list_jobs(db, status, limit)
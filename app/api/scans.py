@@ -1,114 +1,189 @@
+import asyncio
+import time
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session, joinedload
-from typing import List
-from datetime import datetime # Added datetime
+from fastapi.responses import JSONResponse
+from sqlalchemy.orm import Session
+from typing import List, Optional
 
 from database import get_db
-from models.schemas import ScanResult, VulnerabilityModel, VulnerabilityCountsSchema # Added VulnerabilityCountsSchema
-from models.database import Image as DBImage, Scan as DBScan, Vulnerability as DBVulnerability, VulnerabilityCounts as DBVulnerabilityCounts # Added DB models
-from services.scanner import scan_image as service_scan_image # Renamed to avoid conflict
-from services.image_analyzer import ContainerAnalyzer # Added ContainerAnalyzer import
-from logger import logger
+from models.schemas import ScanResult, VulnerabilityModel, VulnerabilityCountsSchema, BulkScanRequest, ImageAnalysis # Added VulnerabilityCountsSchema
+from models.database import Image as DBImage, Scan as DBScan, VulnerabilityCounts as DBVulnerabilityCounts # Added DB models
+from services.executors import run_scan, run_bulk, run_db
+from services.scan_pipeline import run_image_scan, resume_scan, lookup_image_analysis, run_image_analysis, ScanPipelineError
+from services.rematch import rematch_image, rematch_fleet
+from services.bulk_scan import run_bulk_scan
+from services.scanner import cancel_scan, get_scan_status, summarized_severities, ScanTimedOut
+from services.job_queue import enqueue_job, get_job, cancel_job, active_scan_job, SCAN_EXECUTION, QUEUE_WAIT_SECONDS
+from services.serialization import json_response, load_vulnerabilities
+from services.view_logic import get_scan_view, scan_view_needs_vulnerabilities, select_scan_fields, SCAN_VIEWS, SCAN_FIELDS
 # from app.models.database import Image as DBImage, Scan as DBScan # SQLAlchemy models
 # from app.services.scanner import scan_image as service_scan_image
 # Schemas for listing scans, vulnerabilities, counts will be needed
 
 router = APIRouter()
 
-@router.post("/scan/{image_id}", response_model=ScanResult)
-def trigger_image_scan(image_id: str, db: Session = Depends(get_db)):
-    """Triggers a new vulnerability scan and image analysis for the given image ID."""
-    db_image = db.query(DBImage).filter(DBImage.id == image_id).first()
-    if not db_image:
-        raise HTTPException(status_code=404, detail=f"Image with ID '{image_id}' not found in database.")
-    
-    image_name_for_analysis = f"{db_image.name}:{db_image.tag}" if db_image.tag else db_image.name
+def _parse_scan_view(view: str, fields: Optional[str]) -> Optional[list]:
+    # Validates the `view`/`fields` parameters shared by the scan endpoints; returns the field list
+    if view not in SCAN_VIEWS:
+        raise HTTPException(status_code=400, detail=f"Unknown view '{view}'. Expected one of {', '.join(SCAN_VIEWS)}.")
+    if not fields:
+        return None
+    field_list = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in field_list if field not in SCAN_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown field(s): {', '.join(unknown)}.")
+    return field_list
+
+async def _shape_scan_result(summary, view: str, field_list: Optional[list]):
+    # Pipelines return summaries; the findings are only loaded when the caller asked for them
+    if scan_view_needs_vulnerabilities(view, field_list):
+        return json_response(await run_db(get_scan_view, summary.scan_id, view, field_list))
+    return json_response(select_scan_fields(summary, field_list))
+
+@router.post("/scan/{image_id}", response_model=None, responses={200: {"model": ScanResult}})
+async def trigger_image_scan(image_id: str, force: bool = False, timeout: Optional[float] = None,
+                             view: str = "full", fields: Optional[str] = None):
+    """
+    Triggers a new vulnerability scan and image analysis for the given image ID.
+    A completed scan of the same image content against the current Grype DB build is
+    returned instead of rescanning, unless force=true.
+    timeout (seconds) overrides GRYPE_TIMEOUT_SECONDS for this scan's Grype run.
+    view=summary returns counts and analysis flags without the vulnerability list;
+    fields=scan_id,scan_status,... returns only the listed fields.
+    With SCAN_EXECUTION=queue the scan is queued for the scan workers and the request waits for it,
+    up to `timeout` seconds (QUEUE_WAIT_SECONDS without one); a scan still running then answers
+    202 with the job to poll at /api/jobs/{job_id}.
+    """
+    field_list = _parse_scan_view(view, fields)
+    if SCAN_EXECUTION == "queue":
+        return await _scan_via_queue(image_id, force, timeout, view, field_list)
+    # The whole pipeline (Docker export, analysis, Grype, ingest) blocks, so it runs on the
+    # bounded scan executor with its own session instead of on the event loop.
+    try:
+        summary = await run_scan(run_image_scan, image_id, force=force, timeout=timeout)
+    except ScanPipelineError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    return await _shape_scan_result(summary, view, field_list)
+
+# Queue mode: how often a waiting request checks on its job
+JOB_POLL_SECONDS = 1.0
+
+def _enqueue_scan_job(db: Session, image_id: str, force: bool, timeout: Optional[float]) -> Optional[int]:
+    if not db.query(DBImage.id).filter(DBImage.id == image_id).first():
+        return None
+    return enqueue_job(db, image_id, force=force, timeout=int(timeout) if timeout else None, priority=1).id
+
+def _job_state(db: Session, job_id: int):
+    job = get_job(db, job_id)
+    return job.status, job.scan_id, job.error
+
+async def _scan_via_queue(image_id: str, force: bool, timeout: Optional[float], view: str, field_list: Optional[list]):
+    # Interactive scans jump ahead of queued background work; the request waits for a worker to finish it
+    job_id = await run_db(_enqueue_scan_job, image_id, force, timeout)
+    if job_id is None:
+        raise HTTPException(status_code=404, detail=f"Image with ID {image_id} not found in database.")
+    deadline = time.monotonic() + (timeout or QUEUE_WAIT_SECONDS)
+    while True:
+        status, scan_id, error = await run_db(_job_state, job_id)
+        if status == "done":
+            result = await run_db(get_scan_view, scan_id, view, field_list)
+            if result is None:
+                raise HTTPException(status_code=500, detail=f"Scan job {job_id} finished without a scan.")
+            return json_response(result)
+        if status == "failed":
+            raise HTTPException(status_code=500, detail=error or f"Scan job {job_id} failed.")
+        if status == "cancelled":
+            raise HTTPException(status_code=409, detail=error or f"Scan job {job_id} was cancelled.")
+        if time.monotonic() >= deadline:
+            # The job keeps running on its worker; the caller follows it from here
+            return JSONResponse(status_code=202, headers={"Location": f"/api/jobs/{job_id}"},
+                                content={"job_id": job_id, "image_id": image_id, "status": status})
+        await asyncio.sleep(JOB_POLL_SECONDS)
+
+@router.post("/scans/bulk")
+async def trigger_bulk_scan(request: BulkScanRequest):
+    """
+    Scans many images in one sweep (all known images when image_ids is omitted).
+    Exports and Grype matching run as pipelined stages with separate concurrency limits.
+    The summary reports throughput; pipelined=false runs the serial flow as a baseline.
+    """
+    return await run_bulk(run_bulk_scan, request.image_ids, force=request.force, pipelined=request.pipelined)
+
+@router.post("/scans/{scan_id}/cancel")
+async def cancel_running_scan(scan_id: int):
+    """
+    Cancels a running scan and marks it cancelled. A Grype run is killed, an export in progress stops at its
+    next chunk, and other stages (analysis, cataloging) stop at the end of the stage they are in.
+    A scan run by a scan worker (SCAN_EXECUTION=queue) is cancelled through its job, which the worker
+    checks every few seconds.
+    """
+    db_scan_status = await run_db(get_scan_status, scan_id)
+    if db_scan_status is None:
+        raise HTTPException(status_code=404, detail=f"Scan with ID {scan_id} not found.")
+    if db_scan_status == "running" and cancel_scan(scan_id):
+        return {"scan_id": scan_id, "status": "cancelling"}
+    job_id = await run_db(_cancel_scan_job, scan_id) if db_scan_status == "running" else None
+    if job_id is None:
+        raise HTTPException(status_code=409, detail=f"Scan {scan_id} is not running (status: {db_scan_status}).")
+    return {"scan_id": scan_id, "status": "cancelling", "job_id": job_id}
+
+def _cancel_scan_job(db: Session, scan_id: int) -> Optional[int]:
+    # The worker job running a scan: the image's claimed scan job (workers run one per image at a time)
+    image_id = db.query(DBScan.image_id).filter(DBScan.id == scan_id).scalar()
+    job = active_scan_job(db, image_id) if image_id else None
+    if job is None:
+        return None
+    cancel_job(db, job.id)
+    return job.id
+
+@router.post("/scans/{scan_id}/resume", response_model=None, responses={200: {"model": ScanResult}})
+async def resume_interrupted_scan(scan_id: int, view: str = "full", fields: Optional[str] = None):
+    """Continues an interrupted scan from its last checkpoint. Supports the same view/fields as a scan."""
+    field_list = _parse_scan_view(view, fields)
+    try:
+        summary = await run_scan(resume_scan, scan_id)
+    except ScanPipelineError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    return await _shape_scan_result(summary, view, field_list)
+
+@router.post("/rematch")
+async def trigger_fleet_rematch(force: bool = False):
+    """
+    Re-matches the stored package inventory of every image against the current Grype DB.
+    Only images whose findings changed get a new scan.
+    """
+    try:
+        return await run_scan(rematch_fleet, force=force)
+    except ScanPipelineError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
 
-    analysis_temp_dir_manager = None # Initialize to ensure it's defined for finally block
+@router.post("/rematch/{image_id}")
+async def trigger_image_rematch(image_id: str, force: bool = False):
+    """Re-matches one image's stored package inventory against the current Grype DB."""
     try:
-        # 1. Perform Image Analysis (Rootless, Shellless, Distroless)
-        # print(f"Attempting to analyze image characteristics: {image_name_for_analysis} (DB ID: {image_id})")
-        logger.debug(f"Attempting to analyze image characteristics: {image_name_for_analysis} (DB ID: {image_id})")
-        analyzer = ContainerAnalyzer()
-        # analyze_image now returns a dict including _temp_dir_manager_obj and image_tar_path
-        analysis_results = analyzer.analyze_image(image_name_for_analysis)
-        
-        analysis_temp_dir_manager = analysis_results.get("_temp_dir_manager_obj")
-        image_tar_path_for_grype = analysis_results.get("image_tar_path")
-
-        # Save boolean results and other analysis details
-        db_image.is_rootless = analysis_results.get("is_rootless")
-        db_image.is_shellless = analysis_results.get("is_shellless")
-        db_image.is_distroless = analysis_results.get("is_distroless")
-        db_image.image_analysis_error = analysis_results.get("error")
-        db_image.last_analyzed_at = datetime.utcnow()
-        # Save specific paths found (or None)
-        db_image.found_shell_path = analysis_results.get("details", {}).get("found_shell_path")
-        db_image.found_package_manager_path = analysis_results.get("details", {}).get("found_package_manager_path")
-        # Save distribution info
-        db_image.distribution_info = analysis_results.get("details", {}).get("distribution_info")
-        
-        db.commit()
-        # print(f"Image analysis results for {image_id} saved to DB.")
-        logger.debug(f"Image analysis results for {image_id} saved to DB.")
-
-        # Check if image analysis itself failed critically before proceeding to Grype
-        if analysis_results.get("error"):
-            # If there was an error in analysis that prevented getting tar path, we can't scan with Grype
-            print(f"Image analysis for {image_id} encountered an error: {analysis_results.get('error')}. Skipping Grype scan.")
-            # We still want to return something or signal that scan part didn't happen.
-            # The current structure expects ScanResult or HTTPException from this endpoint.
-            # Raising an HTTPException here because the primary goal (scan) can't be fully achieved if tar path is missing.
-            if not image_tar_path_for_grype:
-                raise HTTPException(status_code=500, detail=f"Image analysis failed to produce a scan target: {analysis_results.get('error')}")
-            # If tar path exists but there was some other non-critical analysis error, we might still try to scan.
-            # For now, let's assume if analysis_results["error"] is set, we should report it prominently.
-
-        if not image_tar_path_for_grype:
-            # This case should ideally be caught by analysis_results.get("error") check above,
-            # but as a safeguard:
-            print(f"No image tar path found for {image_id} after analysis. Cannot proceed with Grype scan.")
-            raise HTTPException(status_code=500, detail="Image analysis did not yield a tarball for scanning.")
-
-        # 2. Perform Vulnerability Scan (Grype)
-        # Pass image_tar_path_for_grype to service_scan_image
-        # The image_name_for_analysis is still useful for context/logging within service_scan_image if needed,
-        # but Grype will use the tarball.
-        # print(f"Attempting to scan image with Grype using tarball: {image_tar_path_for_grype} (Original name: {image_name_for_analysis}, DB ID: {image_id})")
-        logger.debug(f"Attempting to scan image with Grype using tarball: {image_tar_path_for_grype} (Original name: {image_name_for_analysis}, DB ID: {image_id})")
-        scan_result_data = service_scan_image(
-            image_tar_path=image_tar_path_for_grype, 
-            image_id=db_image.id, 
-            db=db,
-            image_name_with_tag=image_name_for_analysis # Pass for logging/context if needed
-        )
-        return scan_result_data
-
-    except FileNotFoundError as e_grype_fnf: 
-        print(f"Grype command not found during scan trigger: {e_grype_fnf}")
-        db.rollback() # Rollback any potential partial DB changes from analysis if Grype setup fails
+        return await run_scan(rematch_image, image_id, force=force)
+    except ScanPipelineError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    except ScanTimedOut as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except FileNotFoundError:
         raise HTTPException(status_code=500, detail="Scanner tool (Grype) not found on server.")
-    except HTTPException: # Re-raise HTTPExceptions directly
-        raise
-    except Exception as e_main:
-        db.rollback() # Rollback any DB changes if an unexpected error occurs
-        print(f"Error during scan trigger for image {image_id} ({image_name_for_analysis}): {e_main}")
-        # Update image_analysis_error in DB if it was an error during analysis part before scan was called
-        if 'analyzer' in locals() and not isinstance(e_main, FileNotFoundError): # Avoid overwriting specific Grype FNF error
-            try:
-                if db_image: # Ensure db_image is available
-                    db_image.image_analysis_error = f"Outer scope error: {str(e_main)}"
-                    db.commit()
-            except Exception as e_commit_err:
-                db.rollback()
-                print(f"Failed to commit outer scope analysis error to DB: {e_commit_err}")
-        raise HTTPException(status_code=500, detail=f"Failed to process or scan image {image_name_for_analysis}. Error: {str(e_main)}")
-    finally:
-        # Ensure the temporary directory from image analysis is cleaned up
-        if analysis_temp_dir_manager:
-            # print(f"Cleaning up temporary directory for image analysis of {image_name_for_analysis}.")
-            logger.debug(f"Cleaning up temporary directory for image analysis of {image_name_for_analysis}.")
-            analysis_temp_dir_manager.cleanup()
+
+@router.post("/analyze/{image_id}", response_model=ImageAnalysis)
+async def trigger_image_analysis(image_id: str, force: bool = False):
+    """
+    Rootless, shellless and distroless verdicts for an image, without a Grype scan (e.g. for admission checks).
+    Answered from the image inspect and stored results for the same content when possible (source=cached
+    or shared); otherwise the image is exported and analyzed (source=analyzed), as is any image with force=true.
+    """
+    try:
+        # The cheap tiers run on the DB pool, so a known image never waits behind running scans
+        analysis, details = await run_db(lookup_image_analysis, image_id, force)
+        if analysis is None:
+            analysis = await run_scan(run_image_analysis, image_id, force=force, details=details)
+    except ScanPipelineError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    return analysis
 
 @router.get("/scans") # Add response_model for List[ScanOverviewSchema] or similar
 def list_all_scans(db: Session = Depends(get_db)):
@@ -116,55 +191,19 @@ def list_all_scans(db: Session = Depends(get_db)):
     # return scans # Convert to Pydantic models
     raise HTTPException(status_code=501, detail="Endpoint not fully implemented")
 
-@router.get("/scans/{scan_id}", response_model=ScanResult)
-def get_scan_details(scan_id: int, db: Session = Depends(get_db)):
-    """Retrieves detailed information for a specific scan, including vulnerabilities and counts."""
-    db_scan = (
-        db.query(DBScan)
-        .options(
-            joinedload(DBScan.image), # Eager load image details
-            joinedload(DBScan.vulnerabilities), # Eager load vulnerabilities
-            joinedload(DBScan.counts) # Eager load vulnerability counts
-        )
-        .filter(DBScan.id == scan_id)
-        .first()
-    )
-
-    if not db_scan:
+@router.get("/scans/{scan_id}", response_model=None, responses={200: {"model": ScanResult}})
+def get_scan_details(scan_id: int, view: str = "full", fields: Optional[str] = None, db: Session = Depends(get_db)):
+    """
+    Retrieves detailed information for a specific scan, including vulnerabilities and counts.
+    view=summary leaves out the vulnerability list; fields= selects individual fields.
+    """
+    field_list = _parse_scan_view(view, fields)
+    result = get_scan_view(db, scan_id, view, field_list)
+    if result is None:
         raise HTTPException(status_code=404, detail=f"Scan with ID {scan_id} not found.")
+    return json_response(result)
 
-    if not db_scan.image:
-        # This case should ideally not happen if DB integrity is maintained
-        raise HTTPException(status_code=500, detail=f"Image data missing for scan ID {scan_id}.")
-
-    # Convert SQLAlchemy Vulnerability models to Pydantic VulnerabilityModel
-    pydantic_vulnerabilities = [
-        VulnerabilityModel.from_orm(v) for v in db_scan.vulnerabilities
-    ]
-
-    # Prepare counts
-    critical_count = db_scan.counts.critical if db_scan.counts else 0
-    high_count = db_scan.counts.high if db_scan.counts else 0
-    medium_count = db_scan.counts.medium if db_scan.counts else 0
-    low_count = db_scan.counts.low if db_scan.counts else 0
-    negligible_count = db_scan.counts.negligible if db_scan.counts else 0
-    unknown_count = db_scan.counts.unknown if db_scan.counts else 0
-
-    return ScanResult(
-        scan_id=db_scan.id,
-        image_id=db_scan.image_id, # This is the short image ID from DBImage.id
-        scan_time=db_scan.scan_time,
-        scan_status=db_scan.scan_status,
-        vulnerabilities=pydantic_vulnerabilities,
-        critical_count=critical_count,
-        high_count=high_count,
-        medium_count=medium_count,
-        low_count=low_count,
-        negligible_count=negligible_count,
-        unknown_count=unknown_count,
-    )
-
-@router.get("/vulnerabilities/{scan_id}", response_model=List[VulnerabilityModel])
+@router.get("/vulnerabilities/{scan_id}", response_model=None, responses={200: {"model": List[VulnerabilityModel]}})
 def get_vulnerabilities_for_scan(scan_id: int, db: Session = Depends(get_db)):
     """Retrieves a list of vulnerabilities for a specific scan."""
     # Check if scan exists first to give a 404 if scan_id is invalid
@@ -172,15 +211,13 @@ def get_vulnerabilities_for_scan(scan_id: int, db: Session = Depends(get_db)):
     if not db_scan:
         raise HTTPException(status_code=404, detail=f"Scan with ID {scan_id} not found.")
 
-    # Fetch vulnerabilities associated with the scan
-    vulnerabilities = (
-        db.query(DBVulnerability)
-        .filter(DBVulnerability.scan_id == scan_id)
-        .all()
-    )
-    
-    # Convert to Pydantic models
-    return [VulnerabilityModel.from_orm(v) for v in vulnerabilities]
+    # Fetch the scan's findings as column tuples, validated and encoded in one pass each
+    response = json_response(load_vulnerabilities(db, scan_id))
+    summarized = summarized_severities(db_scan.detail_min_severity)
+    if summarized:
+        # These severities are counted in the scan's counts but have no rows in this list
+        response.headers["X-Summarized-Severities"] = ",".join(summarized)
+    return response
 
 @router.get("/vulnerability-counts/{scan_id}", response_model=VulnerabilityCountsSchema)
 def get_vulnerability_counts(scan_id: int, db: Session = Depends(get_db)):
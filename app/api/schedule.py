@@ -0,0 +1,17 @@
+from fastapi import APIRouter
+
+from services.executors import run_maintenance
+from services.scheduler import fleet_scheduler
+
+router = APIRouter()
+
+@router.get("/schedule")
+def get_schedule_status():
+    """Returns the scan scheduler's settings and the outcome of its last planning pass."""
+    return fleet_scheduler.status()
+
+@router.post("/schedule/run")
+async def run_schedule_now():
+    """Plans the fleet now and dispatches due images into the free scheduler slots."""
+    result = await run_maintenance(fleet_scheduler.run_once)
+    return {**result, **fleet_scheduler.status()}
@@ -0,0 +1,34 @@
+from docker.errors import DockerException
+from fastapi import APIRouter, HTTPException, Query
+
+from models.schemas import FindingSearchResponse
+from services.docker import get_running_containers
+from services.executors import run_db, run_docker
+from services.search import search_findings, SEARCH_MAX_LIMIT
+
+router = APIRouter()
+
+@router.get("/search", response_model=FindingSearchResponse)
+async def search(q: str = Query(..., min_length=2), limit: int = Query(20, ge=1, le=SEARCH_MAX_LIMIT),
+                 offset: int = Query(0, ge=0), containers: bool = True):
+    """
+    Full-text search over every finding ever stored (CVE ID, package name, version, description).
+    Returns the matching images, most recently seen first, and the running containers using them
+    (left empty when Docker is unreachable).
+    """
+    result = await run_db(search_findings, q, limit, offset)
+    if result is None:
+        raise HTTPException(status_code=400, detail="Search query has no terms.")
+    if containers and result.results:
+        try:
+            running = await run_docker(get_running_containers)
+        except DockerException as e:
+            # The findings come from the database; only the container names need Docker
+            print(f"Error getting running containers for search results: {e}")
+            running = []
+        by_image = {}
+        for container in running:
+            by_image.setdefault(container.image_details.short_id, []).append(container.name)
+        for image in result.results:
+            image.containers = by_image.get(image.image_id, [])
+    return result
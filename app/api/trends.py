@@ -0,0 +1,20 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+
+from database import get_db
+from models.database import Image as DBImage
+from services.trends import get_trend, FLEET_KEY, TREND_MAX_DAYS
+
+router = APIRouter()
+
+@router.get("/trends/fleet")
+def get_fleet_trend(days: int = Query(90, ge=1, le=TREND_MAX_DAYS), db: Session = Depends(get_db)):
+    """Daily fleet-wide finding counts by severity (and fixable findings), oldest day first."""
+    return {"scope": "fleet", "days": days, "buckets": get_trend(db, FLEET_KEY, days)}
+
+@router.get("/trends/images/{image_id}")
+def get_image_trend(image_id: str, days: int = Query(90, ge=1, le=TREND_MAX_DAYS), db: Session = Depends(get_db)):
+    """Daily finding counts of one image, taken from its latest completed scan of each day."""
+    if not db.query(DBImage.id).filter(DBImage.id == image_id).first():
+        raise HTTPException(status_code=404, detail=f"Image with ID {image_id} not found in database.")
+    return {"scope": "image", "image_id": image_id, "days": days, "buckets": get_trend(db, image_id, days)}
@@ -1,6 +1,7 @@
 import os
+from contextlib import contextmanager
 from pathlib import Path
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.orm import sessionmaker, Session # Added Session for type hinting
 from sqlalchemy.ext.declarative import declarative_base
 from models.database import Base # Corrected import: removed grypeui.
@@ -17,8 +18,11 @@ DB_DIR = PROJECT_ROOT / "data" # This will be /app/data in the container
 SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", f"sqlite:///{DB_DIR}/vuln_scanner.db")
 print(f"GrypeUI DB: Using database URL: {SQLALCHEMY_DATABASE_URL}")
 
+# SQLite: shared across threads, and waits up to 30s for other processes' (scan workers') write locks.
+# Workers on other hosts need a server database (e.g. a postgresql:// DATABASE_URL).
+_connect_args = {"check_same_thread": False, "timeout": 30} if SQLALCHEMY_DATABASE_URL.startswith("sqlite") else {}
 engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False} # check_same_thread for SQLite
+    SQLALCHEMY_DATABASE_URL, connect_args=_connect_args
 )
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -30,11 +34,89 @@ def init_db():
     # No need to create it here.
         
     Base.metadata.create_all(bind=engine)
+    _add_missing_columns()
+    _create_search_index()
     print(f"Database initialized with tables at {SQLALCHEMY_DATABASE_URL}")
 
+def _add_missing_columns():
+    # create_all only creates missing tables. Columns added to existing models later are
+    # added here so existing databases keep working (new columns are always nullable).
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+                print(f"Added column {table.name}.{column.name} to existing database")
+            existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing_indexes:
+                    index.create(conn)
+
+# Full-text index over the search history (image_findings), kept current by triggers so every
+# upsert updates it. SQLite only (FTS5); other databases search without it.
+SEARCH_INDEX_TABLE = "findings_fts"
+_SEARCH_COLUMNS = "vulnerability_id, package_name, installed_version, description"
+_SEARCH_TRIGGERS = {
+    "findings_fts_insert": f"""AFTER INSERT ON image_findings BEGIN
+        INSERT INTO findings_fts(rowid, {_SEARCH_COLUMNS})
+        VALUES (new.id, new.vulnerability_id, new.package_name, new.installed_version, new.description);
+    END""",
+    "findings_fts_delete": f"""AFTER DELETE ON image_findings BEGIN
+        INSERT INTO findings_fts(findings_fts, rowid, {_SEARCH_COLUMNS})
+        VALUES ('delete', old.id, old.vulnerability_id, old.package_name, old.installed_version, old.description);
+    END""",
+    # Re-seen findings only move last_seen and friends; the indexed text rarely changes
+    "findings_fts_update": f"""AFTER UPDATE OF {_SEARCH_COLUMNS} ON image_findings
+        WHEN old.description IS NOT new.description BEGIN
+        INSERT INTO findings_fts(findings_fts, rowid, {_SEARCH_COLUMNS})
+        VALUES ('delete', old.id, old.vulnerability_id, old.package_name, old.installed_version, old.description);
+        INSERT INTO findings_fts(rowid, {_SEARCH_COLUMNS})
+        VALUES (new.id, new.vulnerability_id, new.package_name, new.installed_version, new.description);
+    END""",
+}
+
+def search_index_available() -> bool:
+    return engine.dialect.name == "sqlite" and inspect(engine).has_table(SEARCH_INDEX_TABLE)
+
+def _create_search_index():
+    if engine.dialect.name != "sqlite":
+        return
+    with engine.begin() as conn:
+        exists = conn.execute(text("SELECT 1 FROM sqlite_master WHERE name = :name"), {"name": SEARCH_INDEX_TABLE}).first()
+        if not exists:
+            try:
+                # External content: the index stores tokens only and reads rows from image_findings
+                conn.execute(text(
+                    f"CREATE VIRTUAL TABLE {SEARCH_INDEX_TABLE} USING fts5({_SEARCH_COLUMNS}, "
+                    "content='image_findings', content_rowid='id', prefix='2 3')"
+                ))
+            except Exception as e:
+                print(f"Full-text search unavailable (SQLite without FTS5?): {e}")
+                return
+        for name, body in _SEARCH_TRIGGERS.items():
+            conn.execute(text(f"CREATE TRIGGER IF NOT EXISTS {name} {body}"))
+        if not exists:
+            # Index any history recorded before the index existed
+            conn.execute(text(f"INSERT INTO {SEARCH_INDEX_TABLE}({SEARCH_INDEX_TABLE}) VALUES ('rebuild')"))
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close() 
\ No newline at end of file
+        db.close()
+
+@contextmanager
+def session_scope():
+    # Same lifecycle as get_db, for work that runs outside a request (executor threads, background tasks)
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
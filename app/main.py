@@ -1,20 +1,45 @@
 from pathlib import Path
-from fastapi import FastAPI, Depends, HTTPException, Request
-from fastapi.staticfiles import StaticFiles
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import HTMLResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
-from sqlalchemy.orm import Session
-from database import get_db, init_db
+import jinja2
+from markupsafe import Markup
+from database import init_db, session_scope
 # ScanResult schema no longer needed here as view_logic returns it or None
 import uvicorn
+from typing import Optional
 from datetime import datetime
 
 # Import API routers
 from api import containers as containers_router
 from api import images as images_router
 from api import scans as scans_router
+from api import grype_db as grype_db_router
+from api import jobs as jobs_router
+from api import schedule as schedule_router
+from api import exports as exports_router
+from api import trends as trends_router
+from api import search as search_router
+from api import analytics as analytics_router
+from api import events as events_router
 
 # Import new service for view logic
-from services.view_logic import get_container_display_data, get_full_scan_details
+from services.view_logic import get_container_display_data, get_full_scan_details, sort_dashboard, DASHBOARD_SORTS
+from services.docker import get_running_containers, get_running_container
+from services.executors import run_db, run_docker, submit_scan, submit_maintenance, shutdown_executors
+from services.grype_db import grype_db_manager, GRYPE_DB_REMATCH_ON_UPDATE
+from services.rematch import rematch_fleet
+from services.spool import spool_manager
+from services.checkpoints import checkpoint_artifact_paths
+from services.scan_pipeline import resume_interrupted_scans
+from services.job_queue import SCAN_EXECUTION
+from services.scheduler import fleet_scheduler
+from services.trends import backfill_trends
+from services.risk import backfill_risk_aggregates
+from services.search import backfill_search_history
+from services.analytics import fleet_analytics
+from services.events import container_watcher
+from services.assets import CachedStaticFiles, asset_url, asset_manifest
 
 app = FastAPI(title="GrypeUI Docker Container Vulnerability Scanner")
 
@@ -23,48 +48,148 @@ MAIN_PY_DIR = Path(__file__).resolve().parent
 PROJECT_ROOT_DIR = MAIN_PY_DIR.parent
 
 # Mount static files and templates
-app.mount("/static", StaticFiles(directory=MAIN_PY_DIR / "static"), name="static")
+# Built assets under static/dist are content-hashed and served as immutable (services/assets.py)
+app.mount("/static", CachedStaticFiles(directory=MAIN_PY_DIR / "static"), name="static")
 templates = Jinja2Templates(directory=MAIN_PY_DIR / "templates")
+# Same templates rendered asynchronously, for pages streamed while their data is still being fetched
+streaming_templates = Jinja2Templates(env=jinja2.Environment(
+    loader=jinja2.FileSystemLoader(MAIN_PY_DIR / "templates"), autoescape=True, enable_async=True,
+))
+for _templates in (templates, streaming_templates):
+    _templates.env.globals["asset_url"] = asset_url
 
 # Initialize database
 @app.on_event("startup")
 def startup_event():
     init_db()
+    # Logs a warning if the frontend assets were not built
+    asset_manifest()
+    # Exports left behind by a crashed or killed process would otherwise fill the spool;
+    # exports kept by scan checkpoints stay for the resume below
+    with session_scope() as db:
+        checkpointed_exports = checkpoint_artifact_paths(db)
+    spool_manager.sweep_orphans(keep_paths=checkpointed_exports)
+    if GRYPE_DB_REMATCH_ON_UPDATE:
+        # A new DB build re-matches stored inventories instead of requiring full rescans
+        grype_db_manager.add_build_listener(lambda previous_build, new_build: submit_scan(rematch_fleet))
+    # Initial Grype DB refresh plus the periodic schedule, in the background
+    grype_db_manager.start()
+    # Scans interrupted by the previous shutdown continue from their last checkpoint.
+    # In queue mode scans belong to the workers, whose expired leases hand them to another worker.
+    if SCAN_EXECUTION != "queue":
+        submit_scan(resume_interrupted_scans)
+    # Background rescans that keep the fleet within SCHEDULE_MAX_AGE_HOURS (off unless set)
+    fleet_scheduler.start()
+    # Databases from before severity roll-ups, risk aggregates and search get them built once from scan history
+    submit_maintenance(backfill_trends)
+    submit_maintenance(backfill_risk_aggregates)
+    submit_maintenance(backfill_search_history)
+    # Fleet analytics are served from memory; load them now rather than on the first query
+    submit_maintenance(fleet_analytics.warm)
+    # Container starts and stops are pushed to open dashboards (api/events.py)
+    container_watcher.start()
+
+@app.on_event("shutdown")
+def shutdown_event():
+    container_watcher.stop()
+    fleet_scheduler.stop()
+    grype_db_manager.stop()
+    shutdown_executors()
 
 # Include API routers
 app.include_router(containers_router.router, prefix="/api", tags=["containers"])
 app.include_router(images_router.router, prefix="/api", tags=["images"])
 app.include_router(scans_router.router, prefix="/api", tags=["scans"])
+app.include_router(grype_db_router.router, prefix="/api", tags=["grype-db"])
+app.include_router(jobs_router.router, prefix="/api", tags=["jobs"])
+app.include_router(schedule_router.router, prefix="/api", tags=["schedule"])
+app.include_router(exports_router.router, prefix="/api", tags=["export"])
+app.include_router(trends_router.router, prefix="/api", tags=["trends"])
+app.include_router(search_router.router, prefix="/api", tags=["search"])
+app.include_router(analytics_router.router, prefix="/api", tags=["analytics"])
+app.include_router(events_router.router, prefix="/api", tags=["events"])
 
 # UI Endpoints
-@app.get("/", name="root")
-async def root(request: Request, db: Session = Depends(get_db)):
-    """
-    Serves the main dashboard page.
-    Fetches running containers, processes their image info, and gets scan status.
-    """
+
+# The dashboard is streamed: the page shell is sent before Docker is listed, then rows follow in
+# batches as they are enriched, so the first paint does not wait for every container.
+# index.html marks where output is flushed with {{ flush }}; output in between is sent as one write.
+DASHBOARD_STREAM_BATCH = 20 # Containers enriched per DB call (and per flush)
+STREAM_FLUSH = Markup("<!-- flush -->")
+
+async def _dashboard_batches(sort: Optional[str], fixable: bool):
+    # Yields lists of (row index, ContainerWithVulns)
     try:
-        container_data_for_template = get_container_display_data(db)
+        raw_docker_containers = await run_docker(get_running_containers)
+        # Sorting and filtering need every row's aggregates, so those pages get one batch
+        ordered = sort in DASHBOARD_SORTS or fixable
+        batch_size = max(len(raw_docker_containers), 1) if ordered else DASHBOARD_STREAM_BATCH
+        row_index = 0
+        for start in range(0, len(raw_docker_containers), batch_size):
+            rows = await run_db(get_container_display_data, raw_docker_containers[start:start + batch_size])
+            if ordered:
+                rows = sort_dashboard(rows, sort, fixable)
+            if rows:
+                yield list(enumerate(rows, start=row_index))
+                row_index += len(rows)
     except Exception as e:
+        # Rows already sent stay; the page is closed normally
         print(f"Error getting container display data: {e}")
-        # Optionally, pass an error message to the template or raise HTTPException
-        container_data_for_template = [] 
-        # Could add a message to request: `request.state.error_message = str(e)`
-        # and display it in index.html
 
-    return templates.TemplateResponse("index.html", {"request": request, "containers": container_data_for_template})
+async def _flushed_output(chunks):
+    buffer = []
+    async for chunk in chunks:
+        if chunk == STREAM_FLUSH:
+            if buffer:
+                yield "".join(buffer)
+                buffer = []
+        else:
+            buffer.append(chunk)
+    if buffer:
+        yield "".join(buffer)
+
+@app.get("/", name="root")
+async def root(request: Request, sort: Optional[str] = None, fixable: bool = False):
+    """
+    Serves the main dashboard page, streamed as running containers are enriched with their image
+    info and scan status. Docker and DB work run on their executors.
+    `sort` (risk, fixable_risk, fixable_critical, critical) and `fixable` use the stored scan aggregates.
+    """
+    context = {
+        "request": request,
+        "container_batches": _dashboard_batches(sort, fixable),
+        "flush": STREAM_FLUSH,
+        "sort": sort if sort in DASHBOARD_SORTS else None,
+        "fixable_only": fixable,
+    }
+    page = streaming_templates.get_template("index.html").generate_async(context)
+    return StreamingResponse(_flushed_output(page), media_type="text/html")
 
 @app.get("/scan-details/{scan_id}", name="view_scan_details")
-async def view_scan_details(request: Request, scan_id: int, db: Session = Depends(get_db)):
+async def view_scan_details(request: Request, scan_id: int):
     """
     Serves the scan details page for a given scan ID.
     """
-    scan_result_data = get_full_scan_details(db, scan_id)
+    scan_result_data = await run_db(get_full_scan_details, scan_id)
     if not scan_result_data:
         raise HTTPException(status_code=404, detail=f"Scan details for scan ID {scan_id} not found.")
     
     return templates.TemplateResponse("scan_details.html", {"request": request, "scan_result": scan_result_data})
 
+@app.get("/partials/container-row/{container_id}", name="container_row", response_class=HTMLResponse)
+async def container_row(request: Request, container_id: str, row_index: int = 0):
+    """
+    Renders one dashboard row, for a container that started after the page was loaded
+    (the dashboard inserts it on a container_started event instead of reloading).
+    """
+    container = await run_docker(get_running_container, container_id)
+    if container is None:
+        raise HTTPException(status_code=404, detail=f"Running container {container_id} not found.")
+    rows = await run_db(get_container_display_data, [container])
+    if not rows:
+        raise HTTPException(status_code=404, detail=f"Running container {container_id} not found.")
+    return templates.TemplateResponse("_container_row.html", {"request": request, "container": rows[0], "row_index": row_index})
+
 # Main function
 if __name__ == "__main__":
     # When running `python app/main.py` (e.g. via Makefile's old local dev target if it existed),
@@ -1,5 +1,5 @@
 # SQLAlchemy models from section 7.1
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, create_engine, Boolean
+from sqlalchemy import Column, Integer, Float, String, ForeignKey, DateTime, Date, Index, create_engine, Boolean, LargeBinary
 from sqlalchemy.orm import declarative_base, relationship, sessionmaker # Corrected import
 from datetime import datetime
 
@@ -22,9 +22,11 @@ class Image(Base):
     id = Column(String, primary_key=True)
     name = Column(String)
     tag = Column(String)
+    digest = Column(String, nullable=True, index=True) # Full content-addressed image ID (sha256:...)
     size = Column(Integer, nullable=True)
     created_at = Column(DateTime, nullable=True)
     scans = relationship("Scan", back_populates="image")
+    inventory = relationship("ImageInventory", back_populates="image", uselist=False)
 
     # New fields for image analysis results
     is_rootless = Column(Boolean, nullable=True)
@@ -32,6 +34,7 @@ class Image(Base):
     is_distroless = Column(Boolean, nullable=True)
     image_analysis_error = Column(String, nullable=True)
     last_analyzed_at = Column(DateTime, nullable=True)
+    analyzed_digest = Column(String, nullable=True) # Image digest the analysis fields were computed from
 
     # New fields for specific paths found
     found_shell_path = Column(String, nullable=True)
@@ -44,17 +47,64 @@ class Scan(Base):
     id = Column(Integer, primary_key=True, autoincrement=True)
     image_id = Column(String, ForeignKey("images.id"))
     scan_time = Column(DateTime, default=datetime.utcnow)
-    scan_status = Column(String)
+    scan_status = Column(String) # running, processing, completed, failed, timed_out, cancelled
+    scan_details = Column(String, nullable=True) # Why a scan did not complete
+    grype_db_build = Column(String, nullable=True) # Grype DB build the scan was matched against
+    # Latest build a re-match found the same findings with (services/rematch.py); the scan holds for it too
+    revalidated_build = Column(String, nullable=True)
+    revalidated_at = Column(DateTime, nullable=True)
+    findings_digest = Column(String, nullable=True) # Fingerprint of the finding set, to detect unchanged re-matches
+    image_digest = Column(String, nullable=True, index=True) # Image content the scan was run on; with grype_db_build, the reuse key
+    findings_storage = Column(String, nullable=True) # full (or None), delta: rows are changes against base_scan_id
+    base_scan_id = Column(Integer, nullable=True) # Scan a delta is relative to
+    delta_depth = Column(Integer, nullable=True) # Deltas since the last full snapshot
+    detail_min_severity = Column(String, nullable=True) # Lowest severity stored with details; None = all (others only counted)
     
     image = relationship("Image", back_populates="scans")
     vulnerabilities = relationship("Vulnerability", back_populates="scan")
     counts = relationship("VulnerabilityCounts", back_populates="scan", uselist=False)
 
+class ScanCheckpoint(Base):
+    """Durable progress of a scan that has not finished yet; removed when the scan completes or fails."""
+    __tablename__ = "scan_checkpoints"
+
+    scan_id = Column(Integer, ForeignKey("scans.id"), primary_key=True)
+    image_id = Column(String, ForeignKey("images.id"))
+    stage = Column(String) # started, analyzed, cataloged, exported, matched
+    forced = Column(Boolean, default=False)
+    artifact_path = Column(String, nullable=True) # Spool directory holding the export (exported stage)
+    match_output = Column(LargeBinary, nullable=True) # Gzip-compressed Grype JSON (matched stage)
+    grype_db_build = Column(String, nullable=True) # Build the match output was produced with
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+class ScanJob(Base):
+    """A queued scan, claimed by a worker under a time-limited lease that it renews by heartbeat."""
+    __tablename__ = "scan_jobs"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    image_id = Column(String, ForeignKey("images.id"), index=True)
+    kind = Column(String, default="scan") # scan, rematch
+    force = Column(Boolean, default=False)
+    timeout = Column(Integer, nullable=True) # Grype timeout override in seconds
+    priority = Column(Integer, default=0) # Higher runs first
+    status = Column(String, default="queued", index=True) # queued, claimed, done, failed, cancelled
+    cancel_requested = Column(Boolean, nullable=True) # Set while claimed; the worker's heartbeat stops the scan
+    attempts = Column(Integer, default=0)
+    max_attempts = Column(Integer, default=3)
+    lease_owner = Column(String, nullable=True) # Worker currently holding the job
+    lease_expires_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    scan_id = Column(Integer, ForeignKey("scans.id"), nullable=True) # Resulting scan
+    error = Column(String, nullable=True)
+
 class Vulnerability(Base):
     __tablename__ = "vulnerabilities"
     
     id = Column(Integer, primary_key=True, autoincrement=True)
-    scan_id = Column(Integer, ForeignKey("scans.id"))
+    scan_id = Column(Integer, ForeignKey("scans.id"), index=True)
+    change = Column(String(1), nullable=True) # Delta scans only: "+" added, "-" removed since the base scan
     vulnerability_id = Column(String)
     severity = Column(String)
     package_name = Column(String)
@@ -74,5 +124,73 @@ class VulnerabilityCounts(Base):
     low = Column(Integer, default=0)
     negligible = Column(Integer, default=0)
     unknown = Column(Integer, default=0)
+    # Aggregates computed at ingest (services/risk.py); None for scans stored before they existed
+    fixable = Column(Integer, nullable=True) # Findings with a fix version, at every severity
+    fixable_critical = Column(Integer, nullable=True)
+    fixable_high = Column(Integer, nullable=True)
+    fixable_medium = Column(Integer, nullable=True)
+    fixable_low = Column(Integer, nullable=True)
+    fixable_negligible = Column(Integer, nullable=True)
+    fixable_unknown = Column(Integer, nullable=True)
+    risk_score = Column(Float, nullable=True, index=True) # Sum of per-finding scores (CVSS base score, else by severity)
+    fixable_risk_score = Column(Float, nullable=True, index=True) # Same, over fixable findings only
+    top_packages = Column(String, nullable=True) # JSON list of the packages contributing most risk
     
-    scan = relationship("Scan", back_populates="counts") 
\ No newline at end of file
+    scan = relationship("Scan", back_populates="counts")
+
+class SeverityTrend(Base):
+    """
+    Daily roll-up of an image's posture: counts of its latest completed scan that day.
+    Rows with image_id "__fleet__" hold the whole fleet's totals at the end of each day.
+    Days without a row carry the previous posture forward.
+    """
+    __tablename__ = "severity_trends"
+
+    image_id = Column(String, primary_key=True) # Image ID, or "__fleet__"
+    day = Column(Date, primary_key=True)
+    critical = Column(Integer, default=0)
+    high = Column(Integer, default=0)
+    medium = Column(Integer, default=0)
+    low = Column(Integer, default=0)
+    negligible = Column(Integer, default=0)
+    unknown = Column(Integer, default=0)
+    fixable = Column(Integer, default=0) # Findings with a fixed version available
+    scan_id = Column(Integer, nullable=True) # Scan the image posture came from (not set on fleet rows)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+class ImageFinding(Base):
+    """
+    Search history: one row per distinct finding ever stored for an image, upserted as scans
+    complete, so searching history does not have to visit the same finding in every scan.
+    Full-text indexed by the findings_fts table (see database._create_search_index).
+    """
+    __tablename__ = "image_findings"
+    __table_args__ = (
+        Index("ix_image_findings_key", "image_id", "vulnerability_id", "package_name", "installed_version", unique=True),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    image_id = Column(String)
+    vulnerability_id = Column(String)
+    package_name = Column(String)
+    installed_version = Column(String)
+    severity = Column(String)
+    fixed_version = Column(String, nullable=True)
+    description = Column(String, nullable=True)
+    first_seen = Column(DateTime)
+    last_seen = Column(DateTime)
+    last_scan_id = Column(Integer) # Latest completed scan that had the finding
+    scan_count = Column(Integer, default=1)
+
+class ImageInventory(Base):
+    __tablename__ = "image_inventories"
+
+    # Package inventory (Syft SBOM) from the first catalog of an image, re-matched on Grype DB updates
+    image_id = Column(String, ForeignKey("images.id"), primary_key=True)
+    image_digest = Column(String, nullable=True) # Full image ID (sha256:...) the inventory was cataloged from
+    sbom = Column(LargeBinary) # gzip-compressed syft-json document
+    package_count = Column(Integer, default=0)
+    packages_digest = Column(String, nullable=True) # Fingerprint of (type, name, version) of all packages
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    image = relationship("Image", back_populates="inventory")
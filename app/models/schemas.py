@@ -27,6 +27,14 @@ class DockerContainerInfo(ContainerBase):
     # image_name from ContainerBase will be the primary tag or short_id
     image_details: DockerImageInfo
 
+class RiskPackage(BaseModel):
+    """A package among a scan's highest-risk ones (see services/risk.py)."""
+    package: str
+    version: Optional[str] = None
+    findings: int
+    fixable: int
+    risk: float
+
 class ContainerWithVulns(ContainerBase):
     # image_id here is the Docker short image ID, inherited from ContainerBase
     # This will be used by the template for the scan button, and should match Image.id in DB
@@ -38,6 +46,13 @@ class ContainerWithVulns(ContainerBase):
     low_count: Optional[int] = None
     negligible_count: Optional[int] = None
     unknown_count: Optional[int] = None
+    # Risk aggregates of the latest scan, for sorting and filtering the dashboard
+    risk_score: Optional[float] = None
+    fixable_risk_score: Optional[float] = None
+    fixable_count: Optional[int] = None
+    fixable_critical: Optional[int] = None
+    fixable_high: Optional[int] = None
+    top_packages: Optional[List[RiskPackage]] = None
 
     # Fields for image analysis
     is_rootless: Optional[bool] = None
@@ -58,18 +73,29 @@ class VulnerabilityModel(BaseModel):
     
     model_config = ConfigDict(from_attributes=True)
 
-class ScanResult(BaseModel):
+class ScanSummary(BaseModel):
+    """A scan without its findings: status, counts and image analysis flags."""
     scan_id: int
     image_id: str
     scan_time: datetime
     scan_status: str
-    vulnerabilities: List[VulnerabilityModel]
+    scan_details: Optional[str] = None # Why the scan did not complete (failed, timed_out, cancelled)
+    grype_db_build: Optional[str] = None # Grype DB build the findings were matched against
+    revalidated_build: Optional[str] = None # Later build a re-match found the same findings with
+    revalidated_at: Optional[datetime] = None
     critical_count: int
     high_count: int
     medium_count: int
     low_count: int
     negligible_count: int
     unknown_count: int
+    # Severities that are counted above but have no finding details stored (FINDINGS_MIN_SEVERITY)
+    summarized_severities: List[str] = []
+    # Aggregates computed at ingest; None for scans stored before they existed
+    risk_score: Optional[float] = None
+    fixable_risk_score: Optional[float] = None
+    fixable_count: Optional[int] = None
+    top_packages: Optional[List[RiskPackage]] = None
 
     # Add image analysis details relevant to the scan details page
     image_name: Optional[str] = None # Add image name/tag for context
@@ -81,6 +107,55 @@ class ScanResult(BaseModel):
     found_package_manager_path: Optional[str] = None
     distribution_info: Optional[str] = None # Added distribution info
 
+class ScanResult(ScanSummary):
+    vulnerabilities: List[VulnerabilityModel]
+
+class ImageAnalysis(BaseModel):
+    """Analysis verdicts of an image, without a Grype scan."""
+    image_id: str
+    image_name: Optional[str] = None
+    image_digest: Optional[str] = None # Content the verdicts apply to
+    source: str # cached, shared (copied from another image with the same content), analyzed
+    is_rootless: Optional[bool] = None
+    is_shellless: Optional[bool] = None
+    is_distroless: Optional[bool] = None
+    analysis_error: Optional[str] = None
+    found_shell_path: Optional[str] = None
+    found_package_manager_path: Optional[str] = None
+    distribution_info: Optional[str] = None
+    analyzed_at: Optional[datetime] = None
+
+class BulkScanRequest(BaseModel):
+    image_ids: Optional[List[str]] = None # All known images when omitted
+    force: bool = False
+    pipelined: bool = True # False runs the serial per-image flow, for throughput comparison
+
+class ScanJobRequest(BaseModel):
+    image_id: str
+    kind: str = "scan" # scan, rematch
+    force: bool = False
+    timeout: Optional[int] = None # Grype timeout override in seconds
+    priority: int = 0 # Higher runs first
+
+class ScanJobSchema(BaseModel):
+    id: int
+    image_id: str
+    kind: str
+    force: bool
+    priority: int
+    status: str # queued, claimed, done, failed, cancelled
+    cancel_requested: Optional[bool] = None
+    attempts: int
+    lease_owner: Optional[str] = None
+    lease_expires_at: Optional[datetime] = None
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    scan_id: Optional[int] = None
+    error: Optional[str] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
 # New schema for vulnerability counts
 class VulnerabilityCountsSchema(BaseModel):
     scan_id: int
@@ -90,5 +165,47 @@ class VulnerabilityCountsSchema(BaseModel):
     low: int
     negligible: int
     unknown: int
+    fixable: Optional[int] = None
+    fixable_critical: Optional[int] = None
+    fixable_high: Optional[int] = None
+    fixable_medium: Optional[int] = None
+    fixable_low: Optional[int] = None
+    fixable_negligible: Optional[int] = None
+    fixable_unknown: Optional[int] = None
+    risk_score: Optional[float] = None
+    fixable_risk_score: Optional[float] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+class FindingMatch(BaseModel):
+    """A distinct finding of an image that matched a search, from the image's search history."""
+    vulnerability_id: str
+    severity: str
+    package_name: str
+    installed_version: str
+    fixed_version: Optional[str] = None
+    description: Optional[str] = None
+    first_seen: datetime
+    last_seen: datetime
+    last_scan_id: int
+    scan_count: int # Completed scans the finding appeared in
+    in_latest_scan: bool # Still present in the image's latest completed scan
+
+class ImageSearchResult(BaseModel):
+    image_id: str
+    image_name: Optional[str] = None
+    matches: int # Distinct matching findings in the image's history
+    last_seen: datetime
+    last_matched_scan_id: int # Latest scan that had a matching finding
+    latest_scan_id: Optional[int] = None
+    in_latest_scan: bool # A matching finding is present in the image's latest completed scan
+    findings: List[FindingMatch] = [] # A few of the matches, most recently seen first
+    containers: List[str] = [] # Names of running containers using the image
 
-    model_config = ConfigDict(from_attributes=True) 
\ No newline at end of file
+class FindingSearchResponse(BaseModel):
+    query: str
+    indexed: bool # Answered from the full-text index (SQLite) rather than substring matching
+    total: int # Matching images
+    limit: int
+    offset: int
+    results: List[ImageSearchResult]
@@ -0,0 +1,34 @@
+from services.image_analyzer import ContainerAnalyzer
+
+# Entry points executed in the analysis process pool (see services.executors.run_analysis).
+# They exchange only plain dicts and paths with the web process; the working directory
+# is a spool directory owned, and cleaned up, by the caller.
+
+_analyzer = None
+
+class _CallerOwnedDir:
+    """Working directory handed in by the caller. Cleanup is left to its owner."""
+    def __init__(self, path: str):
+        self.name = path
+
+    def cleanup(self):
+        pass
+
+def _get_analyzer() -> ContainerAnalyzer:
+    # One analyzer (and Docker client) per worker process, reused across tasks
+    global _analyzer
+    if _analyzer is None:
+        _analyzer = ContainerAnalyzer()
+    return _analyzer
+
+def analyze_image_in_worker(image_name: str, work_dir: str) -> dict:
+    """Runs ContainerAnalyzer.analyze_image in work_dir and returns the picklable part of its result."""
+    results = _get_analyzer().analyze_image(image_name, temp_dir_manager=_CallerOwnedDir(work_dir))
+    results.pop("_temp_dir_manager_obj", None)
+    return results
+
+def export_image_in_worker(image_name: str, work_dir: str) -> dict:
+    """Runs ContainerAnalyzer.export_image in work_dir and returns the picklable part of its result."""
+    results = _get_analyzer().export_image(image_name, temp_dir_manager=_CallerOwnedDir(work_dir))
+    results.pop("_temp_dir_manager_obj", None)
+    return results
@@ -0,0 +1,266 @@
+import os
+import threading
+import time
+from array import array
+from collections import Counter, namedtuple
+from itertools import chain, compress, product
+from typing import Iterable, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from models.database import Vulnerability as DBVulnerability
+from services.findings_store import load_findings, is_delta_scan, latest_scans_subquery
+from services.risk import SEVERITIES
+from logger import logger
+
+# In-process columnar copy of the latest completed scan's findings of every image, for fleet
+# aggregations without ORM passes. Each image's findings are held as typed columns (one byte per
+# finding for severity and fixability, interned integer IDs for package, version and CVE) and
+# concatenated into one snapshot; filters are byte masks built and combined in C (bytes.translate,
+# big-integer AND), and group-bys count the masked column (itertools.compress) with Counter.
+# Scans completing in this process refresh their image on the next query; scans completed by
+# other processes (scan workers) are picked up by a check every ANALYTICS_SYNC_SECONDS.
+ANALYTICS_SYNC_SECONDS = float(os.getenv("ANALYTICS_SYNC_SECONDS", "5"))
+ANALYTICS_MAX_GROUPS = 1000 # Largest page of groups one query returns
+
+GROUP_BY_DIMENSIONS = ("package", "version", "vulnerability", "severity", "fixable", "image")
+_SEVERITY_CODES = {severity: code for code, severity in enumerate(SEVERITIES)}
+# Byte columns, and the codes they hold
+_PARTITION_DIMENSIONS = {"severity": range(len(SEVERITIES)), "fixable": (0, 1)}
+_LOAD_BATCH_SCANS = 500
+
+# One image's latest findings, column by column
+ImageColumns = namedtuple("ImageColumns", "scan_id severity fixable package version vulnerability")
+
+class _Interner:
+    """Maps strings to dense integer IDs (append-only, so IDs stay valid across snapshots)."""
+    def __init__(self):
+        self.ids = {}
+        self.values = []
+
+    def __call__(self, value) -> int:
+        key = self.ids.get(value)
+        if key is None:
+            key = self.ids[value] = len(self.values)
+            self.values.append(value)
+        return key
+
+class _Snapshot:
+    """Immutable concatenation of all images' columns; queries run against one snapshot."""
+    def __init__(self, chunks: dict):
+        self.image_ids = list(chunks)
+        self.offsets = {}
+        self.segments = [] # (start, end) rows of each image, in image_ids order
+        self.severity = b"".join(chunk.severity for chunk in chunks.values())
+        self.fixable = b"".join(chunk.fixable for chunk in chunks.values())
+        self.package, self.version, self.vulnerability, self.image = array("I"), array("I"), array("I"), array("I")
+        start = 0
+        for index, (image_id, chunk) in enumerate(chunks.items()):
+            self.package.extend(chunk.package)
+            self.version.extend(chunk.version)
+            self.vulnerability.extend(chunk.vulnerability)
+            self.image.extend(array("I", [index]) * len(chunk.severity))
+            self.offsets[image_id] = (start, start + len(chunk.severity))
+            self.segments.append(self.offsets[image_id])
+            start += len(chunk.severity)
+        self.rows = start
+        self.all_rows = b"\x01" * start
+
+def _code_table(*codes) -> bytes:
+    # bytes.translate table turning a code column into a 0/1 mask of the rows holding one of codes
+    table = bytearray(256)
+    for code in codes:
+        table[code] = 1
+    return bytes(table)
+
+def _and_masks(masks: list, rows: int) -> bytes:
+    if len(masks) == 1:
+        return masks[0]
+    combined = int.from_bytes(masks[0], "little")
+    for mask in masks[1:]:
+        combined &= int.from_bytes(mask, "little")
+    return combined.to_bytes(rows, "little")
+
+def _count_partition(snapshot: _Snapshot, dimension: Optional[str], mask: bytes) -> tuple:
+    """Findings and distinct images per value of dimension (one group when None) among the masked rows."""
+    if dimension is None:
+        spanned = sum(1 for start, end in snapshot.segments if mask.find(1, start, end) != -1)
+        return {None: mask.count(1)}, {None: spanned}
+    if dimension == "image":
+        findings = {index: mask.count(1, start, end) for index, (start, end) in enumerate(snapshot.segments)}
+        findings = {index: count for index, count in findings.items() if count}
+        return findings, dict.fromkeys(findings, 1)
+    column = getattr(snapshot, dimension)
+    images = Counter(chain.from_iterable(
+        set(compress(column[start:end], mask[start:end])) for start, end in snapshot.segments
+        if mask.find(1, start, end) != -1
+    ))
+    return Counter(compress(column, mask)), images
+
+def _count_tuples(snapshot: _Snapshot, group_by: list, mask: bytes) -> tuple:
+    keys = zip(*[compress(getattr(snapshot, dimension), mask) for dimension in group_by])
+    if "image" in group_by:
+        findings = Counter(keys)
+        return findings, dict.fromkeys(findings, 1)
+    # Findings and distinct images per group in one pass over (key, image) pairs
+    pairs = Counter(zip(keys, compress(snapshot.image, mask)))
+    findings = Counter()
+    for (key, _image), count in pairs.items():
+        findings[key] += count
+    return findings, Counter(key for key, _image in pairs)
+
+class FleetAnalytics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._chunks = {} # image_id -> ImageColumns
+        self._stale = set() # Images whose latest scan changed in this process
+        self._snapshot: Optional[_Snapshot] = None
+        self._synced_at = 0.0
+        self._packages, self._versions, self._vulnerabilities = _Interner(), _Interner(), _Interner()
+
+    def mark_stale(self, image_id: str):
+        """Called after a scan of image_id commits; the image is reloaded before the next query."""
+        with self._lock:
+            self._stale.add(image_id)
+
+    def _latest_scans(self, db: Session) -> dict:
+        latest = latest_scans_subquery()
+        return dict(db.execute(select(latest.c.image_id, latest.c.scan_id)).all())
+
+    def _columns(self, scan_id: int, findings: Iterable) -> ImageColumns:
+        severity, fixable = bytearray(), bytearray()
+        package, version, vulnerability = array("I"), array("I"), array("I")
+        unknown = _SEVERITY_CODES["unknown"]
+        for row in findings:
+            severity.append(_SEVERITY_CODES.get(row.severity, unknown))
+            fixable.append(1 if row.fixed_version else 0)
+            package.append(self._packages(row.package_name))
+            version.append(self._versions(row.installed_version))
+            vulnerability.append(self._vulnerabilities(row.vulnerability_id))
+        return ImageColumns(scan_id, bytes(severity), bytes(fixable), package, version, vulnerability)
+
+    def _load(self, db: Session, scans: dict) -> dict:
+        # Full scans are read in bulk; delta-stored ones are rebuilt one by one
+        loaded = {}
+        full = {}
+        for image_id, scan_id in scans.items():
+            if is_delta_scan(db, scan_id):
+                loaded[image_id] = self._columns(scan_id, load_findings(db, scan_id))
+            else:
+                full[scan_id] = image_id
+        scan_ids = list(full)
+        for start in range(0, len(scan_ids), _LOAD_BATCH_SCANS):
+            batch = scan_ids[start:start + _LOAD_BATCH_SCANS]
+            rows_by_scan = {scan_id: [] for scan_id in batch}
+            for row in (
+                db.query(DBVulnerability.scan_id, DBVulnerability.severity, DBVulnerability.fixed_version,
+                         DBVulnerability.package_name, DBVulnerability.installed_version, DBVulnerability.vulnerability_id)
+                .filter(DBVulnerability.scan_id.in_(batch))
+                .order_by(DBVulnerability.id)
+            ):
+                rows_by_scan[row.scan_id].append(row)
+            for scan_id, rows in rows_by_scan.items():
+                loaded[full[scan_id]] = self._columns(scan_id, rows)
+        return loaded
+
+    def refresh(self, db: Session, force: bool = False):
+        """Brings the store up to date: stale images always, the whole fleet every ANALYTICS_SYNC_SECONDS."""
+        with self._lock:
+            now = time.monotonic()
+            if not force and self._snapshot is not None and not self._stale and now - self._synced_at < ANALYTICS_SYNC_SECONDS:
+                return
+            started = time.perf_counter()
+            latest = self._latest_scans(db)
+            changed = {
+                image_id: scan_id for image_id, scan_id in latest.items()
+                if image_id in self._stale or getattr(self._chunks.get(image_id), "scan_id", None) != scan_id
+            }
+            removed = set(self._chunks) - set(latest)
+            self._stale.clear()
+            self._synced_at = now
+            if changed or removed or self._snapshot is None:
+                self._chunks.update(self._load(db, changed))
+                for image_id in removed:
+                    self._chunks.pop(image_id, None)
+                self._snapshot = _Snapshot(self._chunks)
+                logger.debug(f"Fleet analytics: reloaded {len(changed)} image(s), {self._snapshot.rows} findings "
+                             f"in {time.perf_counter() - started:.3f}s")
+
+    def warm(self):
+        """Loads the store up front (startup), so the first query does not pay for it."""
+        from database import session_scope
+        with session_scope() as db:
+            self.refresh(db, force=True)
+
+    def query(self, db: Session, group_by: list, severities: Optional[list] = None, fixable: Optional[bool] = None,
+              image_ids: Optional[Iterable[str]] = None, limit: int = 50) -> dict:
+        """
+        Counts the latest findings grouped by the given dimensions (GROUP_BY_DIMENSIONS), optionally
+        filtered by severity, fixability and image. Each group also reports how many images it spans.
+        """
+        self.refresh(db)
+        snapshot = self._snapshot
+        started = time.perf_counter()
+
+        masks = [snapshot.all_rows]
+        if severities:
+            masks.append(snapshot.severity.translate(_code_table(*[_SEVERITY_CODES[severity] for severity in severities])))
+        if fixable is not None:
+            masks.append(snapshot.fixable.translate(_code_table(1 if fixable else 0)))
+        if image_ids is not None:
+            selected = bytearray(snapshot.rows)
+            for image_id in image_ids:
+                start, end = snapshot.offsets.get(image_id, (0, 0))
+                selected[start:end] = b"\x01" * (end - start)
+            masks.append(bytes(selected))
+        mask = _and_masks(masks, snapshot.rows)
+
+        # Severity and fixability partition the rows (one mask per value); the remaining dimension, if
+        # any, is counted per partition. Two or more such dimensions are counted as row tuples instead.
+        partitioned = [dimension for dimension in group_by if dimension in _PARTITION_DIMENSIONS]
+        keyed = [dimension for dimension in group_by if dimension not in _PARTITION_DIMENSIONS]
+        if len(keyed) > 1:
+            findings, images = _count_tuples(snapshot, group_by, mask)
+        else:
+            findings, images = Counter(), Counter()
+            for codes in product(*[_PARTITION_DIMENSIONS[dimension] for dimension in partitioned]):
+                partition = _and_masks([mask] + [getattr(snapshot, dimension).translate(_code_table(code))
+                                                 for dimension, code in zip(partitioned, codes)], snapshot.rows)
+                if 1 not in partition:
+                    continue
+                values = dict(zip(partitioned, codes))
+                partition_findings, partition_images = _count_partition(snapshot, keyed[0] if keyed else None, partition)
+                for value, count in partition_findings.items():
+                    if keyed:
+                        values[keyed[0]] = value
+                    key = tuple(values[dimension] for dimension in group_by)
+                    findings[key] = count
+                    images[key] = partition_images[value]
+
+        decoders = {
+            "package": self._packages.values.__getitem__,
+            "version": self._versions.values.__getitem__,
+            "vulnerability": self._vulnerabilities.values.__getitem__,
+            "severity": SEVERITIES.__getitem__,
+            "fixable": bool,
+            "image": snapshot.image_ids.__getitem__,
+        }
+        groups = []
+        for key, count in sorted(findings.items(), key=lambda item: (-item[1], item[0]))[:limit]:
+            group = {dimension: decoders[dimension](value) for dimension, value in zip(group_by, key)}
+            group["findings"] = count
+            group["images"] = images[key]
+            groups.append(group)
+        return {
+            "group_by": group_by,
+            "rows_scanned": snapshot.rows,
+            "matched": mask.count(1),
+            "total_groups": len(findings),
+            "groups": groups,
+            "images_in_store": len(snapshot.image_ids),
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 3),
+        }
+
+# Process-wide store, kept by the web tier
+fleet_analytics = FleetAnalytics()
@@ -0,0 +1,51 @@
+import json
+import os
+from pathlib import Path
+
+from jinja2 import pass_context
+from starlette.staticfiles import StaticFiles
+
+from logger import logger
+
+# Frontend assets (Tailwind CSS, Alpine.js, list.js) are built ahead of time by scripts/build_assets.py
+# into static/dist under content-hashed names, listed in static/dist/manifest.json. Templates link
+# them through asset_url(), and since a changed file gets a new name, browsers may cache them for good.
+STATIC_DIR = Path(__file__).resolve().parent.parent / "static"
+ASSET_DIR = "dist"
+MANIFEST_NAME = "manifest.json"
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+_manifest = {}
+_manifest_mtime = None
+_warned = False
+
+def asset_manifest() -> dict:
+    """Logical asset name -> hashed file name; reread when the build replaces the manifest."""
+    global _manifest, _manifest_mtime, _warned
+    path = STATIC_DIR / ASSET_DIR / MANIFEST_NAME
+    try:
+        mtime = os.stat(path).st_mtime
+    except FileNotFoundError:
+        if not _warned:
+            logger.warning(f"No built frontend assets at {path.parent}; run `make assets` (scripts/build_assets.py)")
+            _warned = True
+        return {}
+    if mtime != _manifest_mtime:
+        _manifest = json.loads(path.read_text())
+        _manifest_mtime = mtime
+    return _manifest
+
+@pass_context
+def asset_url(context, name: str) -> str:
+    """Template global: URL of the built asset (e.g. 'app.css') under its content-hashed name."""
+    hashed = asset_manifest().get(name, name)
+    return str(context["request"].url_for("static", path=f"/{ASSET_DIR}/{hashed}"))
+
+class CachedStaticFiles(StaticFiles):
+    """StaticFiles that marks the content-hashed build output as immutable."""
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200):
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        path = Path(full_path)
+        if path.parent.name == ASSET_DIR and path.name != MANIFEST_NAME:
+            response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        return response
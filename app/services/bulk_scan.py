@@ -0,0 +1,166 @@
+import threading
+import time
+from concurrent.futures import Future, wait
+from typing import List, Optional
+
+from database import session_scope
+from models.database import Image as DBImage
+from services.executors import export_executor, match_executor, BULK_EXPORT_CONCURRENCY, BULK_MATCH_CONCURRENCY
+from services.scan_pipeline import (
+    ScanPipelineError, get_image_lock, image_scan_lock, prepare_image_scan, match_prepared_scan
+)
+from logger import logger
+
+class _BulkRun:
+    """Collects per-image outcomes and stage timings of one sweep. Updated from the stage pools."""
+    def __init__(self, image_ids: List[str]):
+        self._lock = threading.Lock()
+        self.image_ids = image_ids
+        self.scans = {}
+        self.reused = []
+        self.failed = {}
+        self.prepare_seconds = 0.0
+        self.match_seconds = 0.0
+
+    def add_stage_time(self, stage: str, seconds: float):
+        with self._lock:
+            if stage == "prepare":
+                self.prepare_seconds += seconds
+            else:
+                self.match_seconds += seconds
+
+    def record_result(self, image_id: str, scan_result, reused: bool = False):
+        with self._lock:
+            self.scans[image_id] = scan_result.scan_id
+            if reused:
+                self.reused.append(image_id)
+
+    def record_failure(self, image_id: str, error: Exception):
+        detail = error.detail if isinstance(error, ScanPipelineError) else str(error)
+        with self._lock:
+            self.failed[image_id] = detail
+        print(f"Bulk scan of {image_id} failed: {detail}")
+
+    def summary(self, mode: str, wall_seconds: float) -> dict:
+        # The stage times add up to what the serial flow (prepare then match, one image
+        # at a time) would have spent; measured under contention they overstate it slightly.
+        serial_seconds = self.prepare_seconds + self.match_seconds
+        return {
+            "mode": mode,
+            "images": len(self.image_ids),
+            "scanned": len(self.scans) - len(self.reused),
+            "reused": len(self.reused),
+            "failed": len(self.failed),
+            "scan_ids": self.scans,
+            "failures": self.failed,
+            "duration_seconds": round(wall_seconds, 3),
+            "stage_seconds": {"prepare": round(self.prepare_seconds, 3), "match": round(self.match_seconds, 3)},
+            "serial_seconds_estimate": round(serial_seconds, 3),
+            "speedup_vs_serial": round(serial_seconds / wall_seconds, 2) if wall_seconds > 0 else None,
+            "images_per_minute": round(len(self.image_ids) * 60 / wall_seconds, 2) if wall_seconds > 0 else None,
+            "export_concurrency": BULK_EXPORT_CONCURRENCY if mode == "pipelined" else 1,
+            "match_concurrency": BULK_MATCH_CONCURRENCY if mode == "pipelined" else 1,
+        }
+
+def run_bulk_scan(image_ids: Optional[List[str]] = None, force: bool = False, pipelined: bool = True) -> dict:
+    """
+    Scans many images (all known images when image_ids is omitted) and returns a throughput summary.
+    Pipelined mode runs the export stage and the Grype match stage on separate pools, so
+    the next image is exported while the previous one is matched. pipelined=False runs the
+    same images through the serial per-image flow, as a baseline for comparison.
+    Blocking; meant to be run on the bulk executor.
+    """
+    if image_ids is None:
+        with session_scope() as db:
+            image_ids = [row.id for row in db.query(DBImage.id).order_by(DBImage.id).all()]
+    image_ids = list(dict.fromkeys(image_ids)) # De-duplicate, keep order
+
+    run = _BulkRun(image_ids)
+    started = time.monotonic()
+    if pipelined:
+        _run_pipelined(run, force)
+    else:
+        _run_serial(run, force)
+    summary = run.summary("pipelined" if pipelined else "serial", time.monotonic() - started)
+    logger.info(
+        f"Bulk scan ({summary['mode']}) finished: {summary['scanned']} scanned, {summary['reused']} reused, "
+        f"{summary['failed']} failed in {summary['duration_seconds']}s (serial estimate {summary['serial_seconds_estimate']}s)"
+    )
+    return summary
+
+def _run_serial(run: _BulkRun, force: bool):
+    # Same steps as run_image_scan, timed per stage
+    for image_id in run.image_ids:
+        try:
+            with image_scan_lock(image_id), session_scope() as db:
+                stage_started = time.monotonic()
+                try:
+                    prepared = prepare_image_scan(db, image_id, force)
+                finally:
+                    run.add_stage_time("prepare", time.monotonic() - stage_started)
+                stage_started = time.monotonic()
+                try:
+                    run.record_result(image_id, match_prepared_scan(db, prepared), reused=prepared.result is not None)
+                finally:
+                    run.add_stage_time("match", time.monotonic() - stage_started)
+        except Exception as e:
+            run.record_failure(image_id, e)
+
+def _run_pipelined(run: _BulkRun, force: bool):
+    # Bounds how far exports may run ahead of matching (the spool budget bounds disk use on top)
+    in_flight = threading.BoundedSemaphore(BULK_EXPORT_CONCURRENCY + 2 * BULK_MATCH_CONCURRENCY)
+    done = []
+    for image_id in run.image_ids:
+        in_flight.acquire()
+        finished = Future()
+        done.append(finished)
+        try:
+            export_executor.submit(_prepare_stage, run, image_id, force, in_flight, finished)
+        except RuntimeError as e: # Executors shutting down
+            run.record_failure(image_id, e)
+            _finish(None, in_flight, finished)
+    wait(done)
+
+def _finish(image_lock: Optional[threading.Lock], in_flight: threading.BoundedSemaphore, finished: Future):
+    if image_lock:
+        image_lock.release()
+    in_flight.release()
+    finished.set_result(None)
+
+def _prepare_stage(run: _BulkRun, image_id: str, force: bool, in_flight, finished: Future):
+    # The image lock is held from prepare until match completes, possibly across threads
+    image_lock = get_image_lock(image_id)
+    image_lock.acquire()
+    stage_started = time.monotonic()
+    try:
+        with session_scope() as db:
+            prepared = prepare_image_scan(db, image_id, force)
+    except Exception as e:
+        run.record_failure(image_id, e)
+        _finish(image_lock, in_flight, finished)
+        return
+    finally:
+        run.add_stage_time("prepare", time.monotonic() - stage_started)
+
+    if prepared.result is not None:
+        run.record_result(image_id, prepared.result, reused=True)
+        _finish(image_lock, in_flight, finished)
+        return
+    try:
+        match_executor.submit(_match_stage, run, prepared, image_lock, in_flight, finished)
+    except RuntimeError as e: # Executors shutting down
+        prepared.cleanup()
+        run.record_failure(image_id, e)
+        _finish(image_lock, in_flight, finished)
+
+def _match_stage(run: _BulkRun, prepared, image_lock: threading.Lock, in_flight, finished: Future):
+    stage_started = time.monotonic()
+    try:
+        with session_scope() as db:
+            run.record_result(prepared.image_id, match_prepared_scan(db, prepared))
+    except Exception as e:
+        run.record_failure(prepared.image_id, e)
+    finally:
+        prepared.cleanup()
+        run.add_stage_time("match", time.monotonic() - stage_started)
+        _finish(image_lock, in_flight, finished)
@@ -0,0 +1,64 @@
+import gzip
+import json
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from models.database import ScanCheckpoint
+from services.events import event_broker
+from logger import logger
+
+# Stages in pipeline order. A checkpoint records the last stage whose results are durable:
+# started   - the Scan row exists, nothing else is done
+# analyzed  - analysis results are stored on the Image row
+# cataloged - the package inventory is stored (ImageInventory)
+# exported  - no cataloger: the export is kept in a spool directory for Grype (artifact_path)
+# matched   - Grype's output is stored and only needs to be ingested (match_output)
+STAGES = ("started", "analyzed", "cataloged", "exported", "matched")
+
+def record_checkpoint(db: Session, scan_id: int, image_id: str, stage: str, forced: bool = None,
+                      artifact_path: str = None, scan_data: dict = None, grype_db_build: str = None) -> ScanCheckpoint:
+    """Records that scan_id completed stage. Commits, so the checkpoint survives a crash right after."""
+    checkpoint = db.query(ScanCheckpoint).filter(ScanCheckpoint.scan_id == scan_id).first()
+    if checkpoint is None:
+        checkpoint = ScanCheckpoint(scan_id=scan_id, image_id=image_id, forced=bool(forced))
+        db.add(checkpoint)
+    elif forced is not None:
+        checkpoint.forced = forced
+    checkpoint.stage = stage
+    checkpoint.artifact_path = artifact_path
+    checkpoint.match_output = gzip.compress(json.dumps(scan_data).encode()) if scan_data is not None else None
+    checkpoint.grype_db_build = grype_db_build
+    checkpoint.updated_at = datetime.utcnow()
+    db.commit()
+    logger.debug(f"Scan {scan_id} checkpoint: {stage}")
+    event_broker.publish("scan_progress", image_id=image_id, scan_id=scan_id, stage=stage)
+    return checkpoint
+
+def clear_checkpoint(db: Session, scan_id: int):
+    """Removes the checkpoint of a finished scan. Does not commit, so it lands with the scan's final state."""
+    db.query(ScanCheckpoint).filter(ScanCheckpoint.scan_id == scan_id).delete(synchronize_session=False)
+
+def touch_checkpoints(db: Session, scan_ids: list):
+    """Marks the checkpoints of scan_ids as recently worked on, while a stage runs longer than a job lease. Commits."""
+    if not scan_ids:
+        return
+    (db.query(ScanCheckpoint)
+     .filter(ScanCheckpoint.scan_id.in_(scan_ids))
+     .update({"updated_at": datetime.utcnow()}, synchronize_session=False))
+    db.commit()
+
+def get_checkpoint(db: Session, scan_id: int) -> Optional[ScanCheckpoint]:
+    return db.query(ScanCheckpoint).filter(ScanCheckpoint.scan_id == scan_id).first()
+
+def load_match_output(checkpoint: ScanCheckpoint) -> dict:
+    return json.loads(gzip.decompress(checkpoint.match_output))
+
+def list_checkpoints(db: Session) -> list:
+    return db.query(ScanCheckpoint).order_by(ScanCheckpoint.scan_id).all()
+
+def checkpoint_artifact_paths(db: Session) -> set:
+    """Spool directories still referenced by checkpoints; the orphan sweep must keep them."""
+    rows = db.query(ScanCheckpoint.artifact_path).filter(ScanCheckpoint.artifact_path.isnot(None)).all()
+    return {row.artifact_path for row in rows}
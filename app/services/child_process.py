@@ -0,0 +1,84 @@
+import os
+import shutil
+import signal
+import subprocess
+from typing import Callable, Optional
+
+from logger import logger
+
+# Resource limits for scanner child processes (Grype, Syft), so they cannot starve the web server.
+# SCANNER_NICE: CPU niceness added to the child (0 disables).
+# SCANNER_IONICE_CLASS: I/O scheduling class, "idle", "best-effort" or "none".
+# SCANNER_IONICE_LEVEL: priority within the best-effort class (0 highest .. 7 lowest).
+# SCANNER_MEMORY_LIMIT_BYTES: address-space ceiling for the child (0 = unlimited). Go programs
+#   also get GOMEMLIMIT just below it, so they collect garbage before hitting the hard limit.
+SCANNER_NICE = int(os.getenv("SCANNER_NICE", "10"))
+SCANNER_IONICE_CLASS = os.getenv("SCANNER_IONICE_CLASS", "best-effort").lower()
+SCANNER_IONICE_LEVEL = int(os.getenv("SCANNER_IONICE_LEVEL", "7"))
+SCANNER_MEMORY_LIMIT_BYTES = int(os.getenv("SCANNER_MEMORY_LIMIT_BYTES", "0"))
+
+_IONICE_CLASSES = {"idle": "3", "best-effort": "2"}
+
+def _limit_prefix() -> list:
+    # Wrapper commands exec the scanner in place, so they add no extra process.
+    # They are used instead of preexec_fn, which is unsafe in a multi-threaded server.
+    prefix = []
+    if SCANNER_MEMORY_LIMIT_BYTES > 0:
+        if shutil.which("prlimit"):
+            prefix += ["prlimit", f"--as={SCANNER_MEMORY_LIMIT_BYTES}", "--"]
+        else:
+            logger.warning("prlimit not found; SCANNER_MEMORY_LIMIT_BYTES is only applied as GOMEMLIMIT.")
+    ionice_class = _IONICE_CLASSES.get(SCANNER_IONICE_CLASS)
+    if ionice_class and shutil.which("ionice"):
+        prefix += ["ionice", "-c", ionice_class]
+        if ionice_class == "2":
+            prefix += ["-n", str(SCANNER_IONICE_LEVEL)]
+    if SCANNER_NICE > 0 and shutil.which("nice"):
+        prefix += ["nice", "-n", str(SCANNER_NICE)]
+    return prefix
+
+def limited_command(cmd: list) -> list:
+    """Prefixes cmd with the configured nice/ionice/memory wrappers."""
+    return _limit_prefix() + list(cmd)
+
+def limited_env(env: Optional[dict] = None) -> dict:
+    env = dict(env if env is not None else os.environ)
+    if SCANNER_MEMORY_LIMIT_BYTES > 0 and "GOMEMLIMIT" not in env:
+        env["GOMEMLIMIT"] = str(int(SCANNER_MEMORY_LIMIT_BYTES * 0.9))
+    return env
+
+def kill_process_group(process: subprocess.Popen):
+    """Kills the child and anything it started. Safe to call on an already finished process."""
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+def run_limited(cmd: list, env: Optional[dict] = None, timeout: Optional[float] = None, text: bool = True,
+                on_start: Optional[Callable[[subprocess.Popen], None]] = None) -> subprocess.CompletedProcess:
+    """
+    Runs cmd under the configured resource limits, in its own process group.
+    Raises subprocess.TimeoutExpired (after killing the group) when timeout seconds pass, and
+    subprocess.CalledProcessError on a non-zero exit. on_start receives the Popen right after launch.
+    """
+    if not shutil.which(cmd[0], path=(env if env is not None else os.environ).get("PATH")):
+        # Checked up front: behind the wrappers a missing binary would only show as exit code 127
+        raise FileNotFoundError(f"{cmd[0]} not found in PATH")
+    full_cmd = limited_command(cmd)
+    process = subprocess.Popen(full_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=text,
+                               env=limited_env(env), start_new_session=True)
+    if on_start:
+        on_start(process)
+    try:
+        stdout, stderr = process.communicate(timeout=timeout if timeout and timeout > 0 else None)
+    except subprocess.TimeoutExpired:
+        kill_process_group(process)
+        process.communicate()
+        raise
+    except BaseException:
+        kill_process_group(process)
+        process.wait()
+        raise
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, cmd, stdout, stderr)
+    return subprocess.CompletedProcess(cmd, process.returncode, stdout, stderr)
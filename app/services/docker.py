@@ -2,6 +2,7 @@ import docker
 from models.schemas import DockerContainerInfo, DockerImageInfo # Updated imports
 from sqlalchemy.orm import Session # Added for type hinting if db session is used
 from datetime import datetime # For parsing timestamp
+from typing import Optional
 import dateutil.parser # For robust ISO 8601 parsing
 
 # The spec's list_containers in main.py passes `db` to get_running_containers.
@@ -20,39 +21,66 @@ def get_running_containers(db: Session = None) -> list[DockerContainerInfo]: # U
     container_info_list = []
     for container in raw_containers:
         try:
-            image_obj = container.image
-            image_tags = image_obj.tags
-            primary_image_name_tag = image_tags[0] if image_tags else (image_obj.short_id or image_obj.id)
-            
-            container_created_at_str = container.attrs.get('Created')
-            container_created_at_dt = dateutil.parser.isoparse(container_created_at_str) if container_created_at_str else datetime.utcnow()
-
-            image_created_at_dt = None
-            if image_obj.attrs.get('Created'):
-                image_created_at_dt = dateutil.parser.isoparse(image_obj.attrs['Created'])
-            
-            image_details_data = DockerImageInfo(
-                id=image_obj.id, # Full SHA ID
-                short_id=image_obj.short_id.replace("sha256:", "")[:12] if image_obj.short_id else image_obj.id.replace("sha256:", "")[:12],
-                tags=image_tags if image_tags else [],
-                size=image_obj.attrs.get('Size'),
-                created_at=image_created_at_dt
-            )
-
-            container_data = DockerContainerInfo(
-                id=container.short_id,
-                name=container.name,
-                image_id=image_details_data.short_id, # Use the parsed short_id from image_details
-                image_name=primary_image_name_tag,
-                status=container.status,
-                created_at=container_created_at_dt,
-                image_details=image_details_data
-            )
-            container_info_list.append(container_data)
+            container_info_list.append(_container_info(container))
         except Exception as e:
             # Log error for specific container and continue if possible
             print(f"Error processing container {container.id}: {e}")
             # Optionally, add a placeholder or skip this container
             continue
             
-    return container_info_list 
\ No newline at end of file
+    return container_info_list
+
+def get_running_container(container_id: str) -> Optional[DockerContainerInfo]:
+    """One running container by ID (or name), or None when it is unknown or not running."""
+    try:
+        container = docker.from_env().containers.get(container_id)
+        if container.status != "running":
+            return None
+        return _container_info(container)
+    except docker.errors.NotFound:
+        return None
+    except docker.errors.DockerException as e:
+        print(f"Error getting container {container_id} from Docker: {e}")
+        return None
+
+def _container_info(container) -> DockerContainerInfo:
+    image_obj = container.image
+    image_tags = image_obj.tags
+    primary_image_name_tag = image_tags[0] if image_tags else (image_obj.short_id or image_obj.id)
+    
+    container_created_at_str = container.attrs.get('Created')
+    container_created_at_dt = dateutil.parser.isoparse(container_created_at_str) if container_created_at_str else datetime.utcnow()
+
+    image_created_at_dt = None
+    if image_obj.attrs.get('Created'):
+        image_created_at_dt = dateutil.parser.isoparse(image_obj.attrs['Created'])
+    
+    image_details_data = DockerImageInfo(
+        id=image_obj.id, # Full SHA ID
+        short_id=image_obj.short_id.replace("sha256:", "")[:12] if image_obj.short_id else image_obj.id.replace("sha256:", "")[:12],
+        tags=image_tags if image_tags else [],
+        size=image_obj.attrs.get('Size'),
+        created_at=image_created_at_dt
+    )
+
+    return DockerContainerInfo(
+        id=container.short_id,
+        name=container.name,
+        image_id=image_details_data.short_id, # Use the parsed short_id from image_details
+        image_name=primary_image_name_tag,
+        status=container.status,
+        created_at=container_created_at_dt,
+        image_details=image_details_data
+    )
+
+def inspect_image(image_ref: str) -> Optional[dict]:
+    """Returns the inspect metadata of a local image, or None if it cannot be inspected."""
+    try:
+        return docker.from_env().api.inspect_image(image_ref)
+    except docker.errors.DockerException as e:
+        print(f"Error inspecting image {image_ref}: {e}")
+        return None
+
+def get_image_digest(image_ref: str) -> str:
+    """Returns the full content-addressed ID (sha256:...) of a local image, or None if it cannot be inspected."""
+    return (inspect_image(image_ref) or {}).get("Id")
@@ -0,0 +1,126 @@
+import asyncio
+import threading
+from datetime import datetime
+from typing import Optional
+
+import docker
+
+from services.risk import risk_summary_fields
+from logger import logger
+
+# Push channel for dashboards: the scan pipeline and the Docker event watcher publish small per-row
+# changes, and every connected WebSocket (api/events.py) receives them, so an open dashboard updates
+# the affected rows in place instead of being reloaded.
+# Events: scan_started, scan_progress (checkpoint stage), scan_finished (counts and risk), scan_failed,
+# container_started, container_stopped; resync when a subscriber fell too far behind.
+# Only scans running in this process are seen; scans run by separate queue workers are not pushed.
+EVENT_QUEUE_SIZE = 256 # Undelivered events kept per connection before it is asked to resync
+DOCKER_EVENTS_RETRY_SECONDS = 5
+
+class EventBroker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {} # asyncio.Queue -> the event loop it belongs to
+
+    def subscribe(self) -> asyncio.Queue:
+        """Registers a subscriber. Call from the event loop that will read the queue."""
+        queue = asyncio.Queue(maxsize=EVENT_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers[queue] = asyncio.get_running_loop()
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        with self._lock:
+            self._subscribers.pop(queue, None)
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    @staticmethod
+    def _deliver(queue: asyncio.Queue, event: dict):
+        # Runs on the subscriber's loop. A full queue is dropped for a resync: the client reloads.
+        try:
+            queue.put_nowait(event)
+        except asyncio.QueueFull:
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait({"type": "resync"})
+
+    def publish(self, event_type: str, **data):
+        """Sends an event to every subscriber. Safe to call from any thread; never blocks."""
+        with self._lock:
+            subscribers = list(self._subscribers.items())
+        if not subscribers:
+            return
+        event = {"type": event_type, **data}
+        for queue, loop in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._deliver, queue, event)
+            except RuntimeError: # The subscriber's loop is closed
+                self.unsubscribe(queue)
+
+def scan_finished_fields(scan, counts: dict) -> dict:
+    """Dashboard row fields of a completed scan, from the counts dict stored with it."""
+    return dict(
+        image_id=scan.image_id,
+        scan_id=scan.id,
+        scan_time=scan.scan_time.isoformat() if isinstance(scan.scan_time, datetime) else None,
+        **{f"{severity}_count": counts.get(severity) or 0
+           for severity in ("critical", "high", "medium", "low", "negligible", "unknown")},
+        **risk_summary_fields(counts),
+    )
+
+class ContainerEventWatcher:
+    """Follows the Docker event stream and publishes container starts and stops."""
+    def __init__(self, broker: EventBroker):
+        self._broker = broker
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stream = None
+        self._warned = False
+
+    def _follow(self):
+        client = docker.from_env()
+        self._stream = client.events(decode=True, filters={"type": "container", "event": ["start", "die"]})
+        self._warned = False
+        for event in self._stream:
+            if self._stop.is_set():
+                break
+            attributes = event.get("Actor", {}).get("Attributes", {})
+            # The dashboard identifies containers by their short ID
+            container_id = (event.get("id") or event.get("Actor", {}).get("ID") or "")[:12]
+            if event.get("status", event.get("Action")) == "start":
+                self._broker.publish("container_started", container_id=container_id, name=attributes.get("name"))
+            else:
+                self._broker.publish("container_stopped", container_id=container_id, name=attributes.get("name"))
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self._follow()
+            except Exception as e:
+                # Logged once per outage; the stream is retried quietly until it reconnects
+                if not self._stop.is_set() and not self._warned:
+                    logger.warning(f"Docker event stream unavailable, retrying every {DOCKER_EVENTS_RETRY_SECONDS}s: {e}")
+                    self._warned = True
+            self._stop.wait(DOCKER_EVENTS_RETRY_SECONDS)
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="grypeui-docker-events", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._stream is not None:
+            try:
+                self._stream.close()
+            except Exception:
+                pass
+
+# Process-wide broker and watcher, started with the app
+event_broker = EventBroker()
+container_watcher = ContainerEventWatcher(event_broker)
@@ -0,0 +1,119 @@
+import asyncio
+import functools
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from database import session_scope
+from logger import logger
+
+# Blocking work (SQLAlchemy, the Docker SDK, Grype) never runs on the event loop.
+# Each kind of work gets its own bounded pool so a long scan cannot starve dashboard
+# reads, and neither competes with Starlette's shared threadpool used by plain `def` routes.
+DB_EXECUTOR_WORKERS = int(os.getenv("DB_EXECUTOR_WORKERS", "4"))
+DOCKER_EXECUTOR_WORKERS = int(os.getenv("DOCKER_EXECUTOR_WORKERS", "4"))
+SCAN_CONCURRENCY = int(os.getenv("SCAN_CONCURRENCY", "2"))
+
+db_executor = ThreadPoolExecutor(max_workers=DB_EXECUTOR_WORKERS, thread_name_prefix="grypeui-db")
+docker_executor = ThreadPoolExecutor(max_workers=DOCKER_EXECUTOR_WORKERS, thread_name_prefix="grypeui-docker")
+scan_executor = ThreadPoolExecutor(max_workers=SCAN_CONCURRENCY, thread_name_prefix="grypeui-scan")
+# Bulk sweeps pipeline the two halves of a scan: exports (daemon + disk bound) and
+# Grype matching (CPU bound) get separate pools, so image N+1 exports while image N is matched.
+BULK_EXPORT_CONCURRENCY = int(os.getenv("BULK_EXPORT_CONCURRENCY", "2"))
+BULK_MATCH_CONCURRENCY = int(os.getenv("BULK_MATCH_CONCURRENCY", str(os.cpu_count() or 2)))
+export_executor = ThreadPoolExecutor(max_workers=BULK_EXPORT_CONCURRENCY, thread_name_prefix="grypeui-export")
+match_executor = ThreadPoolExecutor(max_workers=BULK_MATCH_CONCURRENCY, thread_name_prefix="grypeui-match")
+# Single worker: bulk sweeps are coordinated one at a time
+bulk_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="grypeui-bulk")
+# Single worker: maintenance jobs (e.g. Grype DB refreshes) are serialized
+maintenance_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="grypeui-maintenance")
+
+# Image analysis (tar parsing, filesystem checks) is CPU-heavy pure Python. It runs in a
+# reusable process pool so it neither holds the web process's GIL nor is limited to one core.
+# ANALYSIS_PROCESSES=0 runs analysis in the calling thread instead.
+ANALYSIS_PROCESSES = int(os.getenv("ANALYSIS_PROCESSES", str(min(4, os.cpu_count() or 1))))
+_analysis_pool = None
+_analysis_pool_lock = threading.Lock()
+
+def _get_analysis_pool() -> ProcessPoolExecutor:
+    # Created on first use. forkserver: workers are not forked from a process running threads.
+    global _analysis_pool
+    with _analysis_pool_lock:
+        if _analysis_pool is None:
+            if "forkserver" in multiprocessing.get_all_start_methods():
+                context = multiprocessing.get_context("forkserver")
+                # Preload only the worker entry points, never re-import the app's __main__
+                context.set_forkserver_preload(["services.analysis_worker"])
+            else:
+                context = multiprocessing.get_context("spawn")
+            _analysis_pool = ProcessPoolExecutor(max_workers=ANALYSIS_PROCESSES, mp_context=context)
+        return _analysis_pool
+
+def run_analysis(func, *args, **kwargs):
+    """
+    Runs a module-level function in the analysis process pool and waits for its result.
+    Arguments and results must be small and picklable. Blocking; call from a worker thread.
+    """
+    if ANALYSIS_PROCESSES <= 0:
+        return func(*args, **kwargs)
+    pool = _get_analysis_pool()
+    try:
+        return pool.submit(func, *args, **kwargs).result()
+    except BrokenProcessPool:
+        # A worker died (e.g. OOM-killed); start a fresh pool for the next analysis
+        global _analysis_pool
+        with _analysis_pool_lock:
+            if _analysis_pool is pool:
+                _analysis_pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+        raise
+
+async def run_in_executor(executor, func, *args, **kwargs):
+    """Runs a blocking callable in the given executor and awaits its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, functools.partial(func, *args, **kwargs))
+
+def _call_with_session(func, *args, **kwargs):
+    # Sessions are opened and closed on the worker thread that uses them
+    with session_scope() as db:
+        return func(db, *args, **kwargs)
+
+async def run_db(func, *args, **kwargs):
+    """Runs func(db, *args, **kwargs) on the DB pool with a dedicated session."""
+    return await run_in_executor(db_executor, _call_with_session, func, *args, **kwargs)
+
+async def run_docker(func, *args, **kwargs):
+    """Runs a Docker SDK call on the Docker pool."""
+    return await run_in_executor(docker_executor, func, *args, **kwargs)
+
+async def run_scan(func, *args, **kwargs):
+    """Runs func(db, *args, **kwargs) on the scan pool with a dedicated session."""
+    return await run_in_executor(scan_executor, _call_with_session, func, *args, **kwargs)
+
+def submit_scan(func, *args, **kwargs):
+    """Queues func(db, *args, **kwargs) on the scan pool from non-async code. Returns the Future."""
+    return scan_executor.submit(_call_with_session, func, *args, **kwargs)
+
+async def run_bulk(func, *args, **kwargs):
+    """Runs a bulk sweep coordinator on the single-worker bulk pool."""
+    return await run_in_executor(bulk_executor, func, *args, **kwargs)
+
+async def run_maintenance(func, *args, **kwargs):
+    """Runs a maintenance job on the single-worker maintenance pool."""
+    return await run_in_executor(maintenance_executor, func, *args, **kwargs)
+
+def submit_maintenance(func, *args, **kwargs):
+    """Queues a maintenance job from non-async code. Returns the Future."""
+    return maintenance_executor.submit(func, *args, **kwargs)
+
+def shutdown_executors():
+    """Stops accepting work and drops queued (not yet running) jobs."""
+    for executor in (db_executor, docker_executor, scan_executor, export_executor, match_executor,
+                     bulk_executor, maintenance_executor):
+        executor.shutdown(wait=False, cancel_futures=True)
+    with _analysis_pool_lock:
+        if _analysis_pool is not None:
+            _analysis_pool.shutdown(wait=False, cancel_futures=True)
+    logger.debug("Executors shut down.")
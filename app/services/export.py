@@ -0,0 +1,126 @@
+import csv
+import io
+import json
+import os
+from itertools import islice
+from typing import Iterator
+
+from sqlalchemy import select, or_
+from sqlalchemy.orm import Session
+
+from database import session_scope
+from models.database import Image as DBImage, Scan as DBScan, Vulnerability as DBVulnerability
+from services.findings_store import load_findings, latest_scans_subquery, FINDING_FIELDS
+
+# Findings are streamed from a server-side cursor in batches of EXPORT_BATCH_ROWS rows;
+# each batch is encoded and handed to the response as one chunk, so memory stays flat.
+EXPORT_BATCH_ROWS = int(os.getenv("EXPORT_BATCH_ROWS", "1000"))
+
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+EXPORT_COLUMNS = (
+    "scan_id", "scan_time", "image_id", "image_name", "image_tag", "image_digest", "grype_db_build",
+    "vulnerability_id", "severity", "package_name", "installed_version", "fixed_version", "description",
+)
+
+_SCAN_COLUMNS = (DBScan.id, DBScan.scan_time, DBScan.image_id, DBImage.name, DBImage.tag, DBScan.image_digest,
+                 DBScan.grype_db_build)
+_FINDING_COLUMNS = [getattr(DBVulnerability, field) for field in FINDING_FIELDS]
+
+# Scans are exported oldest first; full and delta-stored scans are interleaved in this order
+_SCAN_ORDER = (DBScan.scan_time, DBScan.id)
+
+def _findings_query():
+    return (
+        select(*_SCAN_COLUMNS, *_FINDING_COLUMNS)
+        .join(DBScan, DBVulnerability.scan_id == DBScan.id)
+        .join(DBImage, DBScan.image_id == DBImage.id, isouter=True)
+    )
+
+def _scans_query():
+    return (
+        select(*_SCAN_COLUMNS, DBScan.findings_storage)
+        .select_from(DBScan)
+        .join(DBImage, DBScan.image_id == DBImage.id, isouter=True)
+    )
+
+def _in_scope(query, scope: str, key=None):
+    if scope == "scan":
+        return query.where(DBScan.id == key)
+    if scope == "image":
+        return query.where(DBScan.image_id == key, DBScan.scan_status == "completed")
+    if scope == "latest":
+        # Latest completed scan of every image
+        latest = latest_scans_subquery()
+        return query.join(latest, DBScan.id == latest.c.scan_id)
+    raise ValueError(f"Unknown export scope '{scope}'")
+
+def _full_findings_query(scope: str, key=None):
+    # Scans stored as deltas (see services.findings_store) have no complete set of rows to join
+    query = _in_scope(_findings_query(), scope, key)
+    query = query.where(or_(DBScan.findings_storage.is_(None), DBScan.findings_storage != "delta"))
+    return query.order_by(*_SCAN_ORDER, DBVulnerability.id)
+
+def _encode_ndjson(rows: list) -> str:
+    return "".join(
+        json.dumps(dict(zip(EXPORT_COLUMNS, row)), default=lambda value: value.isoformat()) + "\n"
+        for row in rows
+    )
+
+def _csv_encoder():
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def encode(rows: list) -> str:
+        writer.writerows(row[:1] + (row[1].isoformat() if row[1] else None,) + row[2:] for row in rows)
+        chunk = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return chunk
+
+    writer.writerow(EXPORT_COLUMNS)
+    return encode
+
+def _scope_rows(db: Session, scope: str, key=None) -> Iterator[tuple]:
+    """Rows of the scope's scans in scan order: full scans read from one streamed query, delta scans rebuilt in between."""
+    scans = db.execute(_in_scope(_scans_query(), scope, key).order_by(*_SCAN_ORDER)).all()
+    full_rows = iter(db.execute(
+        _full_findings_query(scope, key).execution_options(stream_results=True, yield_per=EXPORT_BATCH_ROWS)))
+    pending = next(full_rows, None)
+    for *scan_row, storage in scans:
+        if storage == "delta":
+            for finding in load_findings(db, scan_row[0]):
+                yield tuple(scan_row) + tuple(finding)
+            continue
+        # Both queries share the scan order, so this scan's rows are next on the cursor
+        while pending is not None and pending[0] == scan_row[0]:
+            yield tuple(pending)
+            pending = next(full_rows, None)
+
+def stream_findings(scope: str, key=None, fmt: str = "ndjson") -> Iterator[str]:
+    """
+    Yields one scope's findings (a scan, an image's completed scans, or the fleet's latest scans)
+    as NDJSON or CSV chunks, oldest scan first. Opens its own session: the generator outlives the request handler.
+    """
+    encode = _csv_encoder() if fmt == "csv" else _encode_ndjson
+    if fmt == "csv":
+        yield encode([]) # Header row goes out before the first query result
+    with session_scope() as db:
+        rows = _scope_rows(db, scope, key)
+        while True:
+            batch = list(islice(rows, EXPORT_BATCH_ROWS))
+            if not batch:
+                break
+            yield encode(batch)
+
+def export_scope_exists(db: Session, scope: str, key=None) -> bool:
+    """Checked before streaming starts, so a bad ID still gets a 404 instead of an empty export."""
+    if scope == "scan":
+        return db.query(DBScan.id).filter(DBScan.id == key).first() is not None
+    if scope == "image":
+        return db.query(DBImage.id).filter(DBImage.id == key).first() is not None
+    return True
+
+def export_filename(scope: str, key=None, fmt: str = "ndjson") -> str:
+    suffix = f"-{key}" if key is not None else ""
+    return f"findings-{scope}{suffix}.{fmt}"
@@ -0,0 +1,150 @@
+import os
+from collections import Counter, namedtuple
+from typing import List, Optional
+
+from sqlalchemy import insert, select, literal, func
+from sqlalchemy.orm import Session
+
+from models.database import Scan, Vulnerability
+from logger import logger
+
+# How a scan's findings are stored.
+# FINDINGS_STORAGE: "full" writes every finding of every scan; "delta" writes only the findings
+#   added ("+") or removed ("-") relative to the image's previous completed scan.
+# FINDINGS_SNAPSHOT_EVERY: in delta mode, every Nth scan of a chain is stored in full, which
+#   bounds how many deltas a read has to apply.
+FINDINGS_STORAGE = os.getenv("FINDINGS_STORAGE", "full").lower()
+FINDINGS_SNAPSHOT_EVERY = int(os.getenv("FINDINGS_SNAPSHOT_EVERY", "10"))
+
+FINDING_FIELDS = ("vulnerability_id", "severity", "package_name", "installed_version", "fixed_version", "description")
+Finding = namedtuple("Finding", FINDING_FIELDS)
+
+ADDED = "+"
+REMOVED = "-"
+_MAX_CHAIN = 10000 # Guards against a corrupted (cyclic) chain
+
+_FINDING_COLUMNS = [getattr(Vulnerability, field) for field in FINDING_FIELDS]
+
+def _stored_rows(db: Session, scan_id: int) -> list:
+    return (
+        db.query(Vulnerability.change, *_FINDING_COLUMNS)
+        .filter(Vulnerability.scan_id == scan_id)
+        .order_by(Vulnerability.id)
+        .all()
+    )
+
+def _delta_chain(db: Session, scan_id: int) -> tuple:
+    # Walks from scan_id back to its full snapshot; returns (snapshot_id, deltas oldest first)
+    chain = []
+    current = scan_id
+    while len(chain) < _MAX_CHAIN:
+        row = db.query(Scan.findings_storage, Scan.base_scan_id).filter(Scan.id == current).first()
+        if row is None or row.findings_storage != "delta" or row.base_scan_id is None:
+            break
+        chain.append(current)
+        current = row.base_scan_id
+    return current, list(reversed(chain))
+
+def load_findings(db: Session, scan_id: int) -> List[Finding]:
+    """Returns a scan's complete finding list, applying its deltas onto the nearest full snapshot."""
+    snapshot_id, deltas = _delta_chain(db, scan_id)
+    findings = [Finding(*row[1:]) for row in _stored_rows(db, snapshot_id)]
+    for delta_scan_id in deltas:
+        added, removed = [], Counter()
+        for row in _stored_rows(db, delta_scan_id):
+            if row.change == REMOVED:
+                removed[Finding(*row[1:])] += 1
+            else:
+                added.append(Finding(*row[1:]))
+        if removed:
+            kept = []
+            for finding in findings:
+                if removed[finding] > 0:
+                    removed[finding] -= 1
+                else:
+                    kept.append(finding)
+            findings = kept
+        findings.extend(added)
+    return findings
+
+def is_delta_scan(db: Session, scan_id: int) -> bool:
+    return db.query(Scan.findings_storage).filter(Scan.id == scan_id).scalar() == "delta"
+
+def latest_scans_subquery():
+    """
+    (image_id, scan_id) of every image's latest completed scan, the one with the highest ID.
+    Exports, search and analytics all read "latest" through it, so they agree on the scan.
+    """
+    return (
+        select(Scan.image_id, func.max(Scan.id).label("scan_id"))
+        .where(Scan.scan_status == "completed", Scan.image_id.isnot(None))
+        .group_by(Scan.image_id)
+        .subquery()
+    )
+
+def _delta_base_depth(db: Session, base_scan_id: Optional[int]) -> Optional[int]:
+    # Depth a delta against base_scan_id would have, or None when a full snapshot is due
+    if FINDINGS_STORAGE != "delta" or base_scan_id is None:
+        return None
+    base = db.query(Scan.scan_status, Scan.delta_depth).filter(Scan.id == base_scan_id).first()
+    if base is None or base.scan_status != "completed":
+        return None
+    depth = (base.delta_depth or 0) + 1
+    return depth if depth < FINDINGS_SNAPSHOT_EVERY else None
+
+def _store_full(db: Session, scan: Scan, findings: list):
+    scan.findings_storage = "full"
+    scan.base_scan_id = None
+    scan.delta_depth = 0
+    db.add_all(Vulnerability(scan_id=scan.id, **finding._asdict()) for finding in findings)
+
+def store_findings(db: Session, scan: Scan, vulnerabilities: list, base_scan_id: Optional[int] = None) -> str:
+    """
+    Writes a scan's findings (Vulnerability models from process_scan_result) in the configured mode.
+    In delta mode only the difference to base_scan_id is written, unless a snapshot is due or the
+    delta would not be smaller than the full list. Does not commit. Returns the storage used.
+    """
+    findings = [Finding(*(getattr(v, field) for field in FINDING_FIELDS)) for v in vulnerabilities]
+    depth = _delta_base_depth(db, base_scan_id)
+    if depth is None:
+        _store_full(db, scan, findings)
+        return "full"
+
+    current, previous = Counter(findings), Counter(load_findings(db, base_scan_id))
+    added = list((current - previous).elements())
+    removed = list((previous - current).elements())
+    if len(added) + len(removed) >= len(findings):
+        _store_full(db, scan, findings)
+        return "full"
+
+    scan.findings_storage = "delta"
+    scan.base_scan_id = base_scan_id
+    scan.delta_depth = depth
+    db.add_all(Vulnerability(scan_id=scan.id, change=ADDED, **finding._asdict()) for finding in added)
+    db.add_all(Vulnerability(scan_id=scan.id, change=REMOVED, **finding._asdict()) for finding in removed)
+    logger.debug(f"Scan {scan.id} stored as delta of scan {base_scan_id}: +{len(added)} -{len(removed)} of {len(findings)}")
+    return "delta"
+
+def copy_findings(db: Session, source_scan_id: int, target: Scan):
+    """
+    Gives target (already flushed) the same findings as source_scan_id. In delta mode that is an
+    empty delta while the chain allows it; a full source is copied inside the database.
+    """
+    depth = _delta_base_depth(db, source_scan_id)
+    if depth is not None:
+        target.findings_storage = "delta"
+        target.base_scan_id = source_scan_id
+        target.delta_depth = depth
+        return
+    if is_delta_scan(db, source_scan_id):
+        _store_full(db, target, load_findings(db, source_scan_id))
+        return
+    target.findings_storage = "full"
+    target.delta_depth = 0
+    # Copy the finding rows inside the database rather than through the ORM
+    db.execute(
+        insert(Vulnerability).from_select(
+            ["scan_id"] + list(FINDING_FIELDS),
+            select(literal(target.id), *_FINDING_COLUMNS).where(Vulnerability.scan_id == source_scan_id)
+        )
+    )
@@ -0,0 +1,291 @@
+import json
+import os
+import subprocess
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Optional
+
+from logger import logger
+
+# Grype DB settings. All Grype runs share one DB directory owned by GrypeDBManager.
+# GRYPE_DB_CACHE_DIR: where the DB lives (Grype's own default is used when unset).
+# GRYPE_DB_ARCHIVE: local DB archive to import, for hosts without network access.
+# GRYPE_DB_ONLINE_UPDATE: allow `grype db update` against the upstream listing. Off unless set to true, and
+# never used when GRYPE_DB_ARCHIVE is set; with neither, scans use whatever DB is already in the cache.
+# GRYPE_DB_REFRESH_HOURS: how often the background refresh runs (0 disables it).
+# GRYPE_DB_REMATCH_ON_UPDATE: re-match stored package inventories whenever a new build is installed.
+# GRYPE_DB_FOLLOW_SECONDS: how often a process that does not refresh the DB itself (scan workers, which share
+# the web tier's GRYPE_DB_CACHE_DIR) re-reads which build is installed.
+GRYPE_DB_CACHE_DIR = os.getenv("GRYPE_DB_CACHE_DIR")
+GRYPE_DB_ARCHIVE = os.getenv("GRYPE_DB_ARCHIVE")
+GRYPE_DB_ONLINE_UPDATE = os.getenv("GRYPE_DB_ONLINE_UPDATE", "false").lower() == "true"
+GRYPE_DB_REFRESH_HOURS = float(os.getenv("GRYPE_DB_REFRESH_HOURS", "24"))
+GRYPE_DB_REMATCH_ON_UPDATE = os.getenv("GRYPE_DB_REMATCH_ON_UPDATE", "true").lower() == "true"
+GRYPE_DB_FOLLOW_SECONDS = float(os.getenv("GRYPE_DB_FOLLOW_SECONDS", "60"))
+
+class _ReadWriteLock:
+    """Many concurrent scans (readers) or one DB refresh (writer), never both."""
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writer = False
+
+    @contextmanager
+    def read(self):
+        with self._cond:
+            while self._writer:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._cond:
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
+
+class GrypeDBManager:
+    """
+    Owns the Grype vulnerability DB: refreshes it (from a local archive or upstream),
+    knows which build is installed and hands scans an environment pinned to that build
+    with Grype's own per-run update checks turned off.
+    Exactly one process refreshes a shared DB (the web tier); others start as followers
+    and only track the build it installs.
+    """
+    def __init__(self):
+        self._lock = _ReadWriteLock()
+        self._state_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._refreshed_once = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._follower = False
+        self.current_build: Optional[str] = None
+        self.last_refresh_at: Optional[datetime] = None
+        self.last_refresh_error: Optional[str] = None
+        self._imported_archive_stamp = None
+        self._build_listeners = []
+
+    def _base_env(self) -> dict:
+        env = dict(os.environ)
+        if GRYPE_DB_CACHE_DIR:
+            env["GRYPE_DB_CACHE_DIR"] = GRYPE_DB_CACHE_DIR
+        env["GRYPE_CHECK_FOR_APP_UPDATE"] = "false"
+        return env
+
+    def scan_env(self) -> dict:
+        """Environment for scan runs: no update checks, no age validation, shared DB dir."""
+        env = self._base_env()
+        env["GRYPE_DB_AUTO_UPDATE"] = "false"
+        env["GRYPE_DB_VALIDATE_AGE"] = "false"
+        return env
+
+    def _run_db_command(self, args: list, timeout: int = 1800) -> subprocess.CompletedProcess:
+        return subprocess.run(["grype", "db", *args], capture_output=True, text=True,
+                              check=True, env=self._base_env(), timeout=timeout)
+
+    def read_build(self) -> Optional[str]:
+        """Returns an identifier for the installed DB build (schema@built), or None if there is no valid DB."""
+        try:
+            result = self._run_db_command(["status", "-o", "json"], timeout=60)
+            status = json.loads(result.stdout)
+            schema = status.get("schemaVersion") or status.get("schema")
+            built = status.get("built")
+            if status.get("valid") is False or not built:
+                return None
+            return f"{schema}@{built}" if schema else str(built)
+        except FileNotFoundError:
+            raise
+        except (subprocess.CalledProcessError, json.JSONDecodeError, subprocess.TimeoutExpired):
+            pass
+
+        # Older Grype releases only print a "Key: value" status report
+        try:
+            result = self._run_db_command(["status"], timeout=60)
+        except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
+            logger.debug(f"grype db status failed: {e}")
+            return None
+        fields = {}
+        for line in result.stdout.splitlines():
+            if ":" in line:
+                key, value = line.split(":", 1)
+                fields[key.strip().lower()] = value.strip()
+        if fields.get("status", "valid").lower() != "valid" or not fields.get("built"):
+            return None
+        return f"{fields['schema']}@{fields['built']}" if fields.get("schema") else fields["built"]
+
+    def _archive_stamp(self):
+        stat = os.stat(GRYPE_DB_ARCHIVE)
+        return (GRYPE_DB_ARCHIVE, stat.st_size, stat.st_mtime)
+
+    def refresh(self, force: bool = False) -> Optional[str]:
+        """
+        Brings the DB up to date and records the resulting build.
+        Waits for running scans to finish first so no scan sees a half-written DB.
+        A configured local archive is imported when it changed; otherwise an online update is attempted if allowed.
+        """
+        previous_build = self.current_build
+        with self._lock.write():
+            try:
+                build = self._refresh_locked(force)
+            finally:
+                self._refreshed_once.set()
+        # Listeners run after the write lock is released, so they can start scans
+        if build and build != previous_build:
+            for listener in self._build_listeners:
+                try:
+                    listener(previous_build, build)
+                except Exception as e:
+                    print(f"Grype DB build listener failed: {e}")
+        return build
+
+    def add_build_listener(self, listener):
+        """Registers listener(previous_build, new_build), called whenever a refresh installs a different build."""
+        self._build_listeners.append(listener)
+
+    def _refresh_locked(self, force: bool) -> Optional[str]:
+        try:
+            if GRYPE_DB_ARCHIVE:
+                if not os.path.exists(GRYPE_DB_ARCHIVE):
+                    raise OSError(f"Grype DB archive {GRYPE_DB_ARCHIVE} does not exist.")
+                stamp = self._archive_stamp()
+                if force or stamp != self._imported_archive_stamp or self.read_build() is None:
+                    logger.info(f"Importing Grype DB from archive {GRYPE_DB_ARCHIVE}")
+                    self._run_db_command(["import", GRYPE_DB_ARCHIVE])
+                    self._imported_archive_stamp = stamp
+            elif GRYPE_DB_ONLINE_UPDATE:
+                logger.info("Updating Grype DB from upstream")
+                self._run_db_command(["update"])
+            build = self.read_build()
+            with self._state_lock:
+                self.current_build = build
+                self.last_refresh_at = datetime.utcnow()
+                if build:
+                    self.last_refresh_error = None
+                elif GRYPE_DB_ARCHIVE or GRYPE_DB_ONLINE_UPDATE:
+                    self.last_refresh_error = "No valid Grype DB installed."
+                else:
+                    self.last_refresh_error = "No valid Grype DB installed and no source configured: set GRYPE_DB_ARCHIVE or GRYPE_DB_ONLINE_UPDATE=true."
+            if build:
+                logger.info(f"Grype DB build in use: {build}")
+            else:
+                logger.warning(self.last_refresh_error)
+            return build
+        except FileNotFoundError:
+            with self._state_lock:
+                self.last_refresh_error = "Grype command not found."
+            raise
+        except (subprocess.CalledProcessError, subprocess.TimeoutExpired, OSError) as e:
+            detail = e.stderr if isinstance(e, subprocess.CalledProcessError) else str(e)
+            print(f"Grype DB refresh failed: {detail}")
+            with self._state_lock:
+                self.last_refresh_at = datetime.utcnow()
+                self.last_refresh_error = f"Refresh failed: {str(detail)[:1024]}"
+                # Keep scanning against whatever DB is still installed
+                self.current_build = self.read_build()
+            return self.current_build
+
+    def sync_build(self) -> Optional[str]:
+        """Follower side of refresh(): records the build installed by the refreshing process, without changing the DB."""
+        try:
+            build = self.read_build()
+            with self._state_lock:
+                if build != self.current_build:
+                    logger.info(f"Grype DB build in use: {build}")
+                self.current_build = build
+                self.last_refresh_at = datetime.utcnow()
+                self.last_refresh_error = None if build else "No valid Grype DB installed yet by the refreshing process."
+        finally:
+            self._refreshed_once.set()
+        return build
+
+    def ensure_ready(self) -> Optional[str]:
+        """Makes sure the initial refresh has run (waiting for the background one if it is in progress). Returns the current build."""
+        if not self._refreshed_once.is_set():
+            # First scan after startup: wait for the initial refresh instead of racing it
+            if self._thread and self._thread.is_alive():
+                self._refreshed_once.wait()
+            elif self._follower:
+                self.sync_build()
+            else:
+                self.refresh()
+        return self.current_build
+
+    @contextmanager
+    def scan_session(self):
+        """
+        Yields (env, build) for a Grype run. Holds the read side of the DB lock for the
+        duration of the run so a refresh cannot swap the DB underneath it.
+        """
+        self.ensure_ready()
+        with self._lock.read():
+            yield self.scan_env(), self.current_build
+
+    def status(self) -> dict:
+        with self._state_lock:
+            return {
+                "build": self.current_build,
+                "last_refresh_at": self.last_refresh_at,
+                "last_refresh_error": self.last_refresh_error,
+                "archive": GRYPE_DB_ARCHIVE,
+                "online_update": GRYPE_DB_ONLINE_UPDATE,
+                "refresh_hours": GRYPE_DB_REFRESH_HOURS,
+                "follower": self._follower,
+            }
+
+    def _refresh_loop(self):
+        interval = GRYPE_DB_REFRESH_HOURS * 3600
+        while True:
+            try:
+                self.refresh()
+            except FileNotFoundError:
+                print("Grype command not found; scheduled Grype DB refresh stopped.")
+                return
+            except Exception as e:
+                print(f"Unexpected error during scheduled Grype DB refresh: {e}")
+            if interval <= 0 or self._stop.wait(interval):
+                return
+
+    def _follow_loop(self):
+        while True:
+            try:
+                self.sync_build()
+            except FileNotFoundError:
+                print("Grype command not found; Grype DB build tracking stopped.")
+                return
+            except Exception as e:
+                print(f"Unexpected error while reading the Grype DB build: {e}")
+            if self._stop.wait(GRYPE_DB_FOLLOW_SECONDS):
+                return
+
+    def start(self, follow: bool = False):
+        """
+        Starts the background refresh thread (an initial refresh runs immediately).
+        With follow=True the DB is never updated or imported here: the thread only re-reads
+        the build another process installed in the shared cache (scan workers).
+        """
+        if self._thread and self._thread.is_alive():
+            return
+        self._follower = follow
+        self._stop.clear()
+        target, name = (self._follow_loop, "grype-db-follow") if follow else (self._refresh_loop, "grype-db-refresh")
+        self._thread = threading.Thread(target=target, name=name, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+# Process-wide manager shared by all scans
+grype_db_manager = GrypeDBManager()
@@ -7,6 +7,12 @@ from pathlib import Path
 import concurrent.futures
 from logger import logger
 
+# Dropped into an export's directory when its scan is cancelled (services.scanner.cancel_scan)
+CANCEL_MARKER = ".cancelled"
+
+class ExportCancelled(Exception):
+    """Raised when the scan an export belongs to is cancelled while `docker save` is streaming."""
+
 class ContainerAnalyzer:
     def __init__(self):
         self.client = docker.from_env()
@@ -29,12 +35,14 @@ class ContainerAnalyzer:
             "etc/alpine-release"
         ]
     
-    def analyze_image(self, image_name):
+    def analyze_image(self, image_name, temp_dir_manager=None):
         """
         Efficiently analyze a Docker image without running it
         Returns a dictionary with analysis results, image_tar_path, and the TemporaryDirectory manager object.
+        temp_dir_manager: optional working directory (anything with .name and .cleanup(), e.g. a Spool);
+        a new TemporaryDirectory is used when omitted.
         """
-        temp_dir_manager = tempfile.TemporaryDirectory()
+        temp_dir_manager = temp_dir_manager or tempfile.TemporaryDirectory()
         temp_dir = temp_dir_manager.name
         image_tar_path_for_return = None # Initialize
 
@@ -135,19 +143,45 @@ class ContainerAnalyzer:
                 "_temp_dir_manager_obj": temp_dir_manager # Crucial for cleanup by caller
             }
     
-    def _extract_image_efficiently(self, image_id, temp_dir):
+    def export_image(self, image_name, temp_dir_manager=None):
         """
-        Extracts image layers to rootfs and saves image.tar in temp_dir.
-        Returns rootfs_path and image_tar_path.
+        Only exports the image (docker save) into a temporary directory, without any analysis.
+        Used when analysis results are already known but a later stage still needs the archive.
+        Returns a dictionary with image_tar_path, error and the TemporaryDirectory manager object.
         """
+        temp_dir_manager = temp_dir_manager or tempfile.TemporaryDirectory()
+        try:
+            image = self.client.images.get(image_name)
+            image_tar_path = self._export_image_tar(image.id, temp_dir_manager.name)
+            return {"image_name": image_name, "image_tar_path": image_tar_path, "error": None,
+                    "details": {"image_id": image.id}, "_temp_dir_manager_obj": temp_dir_manager}
+        except docker.errors.DockerException as e:
+            print(f"Error exporting image {image_name}: {e}")
+            temp_dir_manager.cleanup()
+            return {"image_name": image_name, "image_tar_path": None, "error": f"Failed to export image: {str(e)}",
+                    "details": {}, "_temp_dir_manager_obj": None}
+
+    def _export_image_tar(self, image_id, temp_dir):
+        """Streams `docker save` output for the image into temp_dir/image.tar and returns its path."""
         image_tar_path = os.path.join(temp_dir, "image.tar")
+        cancel_marker = os.path.join(temp_dir, CANCEL_MARKER)
         try:
             with open(image_tar_path, 'wb') as f:
                 for chunk in self.client.api.get_image(image_id):
+                    if os.path.exists(cancel_marker):
+                        raise ExportCancelled(f"Export of {image_id} was cancelled")
                     f.write(chunk)
         except docker.errors.APIError as e:
             print(f"Docker API error while getting image {image_id} for extraction: {e}")
             raise 
+        return image_tar_path
+
+    def _extract_image_efficiently(self, image_id, temp_dir):
+        """
+        Extracts image layers to rootfs and saves image.tar in temp_dir.
+        Returns rootfs_path and image_tar_path.
+        """
+        image_tar_path = self._export_image_tar(image_id, temp_dir)
 
         rootfs_path = os.path.join(temp_dir, "rootfs")
         os.makedirs(rootfs_path, exist_ok=True)
@@ -345,9 +379,10 @@ class ContainerAnalyzer:
             print(f"Warning: Skipping layer due to error: {e} (Source: {layer_tar_source if not is_fileobj else 'fileobj'})")
             pass
     
-    def _is_rootless(self, image_details):
+    @staticmethod
+    def _is_rootless(image_details):
         """
-        Check if image is configured to run as non-root
+        Check if image is configured to run as non-root (inspect metadata only, no export needed)
         """
         user = image_details.get("Config", {}).get("User", "")
         
@@ -0,0 +1,89 @@
+import gzip
+import hashlib
+import json
+import os
+import subprocess
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from models.database import ImageInventory
+from services.child_process import run_limited
+from logger import logger
+
+# Top-level syft-json sections Grype does not need for matching. Dropping them keeps
+# stored inventories small (the file catalog alone can be larger than all package data).
+_SBOM_SECTIONS_TO_DROP = ("files",)
+
+# Wall-clock limit for one Syft run, in seconds (0 = no limit)
+SYFT_TIMEOUT_SECONDS = float(os.getenv("SYFT_TIMEOUT_SECONDS", "1800"))
+
+def catalog_image_archive(image_tar_path: str, log_name: str = None) -> Optional[bytes]:
+    """
+    Catalogs the packages in an exported image with Syft.
+    Returns the syft-json document, or None when Syft is unavailable or fails
+    (callers then fall back to letting Grype catalog the archive itself).
+    """
+    log_name = log_name or image_tar_path
+    cmd = ["syft", f"docker-archive:{image_tar_path}", "-o", "syft-json", "-q"]
+    env = dict(os.environ, SYFT_CHECK_FOR_APP_UPDATE="false")
+    try:
+        # Same nice/ionice/memory limits as Grype runs
+        result = run_limited(cmd, env=env, timeout=SYFT_TIMEOUT_SECONDS, text=False)
+    except subprocess.TimeoutExpired:
+        print(f"Syft cataloging of {log_name} did not finish within {SYFT_TIMEOUT_SECONDS:g}s")
+        return None
+    except FileNotFoundError:
+        logger.debug("Syft not found; package inventory will not be stored.")
+        return None
+    except subprocess.CalledProcessError as e:
+        print(f"Syft cataloging failed for {log_name} with exit code {e.returncode}: {e.stderr[:1024]}")
+        return None
+    return result.stdout
+
+def _compact_sbom(sbom_json: bytes) -> dict:
+    document = json.loads(sbom_json)
+    for section in _SBOM_SECTIONS_TO_DROP:
+        document.pop(section, None)
+    return document
+
+def packages_fingerprint(document: dict) -> tuple[int, str]:
+    """Returns (package_count, digest) over the (type, name, version) of all packages in a syft-json document."""
+    packages = sorted(
+        (artifact.get("type", ""), artifact.get("name", ""), artifact.get("version", ""))
+        for artifact in document.get("artifacts", [])
+    )
+    digest = hashlib.sha256(json.dumps(packages).encode()).hexdigest()
+    return len(packages), digest
+
+def store_inventory(db: Session, image_id: str, image_digest: Optional[str], sbom_json: bytes) -> ImageInventory:
+    """Stores (or replaces) the compressed package inventory of an image. Does not commit."""
+    document = _compact_sbom(sbom_json)
+    package_count, packages_digest = packages_fingerprint(document)
+    compressed = gzip.compress(json.dumps(document, separators=(",", ":")).encode())
+
+    inventory = db.query(ImageInventory).filter(ImageInventory.image_id == image_id).first()
+    if not inventory:
+        inventory = ImageInventory(image_id=image_id)
+        db.add(inventory)
+    inventory.image_digest = image_digest
+    inventory.sbom = compressed
+    inventory.package_count = package_count
+    inventory.packages_digest = packages_digest
+    inventory.created_at = datetime.utcnow()
+    logger.debug(f"Stored inventory for {image_id}: {package_count} packages, {len(compressed)} bytes compressed")
+    return inventory
+
+def get_inventory(db: Session, image_id: str) -> Optional[ImageInventory]:
+    return db.query(ImageInventory).filter(ImageInventory.image_id == image_id).first()
+
+@contextmanager
+def materialized_sbom(sbom_gzip: bytes):
+    """Writes a stored inventory to a temporary file Grype can read as `sbom:<path>`; removed on exit."""
+    with tempfile.NamedTemporaryFile(prefix="grypeui-sbom-", suffix=".json") as sbom_file:
+        sbom_file.write(gzip.decompress(sbom_gzip))
+        sbom_file.flush()
+        yield sbom_file.name
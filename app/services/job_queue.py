@@ -0,0 +1,188 @@
+import os
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import or_, and_
+from sqlalchemy.orm import Session
+
+from models.database import ScanJob
+from logger import logger
+
+# JOB_LEASE_SECONDS: how long a claimed job stays with its worker without a heartbeat.
+# A worker that crashes stops heartbeating; its job is claimable again once the lease expires.
+# JOB_MAX_ATTEMPTS: claims per job before it is given up (protects against jobs that crash workers).
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "120"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+# SCAN_EXECUTION: "local" runs scans inside the web process; "queue" hands them to scan workers (worker.py).
+# QUEUE_WAIT_SECONDS: how long a scan request waits for its queued job (without a timeout of its own)
+# before answering 202 with the job to poll.
+SCAN_EXECUTION = os.getenv("SCAN_EXECUTION", "local").lower()
+QUEUE_WAIT_SECONDS = float(os.getenv("QUEUE_WAIT_SECONDS", "300"))
+
+ACTIVE_JOB_STATUSES = ("queued", "claimed")
+
+def enqueue_job(db: Session, image_id: str, kind: str = "scan", force: bool = False,
+                timeout: Optional[int] = None, priority: int = 0) -> ScanJob:
+    """
+    Queues a job, or returns the active job of the same kind for the image (one job per image
+    at a time keeps workers on different hosts from scanning the same image concurrently).
+    A queued duplicate is upgraded to force/higher priority when asked for. Commits.
+    """
+    job = (
+        db.query(ScanJob)
+        .filter(ScanJob.image_id == image_id, ScanJob.kind == kind, ScanJob.status.in_(ACTIVE_JOB_STATUSES))
+        .order_by(ScanJob.id)
+        .first()
+    )
+    if job:
+        if job.status == "queued":
+            job.force = job.force or force
+            job.priority = max(job.priority or 0, priority)
+            if timeout is not None:
+                job.timeout = timeout
+            db.commit()
+        return job
+
+    job = ScanJob(image_id=image_id, kind=kind, force=force, timeout=timeout, priority=priority,
+                  status="queued", attempts=0, max_attempts=JOB_MAX_ATTEMPTS, created_at=datetime.utcnow())
+    db.add(job)
+    db.commit()
+    logger.debug(f"Queued {kind} job {job.id} for image {image_id}")
+    return job
+
+def _claimable(now: datetime):
+    return or_(
+        ScanJob.status == "queued",
+        and_(ScanJob.status == "claimed", ScanJob.lease_expires_at < now),
+    )
+
+def claim_next_job(db: Session, worker_id: str, lease_seconds: int = JOB_LEASE_SECONDS) -> Optional[ScanJob]:
+    """
+    Claims the highest-priority claimable job (queued, or claimed with an expired lease) for worker_id.
+    The claim is a conditional UPDATE, so when workers race for the same job exactly one wins.
+    Returns the claimed job, or None when there is nothing to do.
+    """
+    for _ in range(5): # Lost races retry with the next candidate
+        now = datetime.utcnow()
+        candidate = (
+            db.query(ScanJob.id, ScanJob.attempts, ScanJob.max_attempts, ScanJob.status, ScanJob.cancel_requested)
+            .filter(_claimable(now))
+            .order_by(ScanJob.priority.desc(), ScanJob.id)
+            .first()
+        )
+        if candidate is None:
+            return None
+
+        if candidate.cancel_requested:
+            # Cancelled while its worker was gone: nobody is left to stop, just close it
+            updated = (
+                db.query(ScanJob)
+                .filter(ScanJob.id == candidate.id, _claimable(now))
+                .update({"status": "cancelled", "finished_at": now, "lease_owner": None, "lease_expires_at": None,
+                         "error": "Cancelled while its worker was gone."}, synchronize_session=False)
+            )
+            db.commit()
+            continue
+
+        if (candidate.attempts or 0) >= (candidate.max_attempts or JOB_MAX_ATTEMPTS):
+            # Every earlier claim ended with a lost lease: stop retrying this job
+            updated = (
+                db.query(ScanJob)
+                .filter(ScanJob.id == candidate.id, _claimable(now))
+                .update({"status": "failed", "finished_at": now, "lease_owner": None,
+                         "error": f"Gave up after {candidate.attempts} attempts (worker lease lost each time)."},
+                        synchronize_session=False)
+            )
+            db.commit()
+            if updated:
+                logger.warning(f"Job {candidate.id} failed after {candidate.attempts} attempts")
+            continue
+
+        updated = (
+            db.query(ScanJob)
+            .filter(ScanJob.id == candidate.id, _claimable(now))
+            .update({"status": "claimed", "lease_owner": worker_id,
+                     "lease_expires_at": now + timedelta(seconds=lease_seconds),
+                     "attempts": ScanJob.attempts + 1, "started_at": now},
+                    synchronize_session=False)
+        )
+        db.commit()
+        if updated:
+            job = db.query(ScanJob).filter(ScanJob.id == candidate.id).first()
+            if candidate.status == "claimed":
+                logger.info(f"Worker {worker_id} re-claimed job {job.id} after its lease expired")
+            return job
+    return None
+
+def heartbeat_job(db: Session, job_id: int, worker_id: str, lease_seconds: int = JOB_LEASE_SECONDS) -> bool:
+    """Extends the lease of a job held by worker_id. Returns False when the lease was lost to another worker."""
+    updated = (
+        db.query(ScanJob)
+        .filter(ScanJob.id == job_id, ScanJob.status == "claimed", ScanJob.lease_owner == worker_id)
+        .update({"lease_expires_at": datetime.utcnow() + timedelta(seconds=lease_seconds)}, synchronize_session=False)
+    )
+    db.commit()
+    return bool(updated)
+
+def complete_job(db: Session, job_id: int, worker_id: str, scan_id: Optional[int] = None) -> bool:
+    """Marks a job held by worker_id as done. Returns False when the lease was lost meanwhile."""
+    updated = (
+        db.query(ScanJob)
+        .filter(ScanJob.id == job_id, ScanJob.lease_owner == worker_id, ScanJob.status == "claimed")
+        .update({"status": "done", "finished_at": datetime.utcnow(), "scan_id": scan_id,
+                 "lease_owner": None, "lease_expires_at": None, "error": None}, synchronize_session=False)
+    )
+    db.commit()
+    return bool(updated)
+
+def fail_job(db: Session, job_id: int, worker_id: str, error: str, scan_id: Optional[int] = None,
+             status: str = "failed") -> bool:
+    """
+    Marks a job held by worker_id as failed (or cancelled, when it stopped on request).
+    Scan errors are not retried; the Scan row records them.
+    """
+    updated = (
+        db.query(ScanJob)
+        .filter(ScanJob.id == job_id, ScanJob.lease_owner == worker_id, ScanJob.status == "claimed")
+        .update({"status": status, "finished_at": datetime.utcnow(), "error": error[:1024], "scan_id": scan_id,
+                 "lease_owner": None, "lease_expires_at": None}, synchronize_session=False)
+    )
+    db.commit()
+    return bool(updated)
+
+def cancel_job(db: Session, job_id: int) -> Optional[ScanJob]:
+    """
+    Cancels a job. A queued job is closed right away; a claimed one is flagged, and its worker's
+    heartbeat stops the scan. Finished jobs are returned unchanged. Commits.
+    """
+    job = get_job(db, job_id)
+    if job is None:
+        return None
+    if job.status == "queued":
+        job.status = "cancelled"
+        job.finished_at = datetime.utcnow()
+        job.error = "Cancelled before a worker claimed it."
+    elif job.status == "claimed":
+        job.cancel_requested = True
+    db.commit()
+    return job
+
+def job_cancel_requested(db: Session, job_id: int) -> bool:
+    return bool(db.query(ScanJob.cancel_requested).filter(ScanJob.id == job_id).scalar())
+
+def active_scan_job(db: Session, image_id: str) -> Optional[ScanJob]:
+    """The claimed scan job of an image, if a worker is running one."""
+    return (
+        db.query(ScanJob)
+        .filter(ScanJob.image_id == image_id, ScanJob.kind == "scan", ScanJob.status == "claimed")
+        .first()
+    )
+
+def get_job(db: Session, job_id: int) -> Optional[ScanJob]:
+    return db.query(ScanJob).filter(ScanJob.id == job_id).first()
+
+def list_jobs(db: Session, status: Optional[str] = None, limit: int = 100) -> list:
+    query = db.query(ScanJob)
+    if status:
+        query = query.filter(ScanJob.status == status)
+    return query.order_by(ScanJob.id.desc()).limit(limit).all()
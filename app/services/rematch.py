@@ -0,0 +1,82 @@
+import subprocess
+import time
+from datetime import datetime
+from sqlalchemy.orm import Session
+
+from models.database import Image as DBImage, ImageInventory
+from services.grype_db import grype_db_manager
+from services.inventory import get_inventory, materialized_sbom
+from services.scanner import (
+    run_grype, findings_fingerprint, ingest_scan_data, latest_completed_scan, scan_holds_for_build, ScanTimedOut, ScanCancelled,
+)
+from services.scan_pipeline import ScanPipelineError, image_scan_lock
+from logger import logger
+
+def rematch_image(db: Session, image_id: str, force: bool = False) -> dict:
+    """
+    Re-matches an image's stored package inventory against the current Grype DB, without
+    exporting or cataloging the image again. A new scan row is only written when the
+    findings changed; otherwise the latest scan is recorded as re-validated for the new DB build.
+    A re-match has no scan row to cancel it through: it cannot be cancelled, and its Grype run is
+    only bounded by GRYPE_TIMEOUT_SECONDS (ScanTimedOut).
+    """
+    with image_scan_lock(image_id):
+        return _rematch_image_locked(db, image_id, force)
+
+def _rematch_image_locked(db: Session, image_id: str, force: bool) -> dict:
+    inventory = get_inventory(db, image_id)
+    if not inventory:
+        raise ScanPipelineError(404, f"No stored package inventory for image '{image_id}'. Run a full scan first.")
+
+    latest_scan = latest_completed_scan(db, image_id)
+    current_build = grype_db_manager.current_build
+    if not force and latest_scan and scan_holds_for_build(latest_scan, current_build):
+        return {"image_id": image_id, "status": "up_to_date", "scan_id": latest_scan.id, "grype_db_build": current_build}
+
+    with materialized_sbom(inventory.sbom) as sbom_path:
+        scan_data, grype_db_build = run_grype(f"sbom:{sbom_path}", f"re-match of image {image_id}")
+
+    # Fingerprints cover every match, counted-only ones included; a scan without one (or with one
+    # from before summarized findings were covered) cannot be compared and gets a new scan
+    new_digest = findings_fingerprint(scan_data)
+    if latest_scan and new_digest == latest_scan.findings_digest:
+        # The scan keeps the build it was matched against; the re-validation is recorded beside it
+        latest_scan.revalidated_build = grype_db_build
+        latest_scan.revalidated_at = datetime.utcnow()
+        db.commit()
+        logger.debug(f"Re-match of {image_id} against {grype_db_build}: findings unchanged")
+        return {"image_id": image_id, "status": "unchanged", "scan_id": latest_scan.id, "grype_db_build": grype_db_build}
+
+    db_image = db.query(DBImage).filter(DBImage.id == image_id).first()
+    image_name = f"{db_image.name}:{db_image.tag}" if db_image and db_image.tag else (db_image.name if db_image else None)
+    scan_result = ingest_scan_data(db, image_id, scan_data, grype_db_build, image_name)
+    logger.info(f"Re-match of {image_id} against {grype_db_build}: findings changed, new scan {scan_result.scan_id}")
+    return {"image_id": image_id, "status": "changed", "scan_id": scan_result.scan_id, "grype_db_build": grype_db_build}
+
+def rematch_fleet(db: Session, force: bool = False) -> dict:
+    """Re-matches every image with a stored inventory. Returns a per-status summary."""
+    started = time.monotonic()
+    image_ids = [row.image_id for row in db.query(ImageInventory.image_id).all()]
+    summary = {"images": len(image_ids), "up_to_date": 0, "unchanged": 0, "changed": 0, "failed": 0,
+               "changed_image_ids": [], "failed_image_ids": []}
+
+    for image_id in image_ids:
+        try:
+            outcome = rematch_image(db, image_id, force=force)
+        except FileNotFoundError:
+            raise ScanPipelineError(500, "Scanner tool (Grype) not found on server.")
+        except (subprocess.CalledProcessError, ScanTimedOut, ScanCancelled, ScanPipelineError, ValueError) as e:
+            db.rollback()
+            logger.warning(f"Re-match failed for image {image_id}: {e}")
+            summary["failed"] += 1
+            summary["failed_image_ids"].append(image_id)
+            continue
+        summary[outcome["status"]] += 1
+        if outcome["status"] == "changed":
+            summary["changed_image_ids"].append(image_id)
+
+    summary["grype_db_build"] = grype_db_manager.current_build
+    summary["duration_seconds"] = round(time.monotonic() - started, 3)
+    logger.info(f"Fleet re-match finished: {summary['changed']} changed, {summary['unchanged']} unchanged, "
+                f"{summary['up_to_date']} up to date, {summary['failed']} failed in {summary['duration_seconds']}s")
+    return summary
@@ -0,0 +1,109 @@
+import json
+import os
+from collections import defaultdict
+from typing import Optional
+
+from database import session_scope
+from models.database import Scan as DBScan, VulnerabilityCounts
+from services.findings_store import load_findings
+from logger import logger
+
+# Per-scan risk aggregates, computed once at ingest and stored on VulnerabilityCounts so the
+# dashboard can sort and filter without reading finding rows.
+# A finding scores its highest CVSS base score from Grype; findings without one score by severity.
+# RISK_TOP_PACKAGES: how many of the highest-risk packages are kept per scan.
+RISK_SEVERITY_SCORES = {"critical": 9.0, "high": 7.0, "medium": 5.0, "low": 2.0, "negligible": 0.5, "unknown": 1.0}
+RISK_TOP_PACKAGES = int(os.getenv("RISK_TOP_PACKAGES", "5"))
+
+SEVERITIES = tuple(RISK_SEVERITY_SCORES)
+
+def cvss_base_score(vuln_info: dict) -> Optional[float]:
+    """Highest CVSS base score Grype reports for a vulnerability, or None."""
+    scores = [
+        entry.get("metrics", {}).get("baseScore")
+        for entry in vuln_info.get("cvss") or []
+        if isinstance(entry, dict)
+    ]
+    scores = [score for score in scores if isinstance(score, (int, float))]
+    return max(scores) if scores else None
+
+def finding_risk(severity: str, cvss_score: Optional[float] = None) -> float:
+    if cvss_score is not None:
+        return float(cvss_score)
+    return RISK_SEVERITY_SCORES.get(severity, RISK_SEVERITY_SCORES["unknown"])
+
+class RiskTally:
+    """Accumulates one scan's findings into the VulnerabilityCounts aggregate columns."""
+    def __init__(self):
+        self.fixable = dict.fromkeys(SEVERITIES, 0)
+        self.risk = 0.0
+        self.fixable_risk = 0.0
+        self.packages = defaultdict(lambda: {"findings": 0, "fixable": 0, "risk": 0.0})
+
+    def add(self, severity: str, package_name: str, installed_version: str, fixable: bool, score: float):
+        severity = severity if severity in self.fixable else "unknown"
+        package = self.packages[(package_name, installed_version)]
+        package["findings"] += 1
+        package["risk"] += score
+        self.risk += score
+        if fixable:
+            self.fixable[severity] += 1
+            self.fixable_risk += score
+            package["fixable"] += 1
+
+    def aggregates(self) -> dict:
+        top = sorted(self.packages.items(), key=lambda item: (-item[1]["risk"], item[0]))[:RISK_TOP_PACKAGES]
+        return {
+            "fixable": sum(self.fixable.values()),
+            **{f"fixable_{severity}": count for severity, count in self.fixable.items()},
+            "risk_score": round(self.risk, 1),
+            "fixable_risk_score": round(self.fixable_risk, 1),
+            "top_packages": json.dumps([
+                {"package": name, "version": version, "findings": package["findings"],
+                 "fixable": package["fixable"], "risk": round(package["risk"], 1)}
+                for (name, version), package in top
+            ]),
+        }
+
+def parse_top_packages(value: Optional[str]) -> Optional[list]:
+    return json.loads(value) if value else None
+
+def risk_summary_fields(counts) -> dict:
+    """ScanSummary's aggregate fields from a VulnerabilityCounts row or the dict process_scan_result returns."""
+    get = counts.get if isinstance(counts, dict) else (lambda field: getattr(counts, field, None))
+    return dict(
+        risk_score=get("risk_score"),
+        fixable_risk_score=get("fixable_risk_score"),
+        fixable_count=get("fixable"),
+        top_packages=parse_top_packages(get("top_packages")),
+    )
+
+def backfill_risk_aggregates(batch_size: int = 200) -> int:
+    """
+    Computes the aggregates for completed scans stored before they existed. Their CVSS scores
+    were never stored, so these findings score by severity. Returns the number of scans updated.
+    """
+    updated = 0
+    while True:
+        with session_scope() as db:
+            rows = (
+                db.query(VulnerabilityCounts)
+                .join(DBScan, DBScan.id == VulnerabilityCounts.scan_id)
+                .filter(VulnerabilityCounts.risk_score.is_(None), DBScan.scan_status == "completed")
+                .limit(batch_size)
+                .all()
+            )
+            for counts in rows:
+                tally = RiskTally()
+                for finding in load_findings(db, counts.scan_id):
+                    tally.add(finding.severity, finding.package_name, finding.installed_version,
+                              bool(finding.fixed_version), finding_risk(finding.severity))
+                for column, value in tally.aggregates().items():
+                    setattr(counts, column, value)
+            db.commit()
+        updated += len(rows)
+        if len(rows) < batch_size:
+            break
+    if updated:
+        logger.info(f"Backfilled risk aggregates for {updated} scans")
+    return updated
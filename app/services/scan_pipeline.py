@@ -0,0 +1,577 @@
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlalchemy.orm import Session
+
+from models.database import Image as DBImage, Scan as DBScan, ScanCheckpoint
+from models.schemas import ScanSummary, ImageAnalysis
+from services.scanner import (
+    scan_image as service_scan_image, find_reusable_scan, clone_scan, start_scan, ingest_scan_data,
+    finish_scan_unsuccessfully, ScanTimedOut, ScanCancelled, track_scan, set_scan_work_dir, raise_if_cancelled,
+    cancel_requested
+)
+from services.checkpoints import record_checkpoint, get_checkpoint, list_checkpoints, load_match_output
+from services.docker import get_image_digest, inspect_image
+from services.grype_db import grype_db_manager
+from services.job_queue import JOB_LEASE_SECONDS
+from services.view_logic import get_scan_summary
+from services.analysis_worker import analyze_image_in_worker, export_image_in_worker
+from services.image_analyzer import ContainerAnalyzer
+from services.executors import run_analysis
+from services.inventory import catalog_image_archive, store_inventory, get_inventory, materialized_sbom
+from services.spool import spool_manager, SpoolBudgetExceeded
+from logger import logger
+
+class ScanPipelineError(Exception):
+    """Raised when a scan cannot be completed. Carries the HTTP status the API should report."""
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+_image_locks = defaultdict(threading.Lock)
+_image_locks_guard = threading.Lock()
+
+def get_image_lock(image_id: str) -> threading.Lock:
+    """The lock behind image_scan_lock. A plain Lock, so a pipelined scan may release it from another thread."""
+    with _image_locks_guard:
+        return _image_locks[image_id]
+
+@contextmanager
+def image_scan_lock(image_id: str):
+    """Serializes scans, re-matches and analyses of the same image within this process."""
+    with get_image_lock(image_id):
+        yield
+
+# Image columns holding analysis results, copied between images with the same content
+_ANALYSIS_FIELDS = ("is_rootless", "is_shellless", "is_distroless", "image_analysis_error", "last_analyzed_at",
+                    "found_shell_path", "found_package_manager_path", "distribution_info")
+
+def _reuse_existing_scan(db: Session, db_image: DBImage, image_ref: str) -> Optional[ScanSummary]:
+    """Returns an existing result for the image's content digest and the current Grype DB build, or None."""
+    if not db_image.digest:
+        db_image.digest = get_image_digest(image_ref)
+        if not db_image.digest:
+            return None
+        db.commit()
+
+    grype_db_build = grype_db_manager.ensure_ready()
+    source_scan = find_reusable_scan(db, db_image.digest, grype_db_build, db_image.id)
+    if not source_scan:
+        return None
+
+    if source_scan.image_id != db_image.id:
+        # Same bytes known under another image row: copy the result rather than rescanning
+        source_image = source_scan.image
+        if db_image.last_analyzed_at is None and source_image and source_image.last_analyzed_at:
+            for field in _ANALYSIS_FIELDS:
+                setattr(db_image, field, getattr(source_image, field))
+        source_scan = clone_scan(db, source_scan, db_image.id)
+        logger.info(f"Cloned scan of {db_image.digest} ({grype_db_build}) to image {db_image.id} as scan {source_scan.id}")
+    else:
+        logger.info(f"Reusing scan {source_scan.id} for image {db_image.id}: same content and Grype DB build")
+    return get_scan_summary(db, source_scan.id)
+
+def _analysis_is_current(db_image: DBImage, digest: Optional[str] = None) -> bool:
+    """
+    Analysis results can be reused when they completed without error for the image's current content
+    (digest, when the caller just inspected it; otherwise the digest stored on the image).
+    """
+    digest = digest or db_image.digest
+    return bool(
+        db_image.last_analyzed_at
+        and not db_image.image_analysis_error
+        and digest
+        and db_image.analyzed_digest == digest
+    )
+
+def _save_analysis_results(db: Session, db_image: DBImage, analysis_results: dict):
+    # Save boolean results and other analysis details
+    db_image.is_rootless = analysis_results.get("is_rootless")
+    db_image.is_shellless = analysis_results.get("is_shellless")
+    db_image.is_distroless = analysis_results.get("is_distroless")
+    db_image.image_analysis_error = analysis_results.get("error")
+    db_image.last_analyzed_at = datetime.utcnow()
+    # Save specific paths found (or None)
+    db_image.found_shell_path = analysis_results.get("details", {}).get("found_shell_path")
+    db_image.found_package_manager_path = analysis_results.get("details", {}).get("found_package_manager_path")
+    # Save distribution info
+    db_image.distribution_info = analysis_results.get("details", {}).get("distribution_info")
+    # Remember which content was analyzed, so later scans can tell whether the results still apply
+    analyzed_image_id = analysis_results.get("details", {}).get("image_id") or ""
+    if analyzed_image_id.startswith("sha256:"):
+        db_image.analyzed_digest = analyzed_image_id
+        if not db_image.digest:
+            db_image.digest = analyzed_image_id
+    db.commit()
+
+def _image_analysis(db_image: DBImage, image_name: str, source: str) -> ImageAnalysis:
+    return ImageAnalysis(
+        image_id=db_image.id, image_name=image_name, image_digest=db_image.analyzed_digest or db_image.digest,
+        source=source, is_rootless=db_image.is_rootless, is_shellless=db_image.is_shellless,
+        is_distroless=db_image.is_distroless, analysis_error=db_image.image_analysis_error,
+        found_shell_path=db_image.found_shell_path, found_package_manager_path=db_image.found_package_manager_path,
+        distribution_info=db_image.distribution_info, analyzed_at=db_image.last_analyzed_at,
+    )
+
+def lookup_image_analysis(db: Session, image_id: str, force: bool = False,
+                          details: Optional[dict] = None) -> tuple[Optional[ImageAnalysis], Optional[dict]]:
+    """
+    The cheap tiers of an analysis-only request: one image inspect (current content digest and
+    the rootless verdict), then stored results for that content, on this image or on another image
+    with the same content. Returns the analysis, or None when the filesystem has to be exported
+    and analyzed, together with the inspect; pass that back as details to repeat only the DB checks.
+    """
+    db_image = db.query(DBImage).filter(DBImage.id == image_id).first()
+    if not db_image:
+        raise ScanPipelineError(404, f"Image with ID '{image_id}' not found in database.")
+    image_name = f"{db_image.name}:{db_image.tag}" if db_image.tag else db_image.name
+    if force:
+        return None, None
+    details = details or inspect_image(image_name)
+    if not details or not details.get("Id"):
+        return None, None # Not local (analyze_image pulls it) or the daemon is unreachable
+    # The tag may point at new content since the image was last scanned. The image keeps the digest
+    # it was scanned with until results for the new content are stored on it.
+    digest = details["Id"]
+
+    source = None
+    if _analysis_is_current(db_image, digest):
+        source = "cached"
+    else:
+        source_image = (
+            db.query(DBImage)
+            .filter(DBImage.analyzed_digest == digest, DBImage.id != db_image.id,
+                    DBImage.last_analyzed_at.isnot(None), DBImage.image_analysis_error.is_(None))
+            .order_by(DBImage.last_analyzed_at.desc())
+            .first()
+        )
+        if source_image:
+            # Same bytes already analyzed under another image row
+            for field in _ANALYSIS_FIELDS:
+                setattr(db_image, field, getattr(source_image, field))
+            db_image.analyzed_digest = source_image.analyzed_digest
+            source = "shared"
+    if not source:
+        return None, details
+    db_image.digest = digest
+    # Rootless only depends on the image config, so the inspect answers it directly
+    db_image.is_rootless = ContainerAnalyzer._is_rootless(details)
+    db.commit()
+    return _image_analysis(db_image, image_name, source), details
+
+def run_image_analysis(db: Session, image_id: str, force: bool = False, details: Optional[dict] = None) -> ImageAnalysis:
+    """
+    Rootless, shellless and distroless verdicts for an image, without a Grype scan, stored on
+    the image. Answered by lookup_image_analysis when possible; otherwise the image is exported
+    into a spool directory and analyzed in the analysis pool, under the image's scan lock.
+    details is the inspect of the caller's lookup_image_analysis miss, so the image is not inspected again.
+    Blocking; meant to be run on the scan executor, never on the event loop.
+    """
+    with image_scan_lock(image_id):
+        # A scan of the image that held the lock may have just stored fresh results
+        cached, _ = lookup_image_analysis(db, image_id, force, details)
+        if cached:
+            return cached
+        return _export_and_analyze(db, image_id)
+
+def _export_and_analyze(db: Session, image_id: str) -> ImageAnalysis:
+    db_image = db.query(DBImage).filter(DBImage.id == image_id).first()
+    image_name = f"{db_image.name}:{db_image.tag}" if db_image.tag else db_image.name
+    try:
+        work_dir = spool_manager.acquire(db_image.size, label=image_name)
+    except SpoolBudgetExceeded as e_spool:
+        print(f"Export of {image_name} not admitted: {e_spool}")
+        raise ScanPipelineError(503, "Not enough spool space to export the image right now; try again later.")
+    try:
+        logger.debug(f"Analyzing {image_name} (DB ID: {image_id}) without a Grype scan")
+        analysis_results = run_analysis(analyze_image_in_worker, image_name, work_dir.name)
+    except Exception as e:
+        raise ScanPipelineError(500, f"Failed to analyze image {image_name}. Error: {str(e)}")
+    finally:
+        work_dir.cleanup() # Nothing is matched afterwards; the export is not kept
+    _save_analysis_results(db, db_image, analysis_results)
+    if db_image.analyzed_digest and not db_image.image_analysis_error:
+        # Results for the image's current content are now stored on it
+        db_image.digest = db_image.analyzed_digest
+        db.commit()
+    return _image_analysis(db_image, image_name, "analyzed")
+
+class PreparedScan:
+    """
+    Output of the prepare stage, handed to the match stage. Holds either a finished result
+    (reused scan) or what Grype should match: a stored inventory or, without a cataloger,
+    the exported archive (whose spool directory then stays alive until cleanup()).
+    Carries no ORM objects, so the match stage may run on another thread with its own session.
+    """
+    def __init__(self, image_id: str, image_name: str, result: Optional[ScanSummary] = None,
+                 sbom: Optional[bytes] = None, image_tar_path: Optional[str] = None,
+                 temp_dir_manager=None, exported: bool = False, scan_id: Optional[int] = None):
+        self.image_id = image_id
+        self.scan_id = scan_id # Running Scan row the match stage continues
+        self.image_name = image_name
+        self.result = result
+        self.sbom = sbom # Compressed syft-json inventory
+        self.image_tar_path = image_tar_path
+        self.temp_dir_manager = temp_dir_manager
+        self.exported = exported # The image was exported/analyzed during prepare
+
+    def cleanup(self):
+        if self.temp_dir_manager:
+            logger.debug(f"Cleaning up temporary directory for image analysis of {self.image_name}.")
+            self.temp_dir_manager.cleanup()
+            self.temp_dir_manager = None
+
+def run_image_scan(db: Session, image_id: str, force: bool = False, timeout: Optional[float] = None) -> ScanSummary:
+    """
+    Runs image analysis followed by a Grype scan for the given image ID.
+    Unless force is set, a completed scan of the same image content against the same
+    Grype DB build is reused instead of exporting and scanning again.
+    timeout overrides GRYPE_TIMEOUT_SECONDS for the Grype run.
+    Blocking; meant to be run on the scan executor, never on the event loop.
+    """
+    with image_scan_lock(image_id):
+        prepared = prepare_image_scan(db, image_id, force)
+        return match_prepared_scan(db, prepared, timeout)
+
+def prepare_image_scan(db: Session, image_id: str, force: bool = False, scan_id: Optional[int] = None) -> PreparedScan:
+    """
+    The I/O-bound stage of a scan: reuse check, export, analysis and cataloging.
+    Unless the scan is reused, a running Scan row is created (or scan_id is continued, when
+    resuming) and each completed stage is checkpointed, so a restart can pick up from there.
+    The caller must hold the image's scan lock until the prepared scan has been matched.
+    """
+    db_image = db.query(DBImage).filter(DBImage.id == image_id).first()
+    if not db_image:
+        raise ScanPipelineError(404, f"Image with ID '{image_id}' not found in database.")
+
+    image_name_for_analysis = f"{db_image.name}:{db_image.tag}" if db_image.tag else db_image.name
+
+    analysis_temp_dir_manager = None # Initialize to ensure it's defined for the except blocks
+    analyzer_reached = False
+    try:
+        # 0. Content-addressed reuse, unless a rescan is forced
+        if not force and scan_id is None:
+            reused_result = _reuse_existing_scan(db, db_image, image_name_for_analysis)
+            if reused_result:
+                return PreparedScan(image_id, image_name_for_analysis, result=reused_result)
+
+        if scan_id is None:
+            scan_id = start_scan(db, image_id).id
+            record_checkpoint(db, scan_id, image_id, "started", forced=force)
+
+        # Check which stages still need the image bytes before exporting anything
+        analysis_is_current = not force and _analysis_is_current(db_image)
+        inventory = None if force else get_inventory(db, db_image.id)
+        inventory_is_current = bool(inventory and db_image.digest and inventory.image_digest == db_image.digest)
+
+        if analysis_is_current and inventory_is_current:
+            # Nothing needs the export: match the stored inventory against the current DB
+            logger.info(f"Analysis and inventory of {image_id} are current; scanning without exporting the image.")
+            return PreparedScan(image_id, image_name_for_analysis, sbom=inventory.sbom, scan_id=scan_id)
+
+        # Cancels are honoured between stages; an export in progress also watches for them (CANCEL_MARKER)
+        raise_if_cancelled(scan_id)
+        # Exports go to a managed spool directory; waits here while the spool budget is exhausted
+        analysis_temp_dir_manager = spool_manager.acquire(db_image.size, label=image_name_for_analysis)
+        set_scan_work_dir(scan_id, analysis_temp_dir_manager.name)
+        raise_if_cancelled(scan_id)
+        # Export and analysis run in the analysis process pool, writing into the spool directory
+        analyzer_reached = True
+        if analysis_is_current:
+            # 1a. Analysis results are still valid; the export is only needed for cataloging
+            logger.debug(f"Analysis of {image_id} is current; exporting {image_name_for_analysis} for cataloging only.")
+            analysis_results = run_analysis(export_image_in_worker, image_name_for_analysis, analysis_temp_dir_manager.name)
+            raise_if_cancelled(scan_id)
+        else:
+            # 1b. Perform Image Analysis (Rootless, Shellless, Distroless)
+            logger.debug(f"Attempting to analyze image characteristics: {image_name_for_analysis} (DB ID: {image_id})")
+            # Returns the analysis results and image_tar_path (inside the spool directory)
+            analysis_results = run_analysis(analyze_image_in_worker, image_name_for_analysis, analysis_temp_dir_manager.name)
+            raise_if_cancelled(scan_id) # Before the (possibly cut short) results are stored
+            _save_analysis_results(db, db_image, analysis_results)
+            record_checkpoint(db, scan_id, image_id, "analyzed")
+            logger.debug(f"Image analysis results for {image_id} saved to DB.")
+
+        image_tar_path_for_grype = analysis_results.get("image_tar_path")
+
+        # Check if image analysis itself failed critically before proceeding to Grype
+        if analysis_results.get("error"):
+            # If there was an error in analysis that prevented getting tar path, we can't scan with Grype
+            print(f"Image analysis for {image_id} encountered an error: {analysis_results.get('error')}. Skipping Grype scan.")
+            if not image_tar_path_for_grype:
+                raise ScanPipelineError(500, f"Image analysis failed to produce a scan target: {analysis_results.get('error')}")
+            # If tar path exists but there was some other non-critical analysis error, we still try to scan.
+
+        if not image_tar_path_for_grype:
+            # Safeguard; should already be caught by the analysis error check above
+            print(f"No image tar path found for {image_id} after analysis. Cannot proceed with Grype scan.")
+            raise ScanPipelineError(500, "Image analysis did not yield a tarball for scanning.")
+
+        if inventory_is_current:
+            # The export was only needed for analysis; the stored inventory is still valid
+            analysis_temp_dir_manager.cleanup()
+            return PreparedScan(image_id, image_name_for_analysis, sbom=inventory.sbom, exported=True, scan_id=scan_id)
+
+        # 2. Catalog packages once and keep the inventory, so Grype DB updates only need a re-match
+        sbom_json = catalog_image_archive(image_tar_path_for_grype, image_name_for_analysis)
+        raise_if_cancelled(scan_id)
+        if sbom_json:
+            inventory = store_inventory(db, db_image.id, analysis_results.get("details", {}).get("image_id"), sbom_json)
+            record_checkpoint(db, scan_id, image_id, "cataloged") # Commits the inventory too
+            # Matching reads the stored inventory, so the export can be released right away
+            analysis_temp_dir_manager.cleanup()
+            return PreparedScan(image_id, image_name_for_analysis, sbom=inventory.sbom, exported=True, scan_id=scan_id)
+
+        # 3. No cataloger available: Grype catalogs and scans the exported tarball itself,
+        # so the spool directory is handed over to the match stage (and kept across a restart)
+        record_checkpoint(db, scan_id, image_id, "exported", artifact_path=analysis_temp_dir_manager.name)
+        return PreparedScan(image_id, image_name_for_analysis, image_tar_path=image_tar_path_for_grype,
+                            temp_dir_manager=analysis_temp_dir_manager, exported=True, scan_id=scan_id)
+
+    except FileNotFoundError as e_grype_fnf:
+        print(f"Grype command not found during scan trigger: {e_grype_fnf}")
+        db.rollback() # Rollback any potential partial DB changes from analysis if Grype setup fails
+        _cleanup_quietly(analysis_temp_dir_manager)
+        _fail_scan(db, scan_id, "Scanner tool (Grype) not found on server.")
+        raise ScanPipelineError(500, "Scanner tool (Grype) not found on server.")
+    except ScanPipelineError as e_pipeline:
+        _cleanup_quietly(analysis_temp_dir_manager)
+        _fail_scan(db, scan_id, e_pipeline.detail)
+        raise
+    except ScanCancelled as e_cancelled:
+        _cleanup_quietly(analysis_temp_dir_manager)
+        raise _end_cancelled_scan(db, scan_id, str(e_cancelled))
+    except SpoolBudgetExceeded as e_spool:
+        print(f"Export of {image_name_for_analysis} not admitted: {e_spool}")
+        _fail_scan(db, scan_id, str(e_spool))
+        raise ScanPipelineError(503, "Not enough spool space to export the image right now; try again later.")
+    except Exception as e_main:
+        _cleanup_quietly(analysis_temp_dir_manager)
+        if cancel_requested(scan_id):
+            # E.g. the export stopped at the cancel marker
+            db.rollback()
+            raise _end_cancelled_scan(db, scan_id, cancel_requested(scan_id))
+        _record_outer_error(db, image_id, image_name_for_analysis, e_main, analyzer_reached)
+        _fail_scan(db, scan_id, str(e_main))
+        raise ScanPipelineError(500, f"Failed to process or scan image {image_name_for_analysis}. Error: {str(e_main)}")
+
+def match_prepared_scan(db: Session, prepared: PreparedScan, timeout: Optional[float] = None) -> ScanSummary:
+    """The CPU-bound stage of a scan: matches the prepared inventory or archive with Grype and ingests the findings."""
+    if prepared.result is not None:
+        return prepared.result
+    try:
+        if prepared.sbom is not None:
+            logger.debug(f"Attempting to scan image with Grype using stored inventory (Original name: {prepared.image_name}, DB ID: {prepared.image_id})")
+            with materialized_sbom(prepared.sbom) as sbom_path:
+                return service_scan_image(
+                    image_id=prepared.image_id,
+                    db=db,
+                    image_name_with_tag=prepared.image_name,
+                    sbom_path=sbom_path,
+                    timeout=timeout,
+                    scan_id=prepared.scan_id
+                )
+        logger.debug(f"Attempting to scan image with Grype using tarball: {prepared.image_tar_path} (Original name: {prepared.image_name}, DB ID: {prepared.image_id})")
+        return service_scan_image(
+            image_tar_path=prepared.image_tar_path,
+            image_id=prepared.image_id,
+            db=db,
+            image_name_with_tag=prepared.image_name, # Pass for logging/context if needed
+            timeout=timeout,
+            scan_id=prepared.scan_id
+        )
+    except ScanTimedOut as e_timeout:
+        # The Scan row is already marked timed_out
+        raise ScanPipelineError(504, str(e_timeout))
+    except ScanCancelled as e_cancelled:
+        # The Scan row is already marked cancelled
+        raise ScanPipelineError(409, str(e_cancelled))
+    except FileNotFoundError as e_grype_fnf:
+        print(f"Grype command not found during scan trigger: {e_grype_fnf}")
+        db.rollback()
+        _fail_scan(db, prepared.scan_id, "Scanner tool (Grype) not found on server.")
+        raise ScanPipelineError(500, "Scanner tool (Grype) not found on server.")
+    except Exception as e_main:
+        _record_outer_error(db, prepared.image_id, prepared.image_name, e_main, prepared.exported)
+        _fail_scan(db, prepared.scan_id, str(e_main))
+        raise ScanPipelineError(500, f"Failed to process or scan image {prepared.image_name}. Error: {str(e_main)}")
+    finally:
+        # Ensure the spool directory from image analysis is cleaned up
+        prepared.cleanup()
+
+def _end_cancelled_scan(db: Session, scan_id: int, detail: str) -> ScanPipelineError:
+    # Marks a scan cancelled before or outside Grype and returns the error the API reports
+    db_scan = db.query(DBScan).filter(DBScan.id == scan_id).first()
+    if db_scan and db_scan.scan_status in ("running", "processing"):
+        finish_scan_unsuccessfully(db, db_scan, "cancelled", detail)
+    return ScanPipelineError(409, detail)
+
+def _fail_scan(db: Session, scan_id: Optional[int], detail: str):
+    # Ends a scan that stopped before or outside Grype; scans Grype already finished are left as they are
+    if scan_id is None:
+        return
+    db_scan = db.query(DBScan).filter(DBScan.id == scan_id).first()
+    if db_scan and db_scan.scan_status in ("running", "processing"):
+        finish_scan_unsuccessfully(db, db_scan, "failed", detail)
+
+def _cleanup_quietly(temp_dir_manager):
+    if temp_dir_manager:
+        temp_dir_manager.cleanup() # Idempotent; also returns the spool reservation
+
+def _record_outer_error(db: Session, image_id: str, image_name: str, error: Exception, analyzer_reached: bool):
+    db.rollback() # Rollback any DB changes if an unexpected error occurs
+    print(f"Error during scan trigger for image {image_id} ({image_name}): {error}")
+    # Update image_analysis_error in DB if the analyzer was reached before the failure
+    if not analyzer_reached:
+        return
+    try:
+        db_image = db.query(DBImage).filter(DBImage.id == image_id).first()
+        if db_image:
+            db_image.image_analysis_error = f"Outer scope error: {str(error)}"
+            db.commit()
+    except Exception as e_commit_err:
+        db.rollback()
+        print(f"Failed to commit outer scope analysis error to DB: {e_commit_err}")
+
+def resume_scan(db: Session, scan_id: int, timeout: Optional[float] = None) -> ScanSummary:
+    """
+    Continues an interrupted scan from its last checkpoint: ingests stored Grype output,
+    re-matches a stored inventory or a kept export, or re-runs the remaining stages.
+    """
+    checkpoint = get_checkpoint(db, scan_id)
+    if checkpoint is None:
+        raise ScanPipelineError(404, f"Scan {scan_id} has no checkpoint to resume from.")
+    image_id = checkpoint.image_id
+    with image_scan_lock(image_id):
+        # Re-read under the lock: a scan still running in this process may have finished meanwhile
+        db.expire_all()
+        checkpoint = get_checkpoint(db, scan_id)
+        if checkpoint is None:
+            raise ScanPipelineError(409, f"Scan {scan_id} is no longer interrupted.")
+        db_image = db.query(DBImage).filter(DBImage.id == image_id).first()
+        db_scan = db.query(DBScan).filter(DBScan.id == scan_id).first()
+        if not db_image or not db_scan:
+            if db_scan:
+                finish_scan_unsuccessfully(db, db_scan, "failed", "Image no longer exists.")
+            raise ScanPipelineError(404, f"Image or scan for checkpoint {scan_id} no longer exists.")
+        image_name = f"{db_image.name}:{db_image.tag}" if db_image.tag else db_image.name
+        stage = checkpoint.stage
+        logger.info(f"Resuming scan {scan_id} of {image_name} from stage '{stage}'")
+        track_scan(scan_id, image_id)
+
+        if stage == "matched":
+            # Grype already ran: only the ingest was lost
+            return ingest_scan_data(db, image_id, load_match_output(checkpoint), checkpoint.grype_db_build,
+                                    image_name, scan=db_scan)
+
+        prepared = None
+        if stage == "exported" and checkpoint.artifact_path:
+            spool = spool_manager.adopt(checkpoint.artifact_path, db_image.size, label=image_name)
+            if spool and os.path.exists(os.path.join(spool.name, "image.tar")):
+                prepared = PreparedScan(image_id, image_name, image_tar_path=os.path.join(spool.name, "image.tar"),
+                                        temp_dir_manager=spool, exported=True, scan_id=scan_id)
+            elif spool:
+                spool.cleanup()
+        elif stage == "cataloged":
+            inventory = get_inventory(db, image_id)
+            if inventory:
+                prepared = PreparedScan(image_id, image_name, sbom=inventory.sbom, scan_id=scan_id)
+
+        if prepared is None:
+            # Re-run the remaining stages; stored analysis/inventory are picked up when current.
+            # A forced scan interrupted before any stage completed is still forced.
+            prepared = prepare_image_scan(db, image_id, force=bool(checkpoint.forced and stage == "started"), scan_id=scan_id)
+        return match_prepared_scan(db, prepared, timeout)
+
+def resume_interrupted_scans(db: Session) -> dict:
+    """
+    Resumes every checkpointed scan, and marks running scans without a checkpoint as failed
+    (they cannot be resumed). Meant to run once at startup. Returns a summary.
+    """
+    started = time.monotonic()
+    checkpoints = list_checkpoints(db)
+    checkpointed_ids = {checkpoint.scan_id for checkpoint in checkpoints}
+    summary = {"resumed": 0, "failed": 0, "abandoned": 0, "failed_scan_ids": []}
+
+    for db_scan in db.query(DBScan).filter(DBScan.scan_status.in_(("running", "processing"))).all():
+        if db_scan.id not in checkpointed_ids:
+            finish_scan_unsuccessfully(db, db_scan, "failed", "Interrupted by a restart before any stage was recorded.")
+            summary["abandoned"] += 1
+
+    for checkpoint in checkpoints:
+        scan_id = checkpoint.scan_id
+        try:
+            resume_scan(db, scan_id)
+            summary["resumed"] += 1
+        except Exception as e:
+            db.rollback()
+            detail = e.detail if isinstance(e, ScanPipelineError) else str(e)
+            print(f"Resuming scan {scan_id} failed: {detail}")
+            # Do not retry the same checkpoint on every restart
+            _fail_scan(db, scan_id, f"Resume failed: {detail}")
+            summary["failed"] += 1
+            summary["failed_scan_ids"].append(scan_id)
+    if checkpoints or summary["abandoned"]:
+        logger.info(f"Interrupted scans: {summary['resumed']} resumed, {summary['failed']} failed, "
+                    f"{summary['abandoned']} abandoned in {time.monotonic() - started:.1f}s")
+    return summary
+
+# How often a worker taking over a scan checks whether the previous holder stopped working on it
+_TAKEOVER_POLL_SECONDS = 2.0
+
+def _wait_for_previous_holder(db: Session, image_id: str, since: datetime, lease_seconds: float):
+    """
+    Waits until no unfinished scan of the image has a checkpoint updated within the lease window.
+    A fresh checkpoint means the worker that lost the job is still running the scan; it stops
+    (leaving the checkpoint behind) once its heartbeat notices, and the checkpoint then ages.
+    Raises ScanPipelineError(409) when the scan is still being worked on after two lease windows.
+    """
+    deadline = time.monotonic() + 2 * lease_seconds
+    while True:
+        busy = (
+            db.query(ScanCheckpoint.scan_id)
+            .join(DBScan, DBScan.id == ScanCheckpoint.scan_id)
+            .filter(DBScan.image_id == image_id, DBScan.scan_status.in_(("running", "processing")),
+                    DBScan.scan_time >= since,
+                    ScanCheckpoint.updated_at >= datetime.utcnow() - timedelta(seconds=lease_seconds))
+            .first()
+        )
+        db.rollback() # End the read, so the next poll sees the other worker's commits
+        if busy is None:
+            return
+        if time.monotonic() >= deadline:
+            raise ScanPipelineError(409, f"Scan {busy.scan_id} of image {image_id} is still being worked on by another worker.")
+        logger.info(f"Waiting for the previous holder of scan {busy.scan_id} (image {image_id}) to stop before taking it over")
+        time.sleep(_TAKEOVER_POLL_SECONDS)
+
+def recover_image_scan(db: Session, image_id: str, since: datetime, timeout: Optional[float] = None,
+                       lease_seconds: float = JOB_LEASE_SECONDS) -> Optional[ScanSummary]:
+    """
+    Picks up the scan of an image whose worker lost its job (its queue lease expired). The newest
+    checkpointed scan started since `since` is resumed, once its checkpoint shows the previous
+    worker stopped on it; unfinished scans without a checkpoint are marked failed.
+    Returns None when there was nothing to resume.
+    """
+    _wait_for_previous_holder(db, image_id, since, lease_seconds)
+    unfinished = (
+        db.query(DBScan)
+        .filter(DBScan.image_id == image_id, DBScan.scan_status.in_(("running", "processing")), DBScan.scan_time >= since)
+        .order_by(DBScan.id.desc())
+        .all()
+    )
+    resumable = None
+    for db_scan in unfinished:
+        if get_checkpoint(db, db_scan.id) is None:
+            finish_scan_unsuccessfully(db, db_scan, "failed", "Worker lost before any stage was recorded.")
+        elif resumable is None:
+            resumable = db_scan.id
+        else:
+            finish_scan_unsuccessfully(db, db_scan, "failed", "Superseded by a newer attempt of the same job.")
+    if resumable is None:
+        return None
+    return resume_scan(db, resumable, timeout)
@@ -1,10 +1,25 @@
+import hashlib
+import os
 import subprocess
 import json
+import threading
 from datetime import datetime
+from typing import Optional
 # Adjusting import paths based on the new structure
 from models.database import Scan, Vulnerability, VulnerabilityCounts, Image as DBImage
-from models.schemas import ScanResult, VulnerabilityModel
+from models.schemas import ScanSummary
+from sqlalchemy import case, or_
 from sqlalchemy.orm import Session # For type hinting
+from services.grype_db import grype_db_manager
+from services.child_process import run_limited, kill_process_group
+from services.image_analyzer import CANCEL_MARKER
+from services.checkpoints import record_checkpoint, clear_checkpoint
+from services.findings_store import store_findings, copy_findings, load_findings, FINDINGS_STORAGE
+from services.risk import RiskTally, cvss_base_score, finding_risk, risk_summary_fields
+from services.search import record_scan_findings
+from services.analytics import fleet_analytics
+from services.events import event_broker, scan_finished_fields
+from services.trends import record_scan_trend, count_fixable_for_scan
 from logger import logger
 
 # The spec defines get_db_session() but it's not standard FastAPI `Depends` pattern.
@@ -12,83 +27,265 @@ from logger import logger
 # If it's meant to be used with `Depends(get_db_session)`, 
 # then scanner functions might need to be API endpoints or refactored.
 
-def scan_image(image_id: str, db: Session, image_tar_path: str, image_name_with_tag: str = None):
+# Wall-clock limit for one Grype run, in seconds (0 = no limit). Can be overridden per scan.
+GRYPE_TIMEOUT_SECONDS = float(os.getenv("GRYPE_TIMEOUT_SECONDS", "1800"))
+
+# Lowest severity whose findings are stored with full details (critical, high, medium, low,
+# negligible, unknown). Findings below it are only counted in VulnerabilityCounts; the default
+# stores everything.
+FINDINGS_MIN_SEVERITY = os.getenv("FINDINGS_MIN_SEVERITY", "unknown").lower()
+
+class ScanTimedOut(Exception):
+    """Raised when a Grype run exceeded its wall-clock limit and was killed."""
+
+class ScanCancelled(Exception):
+    """Raised when a Grype run was cancelled through cancel_scan."""
+
+# Scans running in this process (scan ID -> image ID) and their Grype processes, so they can be
+# cancelled from another thread. A cancel kills a running Grype process, stops an export in progress
+# at its next chunk (CANCEL_MARKER in its spool directory, checked by the analysis worker) and is
+# checked by the pipeline between stages.
+_active_scans = {}
+_active_runs = {}
+_scan_work_dirs = {}
+_cancel_requested = {} # Scan ID -> reason
+_released_scans = set() # Cancelled because another worker took the scan over; its rows are no longer ours
+_active_runs_lock = threading.Lock()
+
+def track_scan(scan_id: int, image_id: str):
+    """Registers a scan this process is about to run, so cancel_scan can reach it."""
+    with _active_runs_lock:
+        _active_scans[scan_id] = image_id
+
+def untrack_scan(scan_id: int):
+    with _active_runs_lock:
+        _active_scans.pop(scan_id, None)
+        _scan_work_dirs.pop(scan_id, None)
+        _cancel_requested.pop(scan_id, None)
+        _released_scans.discard(scan_id)
+
+def active_image_scans(image_id: str) -> list:
+    """IDs of the scans of image_id running in this process."""
+    with _active_runs_lock:
+        return [scan_id for scan_id, scan_image_id in _active_scans.items() if scan_image_id == image_id]
+
+def set_scan_work_dir(scan_id: int, work_dir: Optional[str]):
+    """Records the spool directory a scan exports into (None once the export is done)."""
+    with _active_runs_lock:
+        if work_dir:
+            _scan_work_dirs[scan_id] = work_dir
+        else:
+            _scan_work_dirs.pop(scan_id, None)
+        cancelled = scan_id in _cancel_requested
+    if cancelled and work_dir:
+        _mark_cancelled(work_dir)
+
+def _mark_cancelled(work_dir: str):
+    try:
+        open(os.path.join(work_dir, CANCEL_MARKER), "w").close()
+    except OSError:
+        pass # Directory already cleaned up
+
+def cancel_scan(scan_id: int, reason: str = None, release: bool = False) -> bool:
     """
-    Scans an image using Grype from a tarball and processes the results.
-    The image_name_with_tag is optional and used for logging/context if provided.
+    Cancels a scan running in this process, at whatever stage it is in. The pipeline ends it as
+    cancelled (with reason, when given). With release=True the run just stops and leaves the Scan
+    row and its checkpoint to whoever took the scan over (a worker that re-claimed its job).
+    Returns False when no such scan is known in this process.
     """
-    scan_target = f"docker-archive:{image_tar_path}"
-    log_name = image_name_with_tag if image_name_with_tag else image_tar_path
+    with _active_runs_lock:
+        if scan_id not in _active_scans and scan_id not in _active_runs:
+            return False
+        _cancel_requested[scan_id] = reason or f"Scan {scan_id} was cancelled"
+        if release:
+            _released_scans.add(scan_id)
+        process = _active_runs.get(scan_id)
+        work_dir = _scan_work_dirs.get(scan_id)
+    if work_dir:
+        _mark_cancelled(work_dir)
+    if process is not None:
+        kill_process_group(process)
+    return True
+
+def cancel_image_scans(image_id: str, reason: str = None, release: bool = False) -> list:
+    """Cancels every scan of image_id running in this process. Returns their scan IDs."""
+    return [scan_id for scan_id in active_image_scans(image_id) if cancel_scan(scan_id, reason, release)]
+
+def cancel_requested(scan_id: Optional[int]) -> Optional[str]:
+    """The reason scan_id was cancelled, or None when it was not."""
+    with _active_runs_lock:
+        return _cancel_requested.get(scan_id)
 
-    # print(f"Executing Grype scan for target: {scan_target} (Image ID: {image_id}, Original name: {log_name})")
-    logger.debug(f"Executing Grype scan for target: {scan_target} (Image ID: {image_id}, Original name: {log_name})")
+def raise_if_cancelled(scan_id: Optional[int]):
+    """Called between pipeline stages: raises ScanCancelled when the scan was cancelled meanwhile."""
+    reason = cancel_requested(scan_id)
+    if reason:
+        raise ScanCancelled(reason)
+
+def get_scan_status(db: Session, scan_id: int):
+    """Returns the status of a scan, or None if it does not exist."""
+    return db.query(Scan.scan_status).filter(Scan.id == scan_id).scalar()
+
+def _register_run(scan_id, process):
+    with _active_runs_lock:
+        _active_runs[scan_id] = process
+        cancelled = scan_id in _cancel_requested
+    if cancelled: # Cancelled while Grype was starting
+        kill_process_group(process)
+
+def run_grype(scan_target: str, log_name: str, scan_id: int = None, timeout: float = None) -> tuple[dict, str]:
+    """
+    Runs Grype against a scan target (docker-archive:..., sbom:...) using the managed DB.
+    Returns the parsed JSON output and the Grype DB build it was matched against.
+    Raises ScanTimedOut after timeout seconds (default GRYPE_TIMEOUT_SECONDS) and
+    ScanCancelled when the run is cancelled via cancel_scan(scan_id).
+    """
+    logger.debug(f"Executing Grype scan for target: {scan_target} ({log_name})")
     cmd = ["grype", scan_target, "-o", "json"]
+    timeout = GRYPE_TIMEOUT_SECONDS if timeout is None else timeout
+    on_start = (lambda process: _register_run(scan_id, process)) if scan_id is not None else None
+    try:
+        # Every run uses the managed DB: no per-run update checks, pinned to the current build
+        with grype_db_manager.scan_session() as (grype_env, grype_db_build):
+            result = run_limited(cmd, env=grype_env, timeout=timeout, on_start=on_start)
+    except subprocess.TimeoutExpired:
+        raise ScanTimedOut(f"Grype did not finish within {timeout:g}s for {log_name}")
+    except subprocess.CalledProcessError:
+        if cancel_requested(scan_id):
+            raise ScanCancelled(f"{cancel_requested(scan_id)} ({log_name})")
+        raise
+    finally:
+        if scan_id is not None:
+            with _active_runs_lock:
+                _active_runs.pop(scan_id, None)
+    raise_if_cancelled(scan_id)
+    return json.loads(result.stdout), grype_db_build
+
+def start_scan(db: Session, image_id: str) -> Scan:
+    """Creates the Scan row for a run that is about to start, so it can be tracked and cancelled. Commits."""
+    db_image = db.query(DBImage).filter(DBImage.id == image_id).first()
+    scan = Scan(
+        image_id=image_id,
+        scan_time=datetime.utcnow(),
+        scan_status="running",
+        image_digest=db_image.digest if db_image else None
+    )
+    db.add(scan)
+    db.commit()
+    track_scan(scan.id, image_id)
+    event_broker.publish("scan_started", image_id=image_id, scan_id=scan.id)
+    return scan
+
+def finish_scan_unsuccessfully(db: Session, scan: Scan, status: str, detail: str, log_name: str = None):
+    """Marks a scan failed/timed_out/cancelled with the reason and drops its checkpoint. Commits."""
+    with _active_runs_lock:
+        released = scan.id in _released_scans
+    if released:
+        # Another worker resumes this scan from its checkpoint; leave both untouched
+        db.rollback()
+        untrack_scan(scan.id)
+        logger.info(f"Scan {scan.id} stopped here and was left to the worker that took it over")
+        return
+    try:
+        scan.scan_status = status
+        scan.scan_details = detail[:1024]
+        scan.grype_db_build = scan.grype_db_build or grype_db_manager.current_build
+        clear_checkpoint(db, scan.id)
+        db.commit()
+        untrack_scan(scan.id)
+        event_broker.publish("scan_failed", image_id=scan.image_id, scan_id=scan.id, status=status, detail=scan.scan_details)
+    except Exception as db_error:
+        print(f"Additionally, failed to update scan status in DB for {log_name}: {db_error}")
+        db.rollback()
+
+def scan_image(image_id: str, db: Session, image_tar_path: str = None, image_name_with_tag: str = None, sbom_path: str = None,
+               timeout: float = None, scan_id: int = None):
+    """
+    Scans an image using Grype and processes the results.
+    Scans the stored package inventory when sbom_path is given, otherwise the exported tarball.
+    The image_name_with_tag is optional and used for logging/context if provided.
+    Continues the running Scan row scan_id, or creates one before Grype starts; it ends up
+    "completed", "failed", "timed_out" or "cancelled".
+    """
+    scan_target = f"sbom:{sbom_path}" if sbom_path else f"docker-archive:{image_tar_path}"
+    log_name = image_name_with_tag if image_name_with_tag else (image_tar_path or sbom_path)
+
+    scan = db.query(Scan).filter(Scan.id == scan_id).first() if scan_id is not None else None
+    if scan is None:
+        scan = start_scan(db, image_id)
     try:
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+        scan_data, grype_db_build = run_grype(scan_target, f"Image ID: {image_id}, Original name: {log_name}",
+                                              scan_id=scan.id, timeout=timeout)
     except FileNotFoundError:
         print(f"Error: Grype command not found. Ensure Grype is installed and in PATH. Attempted to scan: {log_name}")
+        finish_scan_unsuccessfully(db, scan, "failed", "Grype command not found.", log_name)
         raise Exception(f"Grype command not found. Could not scan {log_name}") # Re-raise for handling upstream
+    except ScanTimedOut as e:
+        print(str(e))
+        finish_scan_unsuccessfully(db, scan, "timed_out", str(e), log_name)
+        raise
+    except ScanCancelled as e:
+        print(str(e))
+        finish_scan_unsuccessfully(db, scan, "cancelled", str(e), log_name)
+        raise
     except subprocess.CalledProcessError as e:
         print(f"Grype scan failed for {log_name} with exit code {e.returncode}: {e.stderr}")
-        # Attempt to save a failed scan status if possible
-        try:
-            existing_scan = db.query(Scan).filter(Scan.image_id == image_id).order_by(Scan.scan_time.desc()).first()
-            if existing_scan and existing_scan.scan_status != "failed":
-                existing_scan.scan_status = "failed"
-                existing_scan.scan_details = f"Grype failed: {e.stderr[:1024]}" # Store some error detail
-                db.commit()
-            elif not existing_scan:
-                # Create a new scan record indicating failure if one doesn't exist from a previous step
-                failed_scan = Scan(
-                    image_id=image_id,
-                    scan_time=datetime.utcnow(),
-                    scan_status="failed",
-                    scan_details=f"Grype failed: {e.stderr[:1024]}"
-                )
-                db.add(failed_scan)
-                db.commit()
-        except Exception as db_error:
-            print(f"Additionally, failed to update/create scan status in DB for {log_name} after Grype failure: {db_error}")
-            db.rollback()
+        finish_scan_unsuccessfully(db, scan, "failed", f"Grype failed: {e.stderr[:1024]}", log_name)
         raise Exception(f"Grype scan failed for {log_name}: {e.stderr}")
 
-    scan_data = json.loads(result.stdout)
-    
-    # Create new scan
-    new_scan = Scan(
-        image_id=image_id,
-        scan_time=datetime.utcnow(),
-        scan_status="processing" # Initial status
-    )
-    db.add(new_scan)
+    # Keep the Grype output until it is ingested, so a restart does not have to match again
+    record_checkpoint(db, scan.id, image_id, "matched", scan_data=scan_data, grype_db_build=grype_db_build)
+    return ingest_scan_data(db, image_id, scan_data, grype_db_build, image_name_with_tag, scan=scan)
+
+def ingest_scan_data(db: Session, image_id: str, scan_data: dict, grype_db_build: str = None, image_name_with_tag: str = None,
+                     scan: Scan = None) -> ScanSummary:
+    """
+    Stores Grype output as a completed scan (findings and counts) and returns its summary.
+    Fills the given running Scan row, or creates a new one.
+    """
+    db_image_for_result = db.query(DBImage).filter(DBImage.id == image_id).first()
+
+    if scan is not None:
+        new_scan = scan
+        new_scan.scan_status = "processing"
+        new_scan.grype_db_build = grype_db_build
+    else:
+        # Create new scan
+        new_scan = Scan(
+            image_id=image_id,
+            scan_time=datetime.utcnow(),
+            scan_status="processing", # Initial status
+            grype_db_build=grype_db_build,
+            image_digest=db_image_for_result.digest if db_image_for_result else None
+        )
+        db.add(new_scan)
     db.flush()  # To get the scan_id for associations
     
     # Process vulnerabilities and counts
     vulnerabilities_db_models, counts = process_scan_result(scan_data, new_scan.id)
+    new_scan.detail_min_severity = detail_min_severity()
     
-    # Add vulnerability counts
-    vuln_counts_db_model = VulnerabilityCounts(
-        scan_id=new_scan.id,
-        critical=counts['critical'],
-        high=counts['high'],
-        medium=counts['medium'],
-        low=counts['low'],
-        negligible=counts['negligible'],
-        unknown=counts['unknown']
-    )
+    # Add vulnerability counts (with the risk and fixability aggregates)
+    vuln_counts_db_model = VulnerabilityCounts(scan_id=new_scan.id, **counts)
     db.add(vuln_counts_db_model)
     
-    # Add vulnerabilities
-    for vuln_db_model in vulnerabilities_db_models:
-        db.add(vuln_db_model)
+    # Add vulnerabilities (in delta mode, only the change since the image's previous completed scan)
+    base_scan = latest_completed_scan(db, image_id) if FINDINGS_STORAGE == "delta" else None
+    store_findings(db, new_scan, vulnerabilities_db_models, base_scan.id if base_scan else None)
     
+    new_scan.findings_digest = findings_fingerprint(scan_data)
     new_scan.scan_status = "completed" # Update status after processing
+    clear_checkpoint(db, new_scan.id) # Lands atomically with the findings
+    record_scan_trend(db, new_scan, counts, counts['fixable'])
+    record_scan_findings(db, new_scan, vulnerabilities_db_models)
     db.commit()
+    untrack_scan(new_scan.id)
+    fleet_analytics.mark_stale(image_id)
+    event_broker.publish("scan_finished", **scan_finished_fields(new_scan, counts))
     
-    # Fetch the DBImage object to get analysis details
-    db_image_for_result = db.query(DBImage).filter(DBImage.id == image_id).first()
+    # Use the DBImage object fetched above for the analysis details
     if not db_image_for_result:
-        logger.error(f"Could not find DBImage with id {image_id} when preparing ScanResult in scanner.py")
+        logger.error(f"Could not find DBImage with id {image_id} when preparing the scan summary in scanner.py")
         image_name_val = image_name_with_tag 
         is_rootless_val, is_shellless_val, is_distroless_val = None, None, None
         analysis_error_val, found_shell_path_val, dist_info_val, found_pkg_mgr_path_val = None, None, None, None
@@ -102,21 +299,21 @@ def scan_image(image_id: str, db: Session, image_tar_path: str, image_name_with_
         dist_info_val = db_image_for_result.distribution_info
         found_pkg_mgr_path_val = db_image_for_result.found_package_manager_path
 
-    # Prepare Pydantic models for the response
-    vulnerabilities_pydantic_models = [VulnerabilityModel.from_orm(v) for v in vulnerabilities_db_models]
-    
-    return ScanResult(
+    # Findings are not turned into response models here; callers that want them load the full view
+    return ScanSummary(
         scan_id=new_scan.id,
         image_id=image_id,
         scan_time=new_scan.scan_time,
         scan_status=new_scan.scan_status,
-        vulnerabilities=vulnerabilities_pydantic_models,
+        grype_db_build=new_scan.grype_db_build,
         critical_count=counts['critical'],
         high_count=counts['high'],
         medium_count=counts['medium'],
         low_count=counts['low'],
         negligible_count=counts['negligible'],
         unknown_count=counts['unknown'],
+        summarized_severities=summarized_severities(new_scan.detail_min_severity),
+        **risk_summary_fields(counts),
         
         # Add R/S/D fields from db_image_for_result
         image_name=image_name_val,
@@ -129,7 +326,85 @@ def scan_image(image_id: str, db: Session, image_tar_path: str, image_name_with_
         found_package_manager_path=found_pkg_mgr_path_val
     )
 
-def process_scan_result(scan_data, scan_id):
+def clone_scan(db: Session, source_scan: Scan, image_id: str) -> Scan:
+    """
+    Copies a completed scan (counts and findings) to another image row with the same content,
+    instead of exporting and scanning the same bytes again. Commits and returns the new Scan.
+    """
+    cloned_scan = Scan(
+        image_id=image_id,
+        scan_time=datetime.utcnow(),
+        scan_status="completed",
+        grype_db_build=source_scan.grype_db_build,
+        revalidated_build=source_scan.revalidated_build,
+        revalidated_at=source_scan.revalidated_at,
+        findings_digest=source_scan.findings_digest,
+        image_digest=source_scan.image_digest,
+        detail_min_severity=source_scan.detail_min_severity
+    )
+    db.add(cloned_scan)
+    db.flush()
+
+    source_counts = source_scan.counts
+    # Counts and aggregates are copied as they are (severity counts default to 0 when missing)
+    copied_counts = {
+        column.name: getattr(source_counts, column.name) if source_counts else None
+        for column in VulnerabilityCounts.__table__.columns if column.name != "scan_id"
+    }
+    copied_counts.update({field: copied_counts[field] or 0 for field in ("critical", "high", "medium", "low", "negligible", "unknown")})
+    db.add(VulnerabilityCounts(scan_id=cloned_scan.id, **copied_counts))
+
+    copy_findings(db, source_scan.id, cloned_scan)
+    record_scan_findings(db, cloned_scan, load_findings(db, source_scan.id))
+    fixable = copied_counts["fixable"]
+    record_scan_trend(db, cloned_scan, copied_counts,
+                      fixable if fixable is not None else count_fixable_for_scan(db, source_scan.id))
+    db.commit()
+    fleet_analytics.mark_stale(image_id)
+    event_broker.publish("scan_finished", **scan_finished_fields(cloned_scan, copied_counts))
+    return cloned_scan
+
+def find_reusable_scan(db: Session, image_digest: str, grype_db_build: str, image_id: str = None):
+    """
+    Returns the latest completed scan of the same image content that holds for the given Grype DB build
+    (matched against it, or re-validated for it by a re-match), or None.
+    Scans of image_id itself are preferred, so an image that already has a result is not re-cloned.
+    Scans stored with a different detail threshold (FINDINGS_MIN_SEVERITY) are not reused.
+    """
+    if not image_digest or not grype_db_build:
+        return None
+    min_severity = detail_min_severity()
+    return (
+        db.query(Scan)
+        .filter(Scan.image_digest == image_digest)
+        .filter(or_(Scan.grype_db_build == grype_db_build, Scan.revalidated_build == grype_db_build))
+        .filter(Scan.scan_status == "completed")
+        .filter(Scan.detail_min_severity == min_severity if min_severity else Scan.detail_min_severity.is_(None))
+        .order_by(case((Scan.image_id == image_id, 0), else_=1), Scan.scan_time.desc())
+        .first()
+    )
+
+def scan_holds_for_build(scan: Scan, grype_db_build: str) -> bool:
+    """Whether a scan's findings are those of grype_db_build: it was matched against it, or re-validated for it."""
+    return bool(grype_db_build) and grype_db_build in (scan.grype_db_build, scan.revalidated_build)
+
+def latest_completed_scan(db: Session, image_id: str):
+    """Returns the most recent completed Scan of an image, or None."""
+    return (
+        db.query(Scan)
+        .filter(Scan.image_id == image_id)
+        .filter(Scan.scan_status == "completed")
+        .order_by(Scan.scan_time.desc())
+        .first()
+    )
+
+def process_scan_result(scan_data, scan_id, min_severity: str = None):
+    """
+    Turns Grype output into Vulnerability models and the VulnerabilityCounts values: per-severity
+    counts plus the risk and fixability aggregates of services/risk.py. Every finding is counted,
+    but models are only built for findings at or above min_severity (default FINDINGS_MIN_SEVERITY).
+    """
+    detail_rank = SEVERITY_ORDER.get(detail_min_severity(min_severity), len(SEVERITY_ORDER))
     vulnerabilities_db_models = []
     counts = {
         'critical': 0,
@@ -139,6 +414,7 @@ def process_scan_result(scan_data, scan_id):
         'negligible': 0,
         'unknown': 0
     }
+    risk = RiskTally()
     
     for match in scan_data.get('matches', []):
         vuln_info = match.get('vulnerability', {})
@@ -150,6 +426,11 @@ def process_scan_result(scan_data, scan_id):
             counts['unknown'] += 1
         else:
             counts[severity] += 1
+        fix_versions = (vuln_info.get("fix") or {}).get("versions")
+        risk.add(severity, match.get('artifact', {}).get('name', 'N/A'), match.get('artifact', {}).get('version', 'N/A'),
+                 bool(fix_versions), finding_risk(severity, cvss_base_score(vuln_info)))
+        if SEVERITY_ORDER.get(severity, SEVERITY_ORDER['unknown']) > detail_rank:
+            continue # Summarized: counted only
         
         description_parts = [] 
         if vuln_info.get('description'):
@@ -172,8 +453,24 @@ def process_scan_result(scan_data, scan_id):
             description=" ".join(description_parts).strip() or None # Ensure description is not empty string
         ))
     
+    counts.update(risk.aggregates())
     return vulnerabilities_db_models, counts 
 
+def findings_fingerprint(scan_data: dict) -> str:
+    """
+    Order-independent digest of every match in Grype output, used to tell whether a re-match changed
+    anything. Covers summarized findings (below FINDINGS_MIN_SEVERITY) and the CVSS scores too, since
+    the stored counts and risk aggregates are computed from them.
+    """
+    keys = []
+    for match in scan_data.get('matches', []):
+        vuln_info = match.get('vulnerability', {})
+        artifact = match.get('artifact', {})
+        fix_versions = (vuln_info.get("fix") or {}).get("versions") or [""]
+        keys.append(json.dumps([vuln_info.get('id', 'N/A'), artifact.get('name', 'N/A'), artifact.get('version', 'N/A'),
+                                fix_versions[0], vuln_info.get('severity', 'Unknown').lower(), cvss_base_score(vuln_info)]))
+    return hashlib.sha256("\n".join(sorted(keys)).encode()).hexdigest()
+
 # Severity levels for sorting
 SEVERITY_ORDER = {
     'critical': 0,
@@ -182,4 +479,18 @@ SEVERITY_ORDER = {
     'low': 3,
     'negligible': 4,
     'unknown': 5
-} 
\ No newline at end of file
+}
+
+if FINDINGS_MIN_SEVERITY not in SEVERITY_ORDER:
+    logger.warning(f"Unknown FINDINGS_MIN_SEVERITY '{FINDINGS_MIN_SEVERITY}', storing all findings")
+
+def detail_min_severity(min_severity: str = None):
+    """The effective detail threshold: None when every severity is stored with details."""
+    min_severity = (min_severity or FINDINGS_MIN_SEVERITY).lower()
+    return None if min_severity not in SEVERITY_ORDER or min_severity == 'unknown' else min_severity
+
+def summarized_severities(min_severity: str = None) -> list:
+    """Severities below a scan's detail threshold (Scan.detail_min_severity), which are only counted."""
+    if min_severity is None:
+        return []
+    return [severity for severity, rank in SEVERITY_ORDER.items() if rank > SEVERITY_ORDER[min_severity]] 
\ No newline at end of file
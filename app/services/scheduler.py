@@ -0,0 +1,204 @@
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from database import session_scope
+from models.database import Image as DBImage, Scan as DBScan, ScanJob
+from services.docker import get_running_containers
+from services.view_logic import get_container_display_data
+from services.executors import submit_scan
+from services.grype_db import grype_db_manager
+from services.job_queue import enqueue_job, ACTIVE_JOB_STATUSES, SCAN_EXECUTION
+from services.scan_pipeline import run_image_scan
+from services.scanner import scan_holds_for_build
+from logger import logger
+
+# Background rescans that keep every image's latest completed scan younger than a target age.
+# SCHEDULE_MAX_AGE_HOURS: target age of the latest completed scan (0 disables the scheduler).
+# SCHEDULE_CONCURRENCY: scheduled scans in flight at once; keep it below SCAN_CONCURRENCY so
+#   interactive scans always find a free slot.
+# SCHEDULE_INTERVAL_SECONDS: how often the fleet is re-planned (finished scans also trigger a re-plan).
+# SCHEDULE_RETRY_MINUTES: wait after any scan attempt before an image is scheduled again, so images
+#   that keep failing (e.g. removed from the host) are not retried on every pass.
+# SCHEDULE_SCOPE: "running" covers images of running containers, "all" every known image.
+SCHEDULE_MAX_AGE_HOURS = float(os.getenv("SCHEDULE_MAX_AGE_HOURS", "0"))
+SCHEDULE_CONCURRENCY = int(os.getenv("SCHEDULE_CONCURRENCY", "1"))
+SCHEDULE_INTERVAL_SECONDS = float(os.getenv("SCHEDULE_INTERVAL_SECONDS", "60"))
+SCHEDULE_RETRY_MINUTES = float(os.getenv("SCHEDULE_RETRY_MINUTES", "60"))
+SCHEDULE_SCOPE = os.getenv("SCHEDULE_SCOPE", "running").lower()
+
+# Queue mode: scheduled jobs rank below API-queued (0) and interactive (1) jobs
+SCHEDULED_JOB_PRIORITY = -1
+
+def plan_due_scans(db: Session, running_image_ids: set, max_age: timedelta, now: Optional[datetime] = None,
+                   exclude: frozenset = frozenset()) -> list:
+    """
+    Returns the images whose latest completed scan is missing, or older than max_age and no longer
+    current (image content or Grype DB build changed since), most urgent first:
+    never-scanned images of running containers, then other never-scanned images, then by how many
+    whole max_age periods the latest scan is overdue; within one such bucket the smallest images
+    (quickest to cover) go first. Images with a scan in progress, or attempted within
+    SCHEDULE_RETRY_MINUTES, are left out.
+    """
+    now = now or datetime.utcnow()
+    latest_times = (
+        db.query(DBScan.image_id, func.max(DBScan.scan_time).label("scan_time"))
+        .filter(DBScan.scan_status == "completed")
+        .group_by(DBScan.image_id)
+        .subquery()
+    )
+    latest_completed = {
+        row.image_id: row
+        for row in db.query(DBScan.image_id, DBScan.scan_time, DBScan.grype_db_build, DBScan.revalidated_build, DBScan.image_digest)
+        .join(latest_times, (DBScan.image_id == latest_times.c.image_id) & (DBScan.scan_time == latest_times.c.scan_time))
+        .filter(DBScan.scan_status == "completed")
+    }
+    last_attempted = dict(
+        db.query(DBScan.image_id, func.max(DBScan.scan_time)).group_by(DBScan.image_id).all()
+    )
+    busy = {row.image_id for row in db.query(DBScan.image_id).filter(DBScan.scan_status.in_(("running", "processing")))}
+    busy |= {row.image_id for row in db.query(ScanJob.image_id).filter(ScanJob.status.in_(ACTIVE_JOB_STATUSES))}
+
+    current_build = grype_db_manager.current_build
+    query = db.query(DBImage.id, DBImage.size, DBImage.digest)
+    if SCHEDULE_SCOPE != "all":
+        query = query.filter(DBImage.id.in_(running_image_ids))
+    retry_after = timedelta(minutes=SCHEDULE_RETRY_MINUTES)
+
+    due = []
+    for image_id, size, digest in query.all():
+        if image_id in busy or image_id in exclude:
+            continue
+        latest = latest_completed.get(image_id)
+        scanned_at = latest.scan_time if latest else None
+        if scanned_at and now - scanned_at < max_age:
+            continue
+        if latest and scan_holds_for_build(latest, current_build) and digest and latest.image_digest == digest:
+            # Same content matched against the current DB: a rescan would only reuse this result
+            continue
+        attempted_at = last_attempted.get(image_id)
+        if attempted_at and attempted_at != scanned_at and now - attempted_at < retry_after:
+            continue
+        urgent = scanned_at is None and image_id in running_image_ids
+        if scanned_at is None:
+            overdue = float("inf")
+        else:
+            overdue = (now - scanned_at) // max_age if max_age else (now - scanned_at).total_seconds()
+        due.append((not urgent, -overdue, size if size is not None else float("inf"), image_id))
+    due.sort()
+    return [entry[-1] for entry in due]
+
+class FleetScheduler:
+    """Keeps the fleet within SCHEDULE_MAX_AGE_HOURS by feeding due images to the scanners a few at a time."""
+    def __init__(self):
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._state_lock = threading.Lock()
+        self._in_flight = set() # Image IDs of scheduled scans still running (local mode)
+        self.last_plan_at: Optional[datetime] = None
+        self.last_plan_due = 0
+        self.scheduled_total = 0
+        self.last_error: Optional[str] = None
+
+    @property
+    def enabled(self) -> bool:
+        return SCHEDULE_MAX_AGE_HOURS > 0 and SCHEDULE_CONCURRENCY > 0
+
+    def _running_image_ids(self, db: Session) -> set:
+        # Same upsert as the dashboard, so containers started since anyone looked are covered too
+        return {container.image_id for container in get_container_display_data(db, get_running_containers(db))}
+
+    def _free_slots(self, db: Session) -> int:
+        if SCAN_EXECUTION == "queue":
+            active = (
+                db.query(func.count(ScanJob.id))
+                .filter(ScanJob.status.in_(ACTIVE_JOB_STATUSES), ScanJob.priority == SCHEDULED_JOB_PRIORITY)
+                .scalar()
+            )
+        else:
+            with self._state_lock:
+                active = len(self._in_flight)
+        return max(0, SCHEDULE_CONCURRENCY - active)
+
+    def _scan_done(self, image_id: str, future):
+        with self._state_lock:
+            self._in_flight.discard(image_id)
+        error = future.exception()
+        if error is not None:
+            logger.warning(f"Scheduled scan of {image_id} failed: {getattr(error, 'detail', error)}")
+        self._wake.set() # Fill the freed slot right away
+
+    def _dispatch(self, db: Session, image_id: str):
+        if SCAN_EXECUTION == "queue":
+            enqueue_job(db, image_id, priority=SCHEDULED_JOB_PRIORITY)
+            return
+        with self._state_lock:
+            self._in_flight.add(image_id)
+        future = submit_scan(run_image_scan, image_id)
+        future.add_done_callback(lambda f, image_id=image_id: self._scan_done(image_id, f))
+
+    def run_once(self) -> dict:
+        """Plans the fleet and dispatches due images into the free scheduler slots. Returns what was done."""
+        started = time.monotonic()
+        with session_scope() as db:
+            running_image_ids = self._running_image_ids(db)
+            with self._state_lock:
+                in_flight = frozenset(self._in_flight)
+            due = plan_due_scans(db, running_image_ids, timedelta(hours=SCHEDULE_MAX_AGE_HOURS), exclude=in_flight)
+            dispatched = due[:self._free_slots(db)]
+            for image_id in dispatched:
+                self._dispatch(db, image_id)
+        with self._state_lock:
+            self.last_plan_at = datetime.utcnow()
+            self.last_plan_due = len(due)
+            self.scheduled_total += len(dispatched)
+        if dispatched:
+            logger.info(f"Scheduler: {len(due)} image(s) due, dispatched {len(dispatched)} "
+                        f"(planned in {time.monotonic() - started:.2f}s)")
+        return {"due": len(due), "dispatched": dispatched}
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"Unexpected error during scheduled scan planning: {e}")
+            self._wake.wait(SCHEDULE_INTERVAL_SECONDS)
+            self._wake.clear()
+
+    def start(self):
+        """Starts the background scheduler thread when SCHEDULE_MAX_AGE_HOURS is set."""
+        if not self.enabled or (self._thread and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="grypeui-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def status(self) -> dict:
+        with self._state_lock:
+            return {
+                "enabled": self.enabled,
+                "max_age_hours": SCHEDULE_MAX_AGE_HOURS,
+                "concurrency": SCHEDULE_CONCURRENCY,
+                "scope": SCHEDULE_SCOPE,
+                "in_flight": sorted(self._in_flight),
+                "last_plan_at": self.last_plan_at,
+                "last_plan_due": self.last_plan_due,
+                "scheduled_total": self.scheduled_total,
+                "last_error": self.last_error,
+            }
+
+# Process-wide scheduler, started by the web tier
+fleet_scheduler = FleetScheduler()
@@ -0,0 +1,193 @@
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import select, func, or_, and_, text, Integer
+from sqlalchemy.orm import Session
+
+from database import session_scope, search_index_available, SEARCH_INDEX_TABLE
+from models.database import Image as DBImage, ImageFinding, Scan as DBScan, Vulnerability as DBVulnerability
+from models.schemas import FindingSearchResponse
+from services.findings_store import latest_scans_subquery
+from logger import logger
+
+# Paginated search over every finding ever stored, grouped by image. It reads the search history
+# (ImageFinding, one row per image and distinct finding) rather than every scan's rows, through
+# the FTS5 index on SQLite (see database._create_search_index) or substring matching elsewhere.
+SEARCH_MAX_LIMIT = 100
+SEARCH_SAMPLE_FINDINGS = 5 # Distinct matching findings listed per image
+_UPSERT_BATCH_ROWS = 500
+
+_KEY_FIELDS = ("vulnerability_id", "package_name", "installed_version")
+_SEARCHED_COLUMNS = (ImageFinding.vulnerability_id, ImageFinding.package_name,
+                     ImageFinding.installed_version, ImageFinding.description)
+
+def _dialect_insert(db: Session):
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    return dialect_insert(ImageFinding)
+
+def _upsert(db: Session, rows: list):
+    # Two-argument max() is SQLite's scalar maximum
+    later = func.greatest if db.get_bind().dialect.name == "postgresql" else func.max
+    statement = _dialect_insert(db).values(rows)
+    db.execute(statement.on_conflict_do_update(
+        index_elements=["image_id", *_KEY_FIELDS],
+        set_={
+            "severity": statement.excluded.severity,
+            "fixed_version": statement.excluded.fixed_version,
+            "description": statement.excluded.description,
+            "last_seen": later(ImageFinding.last_seen, statement.excluded.last_seen),
+            "last_scan_id": later(ImageFinding.last_scan_id, statement.excluded.last_scan_id),
+            "scan_count": ImageFinding.scan_count + 1,
+        },
+    ))
+
+def record_scan_findings(db: Session, scan: DBScan, findings):
+    """
+    Upserts a completed scan's findings (Vulnerability models or findings_store.Finding tuples)
+    into the image's search history. Does not commit: call it in the transaction that completes the scan.
+    """
+    seen_at = scan.scan_time or datetime.utcnow()
+    rows = {}
+    for finding in findings:
+        key = tuple(getattr(finding, field) for field in _KEY_FIELDS)
+        rows[key] = dict(
+            image_id=scan.image_id, **dict(zip(_KEY_FIELDS, key)), severity=finding.severity,
+            fixed_version=finding.fixed_version, description=finding.description,
+            first_seen=seen_at, last_seen=seen_at, last_scan_id=scan.id, scan_count=1,
+        )
+    rows = list(rows.values())
+    for start in range(0, len(rows), _UPSERT_BATCH_ROWS):
+        _upsert(db, rows[start:start + _UPSERT_BATCH_ROWS])
+
+def backfill_search_history() -> int:
+    """
+    Builds the search history from stored finding rows when it is still empty (databases created
+    before search existed). Returns the number of history rows created.
+    """
+    with session_scope() as db:
+        if db.query(ImageFinding.id).first() is not None:
+            return 0
+        history = (
+            select(
+                DBScan.image_id, DBVulnerability.vulnerability_id, DBVulnerability.package_name,
+                DBVulnerability.installed_version, func.max(DBVulnerability.severity),
+                func.max(DBVulnerability.fixed_version), func.max(DBVulnerability.description),
+                func.min(DBScan.scan_time), func.max(DBScan.scan_time), func.max(DBScan.id),
+                func.count(func.distinct(DBScan.id)),
+            )
+            .join(DBScan, DBVulnerability.scan_id == DBScan.id)
+            .where(DBScan.scan_status == "completed", DBScan.image_id.isnot(None))
+            # Delta scans store removed findings as "-" rows; those were not seen in that scan
+            .where(or_(DBVulnerability.change.is_(None), DBVulnerability.change != "-"))
+            .group_by(DBScan.image_id, DBVulnerability.vulnerability_id, DBVulnerability.package_name,
+                      DBVulnerability.installed_version)
+        )
+        # Scans completing meanwhile have already recorded their findings; those rows are kept
+        db.execute(_dialect_insert(db).from_select(
+            ["image_id", *_KEY_FIELDS, "severity", "fixed_version", "description", "first_seen", "last_seen",
+             "last_scan_id", "scan_count"],
+            history,
+        ).on_conflict_do_nothing(index_elements=["image_id", *_KEY_FIELDS]))
+        created = db.query(func.count(ImageFinding.id)).scalar()
+        db.commit()
+    if created:
+        logger.info(f"Built the search history from stored scans: {created} distinct findings")
+    return created
+
+def search_terms(query: str) -> List[str]:
+    return [term for term in query.split() if term]
+
+def fts_match_expression(terms: List[str]) -> str:
+    # Each term is a quoted prefix phrase, so CVE IDs and versions (which contain '-' and '.')
+    # match as written and no user input is parsed as FTS5 syntax. Terms are ANDed.
+    return " ".join('"' + term.replace('"', '""') + '"*' for term in terms)
+
+def _matching_findings(terms: List[str], use_index: bool):
+    query = select(ImageFinding)
+    if use_index:
+        matches = (
+            text(f"SELECT rowid FROM {SEARCH_INDEX_TABLE} WHERE {SEARCH_INDEX_TABLE} MATCH :match")
+            .bindparams(match=fts_match_expression(terms))
+            .columns(rowid=Integer)
+            .subquery()
+        )
+        return query.join(matches, matches.c.rowid == ImageFinding.id)
+    return query.where(and_(*[
+        or_(*[column.ilike(f"%{term}%") for column in _SEARCHED_COLUMNS]) for term in terms
+    ]))
+
+def search_findings(db: Session, query: str, limit: int = 20, offset: int = 0) -> Optional[FindingSearchResponse]:
+    """
+    Returns one page of the images with findings matching every term of query (CVE ID, package
+    name, version or description) at any point in their history, most recently seen first, with a
+    few of their matching findings. Returns None when the query has no terms.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return None
+    use_index = search_index_available()
+    matched = _matching_findings(terms, use_index).subquery()
+    latest_scans = latest_scans_subquery()
+    total = db.execute(select(func.count(func.distinct(matched.c.image_id)))).scalar()
+    # History has one row per image and finding, so matching images are ranked and paged in one query
+    page = db.execute(
+        select(
+            matched.c.image_id,
+            func.count().label("matches"),
+            func.max(matched.c.last_seen).label("last_seen"),
+            func.max(matched.c.last_scan_id).label("last_matched_scan_id"),
+            latest_scans.c.scan_id.label("latest_scan_id"),
+            DBImage.name, DBImage.tag,
+        )
+        .join(latest_scans, latest_scans.c.image_id == matched.c.image_id, isouter=True)
+        .join(DBImage, DBImage.id == matched.c.image_id, isouter=True)
+        .group_by(matched.c.image_id, latest_scans.c.scan_id, DBImage.name, DBImage.tag)
+        .order_by(func.max(matched.c.last_seen).desc(), matched.c.image_id)
+        .limit(limit)
+        .offset(offset)
+    ).all()
+
+    samples = {row.image_id: [] for row in page}
+    if page:
+        latest_by_image = {row.image_id: row.latest_scan_id for row in page}
+        # The most recently seen few findings of each image on the page, cut off in the database
+        ranked = (
+            select(
+                matched,
+                func.row_number().over(
+                    partition_by=matched.c.image_id,
+                    order_by=(matched.c.last_seen.desc(), matched.c.id),
+                ).label("sample_rank"),
+            )
+            .where(matched.c.image_id.in_(list(samples)))
+            .subquery()
+        )
+        findings = db.execute(
+            select(*[ranked.c[column.name] for column in matched.c])
+            .where(ranked.c.sample_rank <= SEARCH_SAMPLE_FINDINGS)
+            .order_by(ranked.c.image_id, ranked.c.sample_rank)
+        ).all()
+        for finding in findings:
+            samples[finding.image_id].append(dict(
+                finding._mapping,
+                in_latest_scan=finding.last_scan_id == latest_by_image[finding.image_id],
+            ))
+
+    results = [
+        dict(
+            image_id=row.image_id,
+            image_name=(f"{row.name}:{row.tag}" if row.tag else row.name) if row.name else None,
+            matches=row.matches,
+            last_seen=row.last_seen,
+            last_matched_scan_id=row.last_matched_scan_id,
+            latest_scan_id=row.latest_scan_id,
+            in_latest_scan=row.latest_scan_id is not None and row.last_matched_scan_id == row.latest_scan_id,
+            findings=samples[row.image_id],
+        )
+        for row in page
+    ]
+    return FindingSearchResponse(query=query, indexed=use_index, total=total, limit=limit, offset=offset,
+                                 results=results)
@@ -0,0 +1,38 @@
+from typing import Any, List
+
+from fastapi import Response
+from pydantic import BaseModel, TypeAdapter
+from sqlalchemy.orm import Session
+
+from models.database import Vulnerability as DBVulnerability
+from models.schemas import VulnerabilityModel
+from services.findings_store import load_findings, is_delta_scan
+
+# Findings are read as plain column tuples (no ORM objects) and validated in one adapter pass,
+# instead of one VulnerabilityModel.from_orm call per row. Responses are encoded by pydantic-core
+# directly to JSON bytes, skipping FastAPI's jsonable_encoder walk over every object.
+VULNERABILITY_FIELDS = tuple(VulnerabilityModel.model_fields)
+_VULNERABILITY_COLUMNS = [getattr(DBVulnerability, field) for field in VULNERABILITY_FIELDS]
+
+vulnerability_list_adapter = TypeAdapter(List[VulnerabilityModel])
+_any_adapter = TypeAdapter(Any)
+
+def fetch_vulnerability_rows(db: Session, scan_id: int) -> List[dict]:
+    """Returns a scan's findings as dicts keyed by VulnerabilityModel's fields, straight from column tuples."""
+    if is_delta_scan(db, scan_id):
+        return [{field: getattr(finding, field) for field in VULNERABILITY_FIELDS} for finding in load_findings(db, scan_id)]
+    rows = db.query(*_VULNERABILITY_COLUMNS).filter(DBVulnerability.scan_id == scan_id).order_by(DBVulnerability.id).all()
+    return [dict(zip(VULNERABILITY_FIELDS, row)) for row in rows]
+
+def load_vulnerabilities(db: Session, scan_id: int) -> List[VulnerabilityModel]:
+    return vulnerability_list_adapter.validate_python(fetch_vulnerability_rows(db, scan_id))
+
+def json_response(payload, status_code: int = 200) -> Response:
+    """Encodes a model, a list of models or a plain dict with pydantic-core in one pass."""
+    if isinstance(payload, BaseModel):
+        content = payload.model_dump_json()
+    elif isinstance(payload, list) and payload and isinstance(payload[0], VulnerabilityModel):
+        content = vulnerability_list_adapter.dump_json(payload)
+    else:
+        content = _any_adapter.dump_json(payload)
+    return Response(content=content, status_code=status_code, media_type="application/json")
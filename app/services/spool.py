@@ -0,0 +1,214 @@
+import fcntl
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from typing import Optional
+
+from logger import logger
+
+# Image exports (docker save + extracted layers) are written to managed spool directories.
+# SPOOL_DIR: main spool location, ideally a dedicated volume.
+# SPOOL_BUDGET_BYTES: total bytes all concurrent exports may reserve in SPOOL_DIR (0 = unlimited).
+# SPOOL_FAST_DIR / SPOOL_FAST_BUDGET_BYTES / SPOOL_FAST_MAX_IMAGE_BYTES: optional fast location
+#   (e.g. a tmpfs) used for images up to the given size while it has room.
+# SPOOL_SIZE_FACTOR: reservation per export relative to the image size (archive plus extracted layer).
+# SPOOL_ADMISSION_TIMEOUT: seconds an export waits for budget before giving up.
+SPOOL_DIR = os.getenv("SPOOL_DIR", os.path.join(tempfile.gettempdir(), "grypeui-spool"))
+SPOOL_BUDGET_BYTES = int(os.getenv("SPOOL_BUDGET_BYTES", "0"))
+SPOOL_FAST_DIR = os.getenv("SPOOL_FAST_DIR")
+SPOOL_FAST_BUDGET_BYTES = int(os.getenv("SPOOL_FAST_BUDGET_BYTES", str(1024 ** 3)))
+SPOOL_FAST_MAX_IMAGE_BYTES = int(os.getenv("SPOOL_FAST_MAX_IMAGE_BYTES", str(256 * 1024 ** 2)))
+SPOOL_SIZE_FACTOR = float(os.getenv("SPOOL_SIZE_FACTOR", "1.5"))
+SPOOL_ADMISSION_TIMEOUT = float(os.getenv("SPOOL_ADMISSION_TIMEOUT", "3600"))
+
+# Fallback reservation when the image size is unknown
+_DEFAULT_RESERVATION_BYTES = 1024 ** 3
+_SPOOL_PREFIX = "spool-"
+_OWNER_LOCK_PREFIX = ".owner-"
+
+class SpoolBudgetExceeded(Exception):
+    """Raised when an export could not be admitted within SPOOL_ADMISSION_TIMEOUT."""
+
+class Spool:
+    """
+    One export's working directory. Drop-in for tempfile.TemporaryDirectory
+    (`.name`, `.cleanup()`); cleanup also returns the reserved bytes to the budget.
+    """
+    def __init__(self, manager: "SpoolManager", root: "_SpoolRoot", path: str, reserved_bytes: int):
+        self._manager = manager
+        self.root = root
+        self.name = path
+        self.reserved_bytes = reserved_bytes
+        self._cleaned_up = False
+
+    def cleanup(self):
+        if self._cleaned_up:
+            return
+        self._cleaned_up = True
+        shutil.rmtree(self.name, ignore_errors=True)
+        self._manager._release(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cleanup()
+
+class _SpoolRoot:
+    def __init__(self, path: str, budget_bytes: int, max_item_bytes: Optional[int] = None):
+        self.path = path
+        self.budget_bytes = budget_bytes
+        self.max_item_bytes = max_item_bytes
+        self.reserved_bytes = 0
+        self.active = 0
+
+    def fits(self, nbytes: int) -> bool:
+        if self.budget_bytes <= 0:
+            return True
+        # An export larger than the whole budget is admitted alone rather than never
+        return self.reserved_bytes + nbytes <= self.budget_bytes or self.active == 0
+
+class SpoolManager:
+    """Hands out spool directories under a global byte budget and sweeps spools left behind by dead processes."""
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._token = uuid.uuid4().hex[:12]
+        self._owner_lock_files = {}
+        self.main_root = _SpoolRoot(SPOOL_DIR, SPOOL_BUDGET_BYTES)
+        self.fast_root = _SpoolRoot(SPOOL_FAST_DIR, SPOOL_FAST_BUDGET_BYTES, SPOOL_FAST_MAX_IMAGE_BYTES) if SPOOL_FAST_DIR else None
+
+    def _roots(self):
+        return [root for root in (self.fast_root, self.main_root) if root]
+
+    def _claim_root_ownership(self, root: _SpoolRoot):
+        # Holding an exclusive lock on our owner file marks our spools as live for other processes' sweeps
+        if root.path in self._owner_lock_files:
+            return
+        os.makedirs(root.path, exist_ok=True)
+        lock_file = open(os.path.join(root.path, f"{_OWNER_LOCK_PREFIX}{self._token}.lock"), "w")
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        self._owner_lock_files[root.path] = lock_file
+
+    def estimate_bytes(self, image_size: Optional[int]) -> int:
+        if not image_size:
+            return _DEFAULT_RESERVATION_BYTES
+        return int(image_size * SPOOL_SIZE_FACTOR)
+
+    def acquire(self, image_size: Optional[int], label: str = "") -> Spool:
+        """
+        Reserves room for one export and creates its directory. Prefers the fast root for small
+        images when it has room; otherwise waits for the main root's budget.
+        """
+        nbytes = self.estimate_bytes(image_size)
+        deadline = time.monotonic() + SPOOL_ADMISSION_TIMEOUT
+        with self._cond:
+            while True:
+                root = self._pick_root(nbytes)
+                if root:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise SpoolBudgetExceeded(f"No spool budget for {nbytes} bytes ({label}) after {SPOOL_ADMISSION_TIMEOUT}s")
+                logger.debug(f"Export of {label} waiting for spool budget ({nbytes} bytes)")
+                self._cond.wait(remaining)
+            root.reserved_bytes += nbytes
+            root.active += 1
+
+        try:
+            self._claim_root_ownership(root)
+            path = tempfile.mkdtemp(prefix=f"{_SPOOL_PREFIX}{self._token}-", dir=root.path)
+        except Exception:
+            with self._cond:
+                root.reserved_bytes -= nbytes
+                root.active -= 1
+                self._cond.notify_all()
+            raise
+        logger.debug(f"Spool {path} reserved {nbytes} bytes for {label}")
+        return Spool(self, root, path, nbytes)
+
+    def adopt(self, path: str, image_size: Optional[int], label: str = "") -> Optional[Spool]:
+        """
+        Takes over a spool directory left behind by an earlier process (e.g. a checkpointed export).
+        It is renamed under this process's ownership and its bytes are reserved without waiting.
+        Returns None when the directory is gone or not inside a configured spool root.
+        """
+        parent = os.path.dirname(os.path.abspath(path))
+        root = next((r for r in self._roots() if os.path.abspath(r.path) == parent), None)
+        if root is None or not os.path.isdir(path):
+            return None
+        self._claim_root_ownership(root)
+        new_path = os.path.join(root.path, f"{_SPOOL_PREFIX}{self._token}-{uuid.uuid4().hex[:8]}")
+        os.rename(path, new_path)
+        nbytes = self.estimate_bytes(image_size)
+        with self._cond:
+            root.reserved_bytes += nbytes
+            root.active += 1
+        logger.debug(f"Adopted spool {path} as {new_path} for {label}")
+        return Spool(self, root, new_path, nbytes)
+
+    def _pick_root(self, nbytes: int) -> Optional[_SpoolRoot]:
+        fast = self.fast_root
+        # The fast root never takes oversized exports; those go to the main root instead
+        if fast and nbytes <= self.estimate_bytes(fast.max_item_bytes) and fast.reserved_bytes + nbytes <= fast.budget_bytes:
+            return fast
+        if self.main_root.fits(nbytes):
+            return self.main_root
+        return None
+
+    def _release(self, spool: Spool):
+        with self._cond:
+            spool.root.reserved_bytes -= spool.reserved_bytes
+            spool.root.active -= 1
+            self._cond.notify_all()
+
+    def sweep_orphans(self, keep_paths: set = frozenset()) -> int:
+        """
+        Removes spool directories whose owning process is gone (its owner lock can be taken).
+        Paths in keep_paths are left alone. Returns the number of directories removed.
+        """
+        removed = 0
+        for root in self._roots():
+            if not os.path.isdir(root.path):
+                continue
+            self._claim_root_ownership(root)
+            live_tokens = {self._token}
+            for entry in os.listdir(root.path):
+                if not entry.startswith(_OWNER_LOCK_PREFIX):
+                    continue
+                token = entry[len(_OWNER_LOCK_PREFIX):].split(".", 1)[0]
+                if token == self._token:
+                    continue
+                lock_path = os.path.join(root.path, entry)
+                with open(lock_path, "a") as lock_file:
+                    try:
+                        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except OSError:
+                        live_tokens.add(token) # Owner still running
+                        continue
+                os.unlink(lock_path)
+
+            for entry in os.listdir(root.path):
+                if not entry.startswith(_SPOOL_PREFIX):
+                    continue
+                token = entry[len(_SPOOL_PREFIX):].split("-", 1)[0]
+                path = os.path.join(root.path, entry)
+                if token in live_tokens or path in keep_paths:
+                    continue
+                shutil.rmtree(path, ignore_errors=True)
+                removed += 1
+        if removed:
+            logger.info(f"Removed {removed} orphaned spool directories")
+        return removed
+
+    def status(self) -> list:
+        with self._cond:
+            return [
+                {"path": root.path, "budget_bytes": root.budget_bytes, "reserved_bytes": root.reserved_bytes, "active_exports": root.active}
+                for root in self._roots()
+            ]
+
+# Process-wide manager shared by all exports
+spool_manager = SpoolManager()
@@ -0,0 +1,136 @@
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import func, select, and_
+from sqlalchemy.orm import Session
+
+from database import session_scope
+from models.database import Scan as DBScan, SeverityTrend, Vulnerability as DBVulnerability, VulnerabilityCounts
+from services.findings_store import load_findings, is_delta_scan
+from logger import logger
+
+# Daily severity roll-ups, maintained incrementally as scans complete (see record_scan_trend).
+FLEET_KEY = "__fleet__"
+TREND_FIELDS = ("critical", "high", "medium", "low", "negligible", "unknown", "fixable")
+TREND_MAX_DAYS = 366
+
+def count_fixable(vulnerabilities) -> int:
+    return sum(1 for vuln in vulnerabilities if vuln.fixed_version)
+
+def count_fixable_for_scan(db: Session, scan_id: int) -> int:
+    if is_delta_scan(db, scan_id):
+        return count_fixable(load_findings(db, scan_id))
+    return (
+        db.query(func.count(DBVulnerability.id))
+        .filter(DBVulnerability.scan_id == scan_id, DBVulnerability.fixed_version.isnot(None), DBVulnerability.fixed_version != "")
+        .scalar()
+    )
+
+def _insert_if_missing(db: Session, values: dict):
+    # Concurrent scans may create the same day's row; the loser's insert is a no-op
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    db.execute(insert(SeverityTrend).values(**values).on_conflict_do_nothing(index_elements=["image_id", "day"]))
+
+def _posture_before(db: Session, key: str, day: date) -> dict:
+    # Column query: ORM rows cached in the session would not see the bulk updates below
+    row = (
+        db.query(*[getattr(SeverityTrend, field) for field in TREND_FIELDS])
+        .filter(SeverityTrend.image_id == key, SeverityTrend.day <= day)
+        .order_by(SeverityTrend.day.desc())
+        .first()
+    )
+    return {field: (getattr(row, field) or 0) if row else 0 for field in TREND_FIELDS}
+
+def record_scan_trend(db: Session, scan: DBScan, counts: dict, fixable: int):
+    """
+    Rolls a completed scan into its image's bucket for the scan's day and moves the fleet bucket
+    by the difference to the image's previous posture. Does not commit: call it in the same
+    transaction that completes the scan. counts uses VulnerabilityCounts' severity keys.
+    """
+    day = (scan.scan_time or datetime.utcnow()).date()
+    now = datetime.utcnow()
+    new = {field: counts.get(field, 0) for field in TREND_FIELDS if field != "fixable"}
+    new["fixable"] = fixable
+    previous = _posture_before(db, scan.image_id, day)
+
+    _insert_if_missing(db, {"image_id": scan.image_id, "day": day, **new, "scan_id": scan.id, "updated_at": now})
+    db.query(SeverityTrend).filter(SeverityTrend.image_id == scan.image_id, SeverityTrend.day == day).update(
+        {**new, "scan_id": scan.id, "updated_at": now}, synchronize_session=False)
+
+    delta = {field: new[field] - previous[field] for field in TREND_FIELDS}
+    if not any(delta.values()):
+        return
+    # The fleet's bucket for a new day starts from the last known fleet posture
+    carried = _posture_before(db, FLEET_KEY, day - timedelta(days=1))
+    _insert_if_missing(db, {"image_id": FLEET_KEY, "day": day, **carried, "updated_at": now})
+    # Relative update, so concurrent scans of different images do not overwrite each other
+    db.query(SeverityTrend).filter(SeverityTrend.image_id == FLEET_KEY, SeverityTrend.day == day).update(
+        {**{field: getattr(SeverityTrend, field) + delta[field] for field in TREND_FIELDS}, "updated_at": now},
+        synchronize_session=False)
+
+def get_trend(db: Session, key: str, days: int = 90, today: Optional[date] = None) -> list:
+    """
+    Returns one bucket per day for the last `days` days (oldest first), carrying postures
+    forward over days without scans. Reads the key's rows, plus the last one before the window,
+    in a single primary-key range query.
+    """
+    today = today or datetime.utcnow().date()
+    start = today - timedelta(days=days - 1)
+    baseline_day = (
+        select(func.max(SeverityTrend.day))
+        .where(SeverityTrend.image_id == key, SeverityTrend.day <= start)
+        .scalar_subquery()
+    )
+    rows = (
+        db.query(SeverityTrend)
+        .filter(SeverityTrend.image_id == key, SeverityTrend.day >= func.coalesce(baseline_day, start))
+        .order_by(SeverityTrend.day)
+        .all()
+    )
+
+    buckets = []
+    current = {field: 0 for field in TREND_FIELDS}
+    pending = iter(rows)
+    row = next(pending, None)
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        while row is not None and row.day <= day:
+            current = {field: getattr(row, field) or 0 for field in TREND_FIELDS}
+            row = next(pending, None)
+        buckets.append({"day": day, **current})
+    return buckets
+
+def backfill_trends() -> int:
+    """
+    Builds the roll-ups from scan history when the table is still empty (databases created
+    before roll-ups existed). Returns the number of scans rolled up.
+    """
+    with session_scope() as db:
+        if db.query(SeverityTrend.image_id).first() is not None:
+            return 0
+        fixable_by_scan = dict(
+            db.query(DBVulnerability.scan_id, func.count(DBVulnerability.id))
+            .filter(DBVulnerability.fixed_version.isnot(None), DBVulnerability.fixed_version != "",
+                    DBVulnerability.change.is_(None))
+            .group_by(DBVulnerability.scan_id)
+            .all()
+        )
+        scans = (
+            db.query(DBScan, VulnerabilityCounts)
+            .join(VulnerabilityCounts, VulnerabilityCounts.scan_id == DBScan.id)
+            .filter(and_(DBScan.scan_status == "completed", DBScan.scan_time.isnot(None)))
+            .order_by(DBScan.scan_time, DBScan.id)
+            .all()
+        )
+        for scan, counts in scans:
+            record_scan_trend(db, scan, {field: getattr(counts, field) or 0 for field in TREND_FIELDS if field != "fixable"},
+                              count_fixable_for_scan(db, scan.id) if scan.findings_storage == "delta"
+                              else fixable_by_scan.get(scan.id, 0))
+        db.commit()
+    if scans:
+        logger.info(f"Backfilled severity trends from {len(scans)} completed scans")
+    return len(scans)
@@ -1,15 +1,21 @@
 from sqlalchemy.orm import Session, joinedload
 from services.docker import get_running_containers
-from models.schemas import ContainerWithVulns, DockerContainerInfo, DockerImageInfo, ScanResult, VulnerabilityModel
+from models.schemas import ContainerWithVulns, DockerContainerInfo, DockerImageInfo, ScanResult, ScanSummary
 from models.database import Image as DBImage, Scan as DBScan, VulnerabilityCounts as DBVulnerabilityCounts, Vulnerability as DBVulnerability
 from datetime import datetime
+from typing import Optional
+from services.serialization import fetch_vulnerability_rows
+from services.scanner import summarized_severities
+from services.risk import risk_summary_fields
 
-def get_container_display_data(db: Session) -> list[ContainerWithVulns]:
+def get_container_display_data(db: Session, raw_docker_containers: list[DockerContainerInfo] = None) -> list[ContainerWithVulns]:
     """
     Fetches running Docker containers, upserts their image information into the DB,
     and enriches them with the latest scan status and image analysis results from the DB.
+    Callers that already listed the containers (e.g. on the Docker executor) can pass them in.
     """
-    raw_docker_containers: list[DockerContainerInfo] = get_running_containers(db)
+    if raw_docker_containers is None:
+        raw_docker_containers = get_running_containers(db)
     display_data_list: list[ContainerWithVulns] = []
 
     for dc_info in raw_docker_containers:
@@ -33,6 +39,7 @@ def get_container_display_data(db: Session) -> list[ContainerWithVulns]:
                 id=db_image_id, 
                 name=image_repo,
                 tag=image_tag,
+                digest=image_detail.id,
                 size=image_detail.size,
                 created_at=image_detail.created_at
                 # Analysis fields will be populated by the API scan endpoint when a scan is triggered
@@ -48,7 +55,11 @@ def get_container_display_data(db: Session) -> list[ContainerWithVulns]:
                 if not db_image: 
                     print(f"Failed to upsert image {db_image_id}. Skipping container {dc_info.id}")
                     continue 
-        
+        elif not db_image.digest:
+            # Rows created before digests were recorded
+            db_image.digest = image_detail.id
+            db.commit()
+
         # 2. Fetch Latest Scan Info for this image (existing logic)
         latest_scan = (
             db.query(DBScan)
@@ -75,6 +86,9 @@ def get_container_display_data(db: Session) -> list[ContainerWithVulns]:
                     "low_count": counts_record.low,
                     "negligible_count": counts_record.negligible,
                     "unknown_count": counts_record.unknown,
+                    "fixable_critical": counts_record.fixable_critical,
+                    "fixable_high": counts_record.fixable_high,
+                    **risk_summary_fields(counts_record),
                 }
 
         # 3. Construct ContainerWithVulns for display, including analysis results from db_image
@@ -98,13 +112,83 @@ def get_container_display_data(db: Session) -> list[ContainerWithVulns]:
     
     return display_data_list 
 
+# Dashboard orderings (the `sort` query parameter) over the precomputed scan aggregates; highest first
+DASHBOARD_SORTS = {
+    "risk": "risk_score",
+    "fixable_risk": "fixable_risk_score",
+    "fixable_critical": "fixable_critical",
+    "critical": "critical_count",
+}
+
+def sort_dashboard(containers: list[ContainerWithVulns], sort: Optional[str] = None, fixable_only: bool = False) -> list[ContainerWithVulns]:
+    """Orders and filters the dashboard rows by their latest scan's aggregates; unscanned rows go last."""
+    if fixable_only:
+        containers = [container for container in containers if container.fixable_count]
+    field = DASHBOARD_SORTS.get(sort)
+    if field is None:
+        return containers
+    return sorted(containers, key=lambda container: (getattr(container, field) is None, -(getattr(container, field) or 0)))
+
+# Values accepted by the scan endpoints' `view` parameter
+SCAN_VIEWS = ("full", "summary")
+SCAN_FIELDS = tuple(ScanResult.model_fields)
+
+def _scan_summary_fields(db_scan: DBScan) -> dict:
+    counts = db_scan.counts
+    fields = dict(
+        scan_id=db_scan.id,
+        image_id=db_scan.image_id,
+        scan_time=db_scan.scan_time,
+        scan_status=db_scan.scan_status,
+        scan_details=db_scan.scan_details,
+        grype_db_build=db_scan.grype_db_build,
+        revalidated_build=db_scan.revalidated_build,
+        revalidated_at=db_scan.revalidated_at,
+        critical_count=counts.critical if counts else 0,
+        high_count=counts.high if counts else 0,
+        medium_count=counts.medium if counts else 0,
+        low_count=counts.low if counts else 0,
+        negligible_count=counts.negligible if counts else 0,
+        unknown_count=counts.unknown if counts else 0,
+        summarized_severities=summarized_severities(db_scan.detail_min_severity),
+        **(risk_summary_fields(counts) if counts else {}),
+    )
+    db_image = db_scan.image
+    if not db_image:
+        # Handle case where image might be missing (though unlikely); image details stay None
+        print(f"Warning: Image data missing for scan ID {db_scan.id}")
+        return fields
+    fields.update(
+        # Add analysis details from the image
+        image_name=f"{db_image.name}:{db_image.tag}" if db_image.tag else db_image.name,
+        is_rootless=db_image.is_rootless,
+        is_shellless=db_image.is_shellless,
+        is_distroless=db_image.is_distroless,
+        analysis_error=db_image.image_analysis_error,
+        found_shell_path=db_image.found_shell_path,
+        found_package_manager_path=db_image.found_package_manager_path,
+        distribution_info=db_image.distribution_info
+    )
+    return fields
+
+def get_scan_summary(db: Session, scan_id: int) -> ScanSummary:
+    """Retrieves a scan's status, counts and image analysis results, without loading its vulnerabilities."""
+    db_scan = (
+        db.query(DBScan)
+        .options(joinedload(DBScan.image), joinedload(DBScan.counts))
+        .filter(DBScan.id == scan_id)
+        .first()
+    )
+    if not db_scan:
+        return None
+    return ScanSummary(**_scan_summary_fields(db_scan))
+
 def get_full_scan_details(db: Session, scan_id: int) -> ScanResult:
     """Retrieves detailed information for a specific scan, including vulnerabilities, counts, and image analysis results."""
     db_scan = (
         db.query(DBScan)
         .options(
             joinedload(DBScan.image), # Eager load image details
-            joinedload(DBScan.vulnerabilities),
             joinedload(DBScan.counts)
         )
         .filter(DBScan.id == scan_id)
@@ -114,55 +198,25 @@ def get_full_scan_details(db: Session, scan_id: int) -> ScanResult:
     if not db_scan:
         return None 
 
-    if not db_scan.image:
-        # Handle case where image might be missing (though unlikely)
-        print(f"Warning: Image data missing for scan ID {scan_id}")
-        # Return minimal scan result or raise error? For now, return with Nones
-        pydantic_vulnerabilities = [VulnerabilityModel.from_orm(v) for v in db_scan.vulnerabilities]
-        counts = db_scan.counts
-        return ScanResult(
-            scan_id=db_scan.id, image_id=db_scan.image_id, scan_time=db_scan.scan_time, scan_status=db_scan.scan_status,
-            vulnerabilities=pydantic_vulnerabilities,
-            critical_count=counts.critical if counts else 0, high_count=counts.high if counts else 0,
-            medium_count=counts.medium if counts else 0, low_count=counts.low if counts else 0,
-            negligible_count=counts.negligible if counts else 0, unknown_count=counts.unknown if counts else 0
-            # Image details will be None
-        )
+    # Findings come as column tuples and are validated in one pass with the rest of the result
+    return ScanResult.model_validate({**_scan_summary_fields(db_scan), "vulnerabilities": fetch_vulnerability_rows(db, scan_id)})
 
-    db_image = db_scan.image
-    pydantic_vulnerabilities = [
-        VulnerabilityModel.from_orm(v) for v in db_scan.vulnerabilities
-    ]
+def scan_view_needs_vulnerabilities(view: str = "full", fields: Optional[list] = None) -> bool:
+    """The vulnerability list is only loaded when the full view or the `vulnerabilities` field is asked for."""
+    return "vulnerabilities" in fields if fields else view == "full"
 
-    counts = db_scan.counts
-    critical_count = counts.critical if counts else 0
-    high_count = counts.high if counts else 0
-    medium_count = counts.medium if counts else 0
-    low_count = counts.low if counts else 0
-    negligible_count = counts.negligible if counts else 0
-    unknown_count = counts.unknown if counts else 0
+def select_scan_fields(result: ScanSummary, fields: Optional[list] = None):
+    """Returns the result itself, or a dict of just the requested fields."""
+    if not fields:
+        return result
+    return result.model_dump(include=set(fields))
 
-    image_name_tag = f"{db_image.name}:{db_image.tag}" if db_image.tag else db_image.name
-
-    return ScanResult(
-        scan_id=db_scan.id,
-        image_id=db_scan.image_id,
-        scan_time=db_scan.scan_time,
-        scan_status=db_scan.scan_status,
-        vulnerabilities=pydantic_vulnerabilities,
-        critical_count=critical_count,
-        high_count=high_count,
-        medium_count=medium_count,
-        low_count=low_count,
-        negligible_count=negligible_count,
-        unknown_count=unknown_count,
-        # Add analysis details from the image
-        image_name=image_name_tag,
-        is_rootless=db_image.is_rootless,
-        is_shellless=db_image.is_shellless,
-        is_distroless=db_image.is_distroless,
-        analysis_error=db_image.image_analysis_error,
-        found_shell_path=db_image.found_shell_path,
-        found_package_manager_path=db_image.found_package_manager_path,
-        distribution_info=db_image.distribution_info
-    ) 
\ No newline at end of file
+def get_scan_view(db: Session, scan_id: int, view: str = "full", fields: Optional[list] = None):
+    """Loads a scan in the shape the caller asked for: full, summary, or an explicit field selection."""
+    if scan_view_needs_vulnerabilities(view, fields):
+        result = get_full_scan_details(db, scan_id)
+    else:
+        result = get_scan_summary(db, scan_id)
+    if result is None:
+        return None
+    return select_scan_fields(result, fields)
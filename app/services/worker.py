@@ -0,0 +1,153 @@
+import os
+import socket
+import threading
+import time
+import uuid
+from typing import Optional
+
+from database import session_scope
+from models.database import ScanJob
+from services.job_queue import (
+    claim_next_job, heartbeat_job, complete_job, fail_job, job_cancel_requested, JOB_LEASE_SECONDS,
+)
+from services.checkpoints import touch_checkpoints
+from services.scan_pipeline import run_image_scan, recover_image_scan, ScanPipelineError
+from services.scanner import active_image_scans, cancel_image_scans
+from services.rematch import rematch_image
+from logger import logger
+
+# WORKER_CONCURRENCY: jobs one worker process runs at a time.
+# WORKER_POLL_SECONDS: idle wait between claim attempts when the queue is empty.
+# Heartbeats renew the lease three times per JOB_LEASE_SECONDS, so one missed beat does not lose the job.
+# Cancel requests on the job row are checked more often, so a cancelled scan stops within a few seconds.
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", "2"))
+WORKER_POLL_SECONDS = float(os.getenv("WORKER_POLL_SECONDS", "2"))
+_HEARTBEAT_SECONDS = max(1.0, JOB_LEASE_SECONDS / 3)
+_CANCEL_POLL_SECONDS = min(_HEARTBEAT_SECONDS, 2.0)
+
+def make_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+class _Heartbeat:
+    """
+    Renews a job's lease in the background while the job runs, and keeps the checkpoint of its scan
+    fresh so a worker re-claiming the job can tell the scan is still being worked on.
+    When the lease is lost, the scan is stopped and left to the worker that took the job over;
+    when the job is cancelled (cancel_job), the scan is stopped and ends as cancelled.
+    """
+    def __init__(self, job_id: int, worker_id: str, image_id: Optional[str] = None):
+        self.job_id = job_id
+        self.image_id = image_id # Scan jobs only; a re-match has no checkpoint and cannot be stopped
+        self.worker_id = worker_id
+        self.lost = False
+        self.cancelled = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"grypeui-heartbeat-{job_id}", daemon=True)
+
+    def _run(self):
+        next_beat = time.monotonic() + _HEARTBEAT_SECONDS
+        while not self._stop.wait(_CANCEL_POLL_SECONDS):
+            try:
+                with session_scope() as db:
+                    if self.image_id and job_cancel_requested(db, self.job_id):
+                        if not self.cancelled:
+                            logger.info(f"Job {self.job_id} was cancelled; stopping its scan")
+                            self.cancelled = True
+                        # Repeated on every poll, in case the scan had not started yet
+                        cancel_image_scans(self.image_id, f"Job {self.job_id} was cancelled")
+                    if time.monotonic() < next_beat:
+                        continue
+                    next_beat = time.monotonic() + _HEARTBEAT_SECONDS
+                    if not heartbeat_job(db, self.job_id, self.worker_id):
+                        # Another worker took the job over and resumes the scan from its checkpoint
+                        logger.warning(f"Worker {self.worker_id} lost the lease on job {self.job_id}")
+                        self.lost = True
+                        if self.image_id:
+                            cancel_image_scans(self.image_id, f"Worker {self.worker_id} lost the lease on job {self.job_id}",
+                                               release=True)
+                        return
+                    if self.image_id:
+                        touch_checkpoints(db, active_image_scans(self.image_id))
+            except Exception as e:
+                # A transient DB error is retried on the next beat; the lease covers a few misses
+                logger.warning(f"Heartbeat for job {self.job_id} failed: {e}")
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+class ScanWorker:
+    """
+    Claims scan jobs from the database queue and runs them with the same pipeline as the web tier.
+    Any number of workers can run against one database; leases keep each job with a single worker,
+    and the job of a worker that stops heartbeating is re-claimed (and its scan resumed) by another.
+    """
+    def __init__(self, worker_id: Optional[str] = None, concurrency: int = WORKER_CONCURRENCY):
+        self.worker_id = worker_id or make_worker_id()
+        self.concurrency = max(1, concurrency)
+        self._stopping = threading.Event()
+
+    def stop(self):
+        """Stops claiming new jobs; jobs already running are finished."""
+        self._stopping.set()
+
+    def run(self):
+        logger.info(f"Scan worker {self.worker_id} started with {self.concurrency} slot(s)")
+        threads = [
+            threading.Thread(target=self._loop, name=f"grypeui-worker-{slot}", daemon=True)
+            for slot in range(self.concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        logger.info(f"Scan worker {self.worker_id} stopped")
+
+    def _loop(self):
+        while not self._stopping.is_set():
+            try:
+                with session_scope() as db:
+                    job = claim_next_job(db, self.worker_id)
+                    if job is None:
+                        self._stopping.wait(WORKER_POLL_SECONDS)
+                        continue
+                    self._run_job(db, job)
+            except Exception as e:
+                # DB unavailable or locked for too long: back off and try again
+                print(f"Scan worker {self.worker_id} error: {e}")
+                self._stopping.wait(WORKER_POLL_SECONDS)
+
+    def _run_job(self, db, job: ScanJob):
+        job_id, image_id = job.id, job.image_id
+        logger.info(f"Worker {self.worker_id} running {job.kind} job {job_id} for image {image_id} (attempt {job.attempts})")
+        heartbeat = _Heartbeat(job_id, self.worker_id, image_id if job.kind == "scan" else None)
+        try:
+            with heartbeat:
+                scan_id = self._execute(db, job)
+            if heartbeat.lost:
+                return
+            complete_job(db, job_id, self.worker_id, scan_id)
+        except ScanPipelineError as e:
+            db.rollback()
+            fail_job(db, job_id, self.worker_id, e.detail, status="cancelled" if heartbeat.cancelled else "failed")
+        except Exception as e:
+            db.rollback()
+            print(f"Job {job_id} for image {image_id} failed: {e}")
+            fail_job(db, job_id, self.worker_id, str(e))
+
+    def _execute(self, db, job: ScanJob) -> Optional[int]:
+        # Read everything up front: the pipeline commits and rolls back the shared session
+        kind, image_id, force, timeout = job.kind, job.image_id, bool(job.force), job.timeout
+        reclaimed, created_at = (job.attempts or 0) > 1, job.created_at
+        if kind == "rematch":
+            return rematch_image(db, image_id, force=force)["scan_id"]
+        if reclaimed:
+            # The previous holder died mid-scan: continue from its checkpoint instead of starting over
+            result = recover_image_scan(db, image_id, created_at, timeout=timeout)
+            if result is not None:
+                return result.scan_id
+        return run_image_scan(db, image_id, force=force, timeout=timeout).scan_id
@@ -0,0 +1,37 @@
+"""
+Standalone scan worker: claims scan jobs from the database queue and runs them.
+Run any number of these next to the web tier (SCAN_EXECUTION=queue), on this host or on others
+that share the database and the Docker socket proxy:
+
+    cd app && python worker.py
+"""
+import signal
+
+from database import init_db, session_scope
+from services.checkpoints import checkpoint_artifact_paths
+from services.executors import shutdown_executors
+from services.grype_db import grype_db_manager
+from services.spool import spool_manager
+from services.worker import ScanWorker
+
+def main():
+    init_db()
+    # Same spool hygiene as the web tier; spools of live workers are protected by their owner locks
+    with session_scope() as db:
+        checkpointed_exports = checkpoint_artifact_paths(db)
+    spool_manager.sweep_orphans(keep_paths=checkpointed_exports)
+    # The web tier refreshes the shared Grype DB; workers only pick up the build it installs
+    grype_db_manager.start(follow=True)
+
+    worker = ScanWorker()
+    # SIGTERM (docker stop) finishes running jobs; jobs cut off by a hard kill are re-claimed once their lease expires
+    signal.signal(signal.SIGTERM, lambda signum, frame: worker.stop())
+    signal.signal(signal.SIGINT, lambda signum, frame: worker.stop())
+    try:
+        worker.run()
+    finally:
+        grype_db_manager.stop()
+        shutdown_executors()
+
+if __name__ == "__main__":
+    main()
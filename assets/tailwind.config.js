@@ -0,0 +1,12 @@
+// Tailwind keeps only the classes it finds in the templates, including their inline scripts.
+// Classes must appear there as whole strings: class names assembled at runtime are not compiled.
+module.exports = {
+  content: {
+    relative: true,
+    files: ["../templates/**/*.html"],
+  },
+  theme: {
+    extend: {},
+  },
+  plugins: [],
+};
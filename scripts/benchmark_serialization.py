@@ -0,0 +1,80 @@
+"""
+Compares the per-row ORM serialization path for scan findings with the bulk path in
+services/serialization.py. Uses a throwaway SQLite database; prints rows per second.
+
+    python scripts/benchmark_serialization.py [rows] [repeats]
+"""
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import warnings
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app")
+_db_dir = tempfile.mkdtemp(prefix="grypeui-bench-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_db_dir}/bench.db"
+sys.path.insert(0, APP_DIR)
+
+from fastapi.encoders import jsonable_encoder
+from database import init_db, session_scope
+from models.database import Image, Scan, Vulnerability
+from models.schemas import VulnerabilityModel
+from services.serialization import load_vulnerabilities, vulnerability_list_adapter
+
+def seed(rows: int) -> int:
+    with session_scope() as db:
+        db.add(Image(id="bench", name="bench", tag="latest"))
+        scan = Scan(image_id="bench", scan_status="completed")
+        db.add(scan)
+        db.flush()
+        db.bulk_insert_mappings(Vulnerability, [
+            dict(scan_id=scan.id, vulnerability_id=f"CVE-2024-{i:05d}", severity=("Critical", "High", "Medium", "Low")[i % 4],
+                 package_name=f"package-{i % 300}", installed_version="1.2.3", fixed_version="1.2.4" if i % 2 else None,
+                 description="Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 3)
+            for i in range(rows)
+        ])
+        db.commit()
+        return scan.id
+
+def per_row_orm(scan_id: int) -> bytes:
+    # The previous path: ORM objects, from_orm per row, then FastAPI's jsonable_encoder and json.dumps
+    with session_scope() as db:
+        vulnerabilities = db.query(Vulnerability).filter(Vulnerability.scan_id == scan_id).all()
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", DeprecationWarning)
+            models = [VulnerabilityModel.from_orm(v) for v in vulnerabilities]
+        return json.dumps(jsonable_encoder(models)).encode()
+
+def bulk(scan_id: int) -> bytes:
+    with session_scope() as db:
+        return vulnerability_list_adapter.dump_json(load_vulnerabilities(db, scan_id))
+
+def measure(label: str, func, scan_id: int, rows: int, repeats: int) -> float:
+    func(scan_id) # Warm-up
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        func(scan_id)
+        timings.append(time.perf_counter() - started)
+    best = min(timings)
+    print(f"{label:<12} best {best * 1000:8.1f} ms   {rows / best:12,.0f} rows/s")
+    return best
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    init_db()
+    scan_id = seed(rows)
+    assert json.loads(per_row_orm(scan_id)) == json.loads(bulk(scan_id)), "Both paths must produce the same payload"
+    print(f"Serializing {rows} findings, best of {repeats}:")
+    before = measure("per-row ORM", per_row_orm, scan_id, rows, repeats)
+    after = measure("bulk", bulk, scan_id, rows, repeats)
+    print(f"Speed-up: {before / after:.1f}x")
+
+if __name__ == "__main__":
+    try:
+        main()
+    finally:
+        shutil.rmtree(_db_dir, ignore_errors=True)
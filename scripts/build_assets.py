@@ -0,0 +1,78 @@
+"""
+Builds the UI's static assets into app/static/dist:
+- app.css: Tailwind compiled from assets/css/app.css for the classes the templates use, minified
+- alpine.js, list.js: the minified builds shipped in the npm packages
+
+Each file is written under a content-hashed name (app.3f2a9c1d0b7e.css) and listed in
+manifest.json, which the app reads to link them (services/assets.py). Files from earlier
+builds are removed.
+
+Needs the packages pinned in assets/package.json: npm install --prefix assets (`make assets`).
+Runs once at build time; the app itself never compiles CSS or fetches anything from a CDN.
+"""
+import argparse
+import hashlib
+import json
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+ASSETS_DIR = ROOT / "assets"
+NODE_MODULES = ASSETS_DIR / "node_modules"
+OUTPUT_DIR = ROOT / "app" / "static" / "dist"
+MANIFEST_NAME = "manifest.json"
+
+# Logical name -> prebuilt, minified file from the npm package
+VENDOR_FILES = {
+    "alpine.js": NODE_MODULES / "alpinejs" / "dist" / "cdn.min.js",
+    "list.js": NODE_MODULES / "list.js" / "dist" / "list.min.js",
+}
+
+def build_css(tailwind_bin: str, target: Path):
+    subprocess.run(
+        [tailwind_bin, "--config", str(ASSETS_DIR / "tailwind.config.js"), "--input", str(ASSETS_DIR / "css" / "app.css"),
+         "--output", str(target), "--minify"],
+        check=True,
+    )
+
+def hashed_name(name: str, content: bytes) -> str:
+    stem, _, extension = name.rpartition(".")
+    return f"{stem}.{hashlib.sha256(content).hexdigest()[:12]}.{extension}"
+
+def write_assets(sources: dict, output_dir: Path) -> dict:
+    """Copies each source under its hashed name, then writes the manifest and removes stale files."""
+    output_dir.mkdir(parents=True, exist_ok=True)
+    manifest = {}
+    for name, path in sources.items():
+        content = path.read_bytes()
+        manifest[name] = hashed_name(name, content)
+        (output_dir / manifest[name]).write_bytes(content)
+    (output_dir / MANIFEST_NAME).write_text(json.dumps(manifest, indent=2, sort_keys=True) + "\n")
+    for path in output_dir.iterdir():
+        if path.name != MANIFEST_NAME and path.name not in manifest.values():
+            path.unlink()
+    return manifest
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tailwind", default=str(NODE_MODULES / ".bin" / "tailwindcss"),
+                        help="Tailwind CLI (npm package or standalone binary)")
+    parser.add_argument("--output", type=Path, default=OUTPUT_DIR)
+    args = parser.parse_args()
+
+    missing = [str(path) for path in VENDOR_FILES.values() if not path.exists()]
+    if missing:
+        print(f"Missing {', '.join(missing)}; run `npm install --prefix assets` first.", file=sys.stderr)
+        return 1
+    with tempfile.TemporaryDirectory() as build_dir:
+        css = Path(build_dir) / "app.css"
+        build_css(args.tailwind, css)
+        manifest = write_assets({"app.css": css, **VENDOR_FILES}, args.output)
+    for name, built in sorted(manifest.items()):
+        print(f"{name:10} -> {built} ({(args.output / built).stat().st_size} bytes)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
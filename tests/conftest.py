@@ -0,0 +1,56 @@
+import os
+import tempfile
+
+# The app reads its configuration at import time, so point it at a scratch database and spool
+# before anything under app/ is imported
+_SCRATCH_DIR = tempfile.mkdtemp(prefix="grypeui-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_SCRATCH_DIR}/test.db"
+os.environ["SPOOL_DIR"] = os.path.join(_SCRATCH_DIR, "spool")
+os.environ["ANALYSIS_PROCESSES"] = "0"
+
+import pytest
+
+from database import SessionLocal, engine, init_db
+from models.database import Base, Image
+
+@pytest.fixture(scope="session", autouse=True)
+def database():
+    init_db()
+    yield engine
+
+@pytest.fixture
+def db(database):
+    """A session on an empty database; every table is emptied again after the test."""
+    session = SessionLocal()
+    yield session
+    session.close()
+    with database.begin() as conn:
+        for table in reversed(Base.metadata.sorted_tables):
+            conn.execute(table.delete())
+
+@pytest.fixture
+def image(db):
+    """An image row to scan."""
+    db_image = Image(id="ab12cd34ef56", name="demo", tag="1.0", digest="sha256:ab12cd34ef56")
+    db.add(db_image)
+    db.commit()
+    return db_image
+
+def grype_match(vulnerability_id: str, package: str, version: str, severity: str = "High",
+                fixed_in: str = None, description: str = None, cvss: float = None) -> dict:
+    """One entry of Grype's JSON `matches`."""
+    vulnerability = {
+        "id": vulnerability_id,
+        "severity": severity,
+        "fix": {"versions": [fixed_in] if fixed_in else [], "state": "fixed" if fixed_in else "not-fixed"},
+    }
+    if description:
+        vulnerability["description"] = description
+    if cvss is not None:
+        vulnerability["cvss"] = [{"metrics": {"baseScore": cvss}}]
+    return {"vulnerability": vulnerability, "artifact": {"name": package, "version": version}}
+
+@pytest.fixture
+def scan_data():
+    """Builds Grype output from grype_match() keyword sets: scan_data(dict(...), dict(...))."""
+    return lambda *matches: {"matches": [grype_match(**match) for match in matches]}
@@ -0,0 +1,117 @@
+from collections import Counter
+from itertools import product
+
+import pytest
+
+from models.database import Image
+from services import findings_store, scanner
+from services.analytics import FleetAnalytics
+from services.findings_store import load_findings
+from services.scanner import ingest_scan_data
+
+IMAGES = {
+    "image0000001": (
+        dict(vulnerability_id="CVE-2024-0001", package="openssl", version="3.0.1", severity="Critical", fixed_in="3.0.2"),
+        dict(vulnerability_id="CVE-2024-0002", package="curl", version="7.9", severity="High"),
+        dict(vulnerability_id="CVE-2024-0003", package="bash", version="5.1", severity="Low"),
+    ),
+    "image0000002": (
+        dict(vulnerability_id="CVE-2024-0001", package="openssl", version="3.0.1", severity="Critical", fixed_in="3.0.2"),
+        dict(vulnerability_id="CVE-2024-0004", package="openssl", version="3.0.1", severity="Medium"),
+        dict(vulnerability_id="CVE-2024-0002", package="curl", version="8.1", severity="High", fixed_in="8.2"),
+    ),
+    "image0000003": (
+        dict(vulnerability_id="CVE-2024-0005", package="tar", version="1.34", severity="Negligible"),
+    ),
+}
+
+@pytest.fixture
+def analytics():
+    return FleetAnalytics()
+
+@pytest.fixture
+def fleet(db, scan_data):
+    """Images scanned with IMAGES' findings; returns their scan summaries."""
+    summaries = {}
+    for image_id, matches in IMAGES.items():
+        db.add(Image(id=image_id, name=image_id, tag="latest", digest=f"sha256:{image_id}"))
+        db.commit()
+        summaries[image_id] = ingest_scan_data(db, image_id, scan_data(*matches))
+    return summaries
+
+def _groups(result) -> dict:
+    return {tuple(group[dimension] for dimension in result["group_by"]): (group["findings"], group["images"])
+            for group in result["groups"]}
+
+def _expected(db, fleet, group_by, severities=None, fixable=None, image_ids=None) -> dict:
+    """The same aggregation done row by row over the stored findings."""
+    findings, images = Counter(), {}
+    for image_id, summary in fleet.items():
+        if image_ids is not None and image_id not in image_ids:
+            continue
+        for finding in load_findings(db, summary.scan_id):
+            if severities and finding.severity not in severities:
+                continue
+            if fixable is not None and bool(finding.fixed_version) != fixable:
+                continue
+            values = {"package": finding.package_name, "version": finding.installed_version,
+                      "vulnerability": finding.vulnerability_id, "severity": finding.severity,
+                      "fixable": bool(finding.fixed_version), "image": image_id}
+            key = tuple(values[dimension] for dimension in group_by)
+            findings[key] += 1
+            images.setdefault(key, set()).add(image_id)
+    return {key: (count, len(images[key])) for key, count in findings.items()}
+
+@pytest.mark.parametrize("group_by", [
+    [], ["package"], ["severity"], ["fixable"], ["image"], ["severity", "fixable"], ["package", "severity"],
+    ["package", "version"], ["vulnerability", "image"], ["package", "severity", "fixable"],
+])
+def test_group_by_matches_row_by_row_counts(db, fleet, analytics, group_by):
+    result = analytics.query(db, group_by)
+    assert _groups(result) == _expected(db, fleet, group_by)
+    assert (result["rows_scanned"], result["images_in_store"]) == (7, 3)
+
+@pytest.mark.parametrize("severities, fixable, image_ids", list(product(
+    [None, ["critical", "high"], ["negligible"]], [None, True, False], [None, ["image0000002"], []],
+)))
+def test_filters_match_row_by_row_counts(db, fleet, analytics, severities, fixable, image_ids):
+    result = analytics.query(db, ["package"], severities=severities, fixable=fixable, image_ids=image_ids)
+    expected = _expected(db, fleet, ["package"], severities, fixable, image_ids)
+    assert _groups(result) == expected
+    assert result["matched"] == sum(count for count, _ in expected.values())
+
+def test_groups_are_ordered_by_findings_and_limited(db, fleet, analytics):
+    result = analytics.query(db, ["package"], limit=2)
+    assert [(group["package"], group["findings"], group["images"]) for group in result["groups"]] == [
+        ("openssl", 3, 2), ("curl", 2, 2)]
+    assert result["total_groups"] == 4
+
+def test_only_the_latest_scan_of_each_image_counts(db, fleet, analytics, scan_data):
+    analytics.query(db, ["package"])
+    ingest_scan_data(db, "image0000003", scan_data(
+        dict(vulnerability_id="CVE-2024-0006", package="zlib", version="1.2", severity="High")))
+    analytics.mark_stale("image0000003")
+
+    groups = _groups(analytics.query(db, ["package"], image_ids=["image0000003"]))
+
+    assert groups == {("zlib",): (1, 1)}
+
+def test_scans_from_other_processes_are_picked_up_on_sync(db, fleet, analytics, scan_data, monkeypatch):
+    analytics.query(db, [])
+    ingest_scan_data(db, "image0000003", scan_data())
+    assert _groups(analytics.query(db, [], image_ids=["image0000003"])) == {(): (1, 1)} # Not synced yet
+
+    monkeypatch.setattr("services.analytics.ANALYTICS_SYNC_SECONDS", 0)
+
+    assert _groups(analytics.query(db, [], image_ids=["image0000003"])) == {}
+
+def test_delta_stored_latest_scans_are_rebuilt(db, image, analytics, scan_data, monkeypatch):
+    monkeypatch.setattr(findings_store, "FINDINGS_STORAGE", "delta")
+    monkeypatch.setattr(scanner, "FINDINGS_STORAGE", "delta")
+    matches = IMAGES["image0000002"]
+    ingest_scan_data(db, image.id, scan_data(*matches))
+    ingest_scan_data(db, image.id, scan_data(*matches[1:]))
+
+    groups = _groups(analytics.query(db, ["vulnerability"]))
+
+    assert groups == {("CVE-2024-0004",): (1, 1), ("CVE-2024-0002",): (1, 1)}
@@ -0,0 +1,99 @@
+import csv
+import io
+import json
+from datetime import datetime
+
+import pytest
+
+from models.database import Image, Scan
+from services import export, findings_store, scanner
+from services.export import export_scope_exists, stream_findings
+from services.scanner import ingest_scan_data
+
+OPENSSL = dict(vulnerability_id="CVE-2024-0001", package="openssl", version="3.0.1", severity="Critical", fixed_in="3.0.2",
+               description="Buffer overflow")
+CURL = dict(vulnerability_id="CVE-2024-0002", package="curl", version="7.9", severity="High")
+BASH = dict(vulnerability_id="CVE-2024-0003", package="bash", version="5.1", severity="Low")
+
+@pytest.fixture
+def delta_storage(monkeypatch):
+    monkeypatch.setattr(findings_store, "FINDINGS_STORAGE", "delta")
+    monkeypatch.setattr(scanner, "FINDINGS_STORAGE", "delta")
+    monkeypatch.setattr(findings_store, "FINDINGS_SNAPSHOT_EVERY", 2)
+
+def _ndjson(scope, key=None) -> list:
+    return [json.loads(line) for line in "".join(stream_findings(scope, key)).splitlines()]
+
+def _scan_order(rows) -> list:
+    return [scan_id for n, scan_id in enumerate(row["scan_id"] for row in rows) if n == 0 or rows[n - 1]["scan_id"] != scan_id]
+
+def test_scan_export_as_ndjson(db, image, scan_data):
+    summary = ingest_scan_data(db, image.id, scan_data(OPENSSL, CURL), "v6@build-1")
+
+    rows = _ndjson("scan", summary.scan_id)
+
+    assert [(row["vulnerability_id"], row["severity"], row["fixed_version"]) for row in rows] == [
+        ("CVE-2024-0001", "critical", "3.0.2"), ("CVE-2024-0002", "high", None)]
+    first = rows[0]
+    assert (first["image_id"], first["image_name"], first["image_tag"], first["grype_db_build"]) == (
+        image.id, "demo", "1.0", "v6@build-1")
+    assert first["description"] == "Buffer overflow"
+    assert datetime.fromisoformat(first["scan_time"]) == db.get(Scan, summary.scan_id).scan_time
+
+def test_scan_export_as_csv(db, image, scan_data):
+    summary = ingest_scan_data(db, image.id, scan_data(OPENSSL, CURL))
+
+    rows = list(csv.reader(io.StringIO("".join(stream_findings("scan", summary.scan_id, "csv")))))
+
+    assert rows[0] == list(export.EXPORT_COLUMNS)
+    assert [row[7] for row in rows[1:]] == ["CVE-2024-0001", "CVE-2024-0002"]
+    assert rows[2][11] == "" # No fixed version
+
+def test_export_is_streamed_in_batches(db, image, scan_data, monkeypatch):
+    monkeypatch.setattr(export, "EXPORT_BATCH_ROWS", 2)
+    summary = ingest_scan_data(db, image.id, scan_data(OPENSSL, CURL, BASH))
+
+    chunks = list(stream_findings("scan", summary.scan_id, "csv"))
+
+    assert [chunk.count("\n") for chunk in chunks] == [1, 2, 1] # Header, then one chunk per batch
+
+def test_image_export_follows_scan_order_across_storage_modes(db, image, scan_data, delta_storage):
+    packages = [dict(vulnerability_id=f"CVE-2025-{n:04d}", package=f"lib{n}", version="1.0", severity="Medium")
+                for n in range(6)]
+    # Each scan drops one finding, so every other one is stored as a small delta
+    scans = [ingest_scan_data(db, image.id, scan_data(*packages[n:])).scan_id for n in range(4)]
+    assert [db.get(Scan, scan_id).findings_storage for scan_id in scans] == ["full", "delta", "full", "delta"]
+
+    rows = _ndjson("image", image.id)
+
+    assert _scan_order(rows) == scans
+    assert [len([row for row in rows if row["scan_id"] == scan_id]) for scan_id in scans] == [6, 5, 4, 3]
+    assert sorted(row["package_name"] for row in rows if row["scan_id"] == scans[3]) == ["lib3", "lib4", "lib5"]
+
+def test_image_export_leaves_out_unfinished_scans(db, image, scan_data):
+    completed = ingest_scan_data(db, image.id, scan_data(OPENSSL)).scan_id
+    db.add(Scan(image_id=image.id, scan_time=datetime.utcnow(), scan_status="running"))
+    db.commit()
+    assert _scan_order(_ndjson("image", image.id)) == [completed]
+
+def test_latest_export_takes_the_highest_scan_id_of_each_image(db, image, scan_data):
+    db.add(Image(id="98fe76dc54ba", name="other", tag="2.0"))
+    db.commit()
+    ingest_scan_data(db, image.id, scan_data(OPENSSL))
+    other = ingest_scan_data(db, "98fe76dc54ba", scan_data(BASH)).scan_id
+    latest = ingest_scan_data(db, image.id, scan_data(CURL)).scan_id
+    # A clock step back leaves the newest scan with an older scan_time; it is still the latest
+    db.get(Scan, latest).scan_time = datetime(2020, 1, 1)
+    db.commit()
+
+    rows = _ndjson("latest")
+
+    assert sorted(_scan_order(rows)) == sorted([other, latest])
+    assert {row["vulnerability_id"] for row in rows} == {"CVE-2024-0002", "CVE-2024-0003"}
+
+def test_scope_checks(db, image):
+    assert export_scope_exists(db, "image", image.id)
+    assert not export_scope_exists(db, "image", "missing")
+    assert not export_scope_exists(db, "scan", 12345)
+    with pytest.raises(ValueError):
+        list(stream_findings("fleet"))
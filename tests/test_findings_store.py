@@ -0,0 +1,118 @@
+from collections import Counter
+from datetime import datetime, timedelta
+
+import pytest
+
+from models.database import Scan, Vulnerability
+from services import findings_store, scanner
+from services.findings_store import Finding, copy_findings, load_findings, store_findings
+
+BASE_FINDINGS = [
+    Finding("CVE-2024-0001", "critical", "openssl", "3.0.1", "3.0.2", "bad openssl"),
+    Finding("CVE-2024-0002", "low", "zlib", "1.2", None, None),
+    Finding("CVE-2024-0003", "high", "curl", "7.9", "8.0", "curl overflow"),
+    Finding("CVE-2024-0004", "medium", "bash", "5.1", None, None),
+]
+
+@pytest.fixture
+def delta_storage(monkeypatch):
+    monkeypatch.setattr(findings_store, "FINDINGS_STORAGE", "delta")
+    monkeypatch.setattr(scanner, "FINDINGS_STORAGE", "delta")
+    monkeypatch.setattr(findings_store, "FINDINGS_SNAPSHOT_EVERY", 3)
+
+def _vulnerabilities(findings):
+    return [Vulnerability(**finding._asdict()) for finding in findings]
+
+def _store(db, image, findings, base_scan_id=None, minutes=0):
+    scan = Scan(image_id=image.id, scan_status="completed", scan_time=datetime(2026, 1, 1) + timedelta(minutes=minutes))
+    db.add(scan)
+    db.flush()
+    storage = store_findings(db, scan, _vulnerabilities(findings), base_scan_id)
+    db.commit()
+    return scan, storage
+
+def _stored_changes(db, scan_id):
+    return Counter(row.change for row in db.query(Vulnerability.change).filter(Vulnerability.scan_id == scan_id))
+
+def test_full_storage_writes_every_finding(db, image):
+    scan, storage = _store(db, image, BASE_FINDINGS)
+    assert storage == "full"
+    assert _stored_changes(db, scan.id) == {None: len(BASE_FINDINGS)}
+    assert Counter(load_findings(db, scan.id)) == Counter(BASE_FINDINGS)
+
+def test_delta_stores_only_changes_and_reconstructs_the_scan(db, image, delta_storage):
+    first, _ = _store(db, image, BASE_FINDINGS)
+    fixed = BASE_FINDINGS[1:] # openssl fixed
+    new = fixed + [Finding("CVE-2025-0005", "high", "libxml2", "2.9", "2.10", None)]
+    second, storage = _store(db, image, new, base_scan_id=first.id, minutes=1)
+
+    assert storage == "delta"
+    assert (second.base_scan_id, second.delta_depth) == (first.id, 1)
+    assert _stored_changes(db, second.id) == {"+": 1, "-": 1}
+    assert Counter(load_findings(db, second.id)) == Counter(new)
+    # The base scan reads back unchanged
+    assert Counter(load_findings(db, first.id)) == Counter(BASE_FINDINGS)
+
+def test_delta_chain_applies_every_delta_in_order(db, image, delta_storage):
+    versions = [
+        BASE_FINDINGS,
+        BASE_FINDINGS[:3],
+        BASE_FINDINGS[:3] + [Finding("CVE-2025-0006", "low", "tar", "1.34", None, None)],
+    ]
+    previous = None
+    for minutes, findings in enumerate(versions):
+        scan, _ = _store(db, image, findings, previous.id if previous else None, minutes)
+        previous = scan
+    assert [scan.findings_storage for scan in db.query(Scan).order_by(Scan.id)] == ["full", "delta", "delta"]
+    assert Counter(load_findings(db, previous.id)) == Counter(versions[-1])
+
+def test_delta_keeps_duplicate_findings(db, image, delta_storage):
+    # Grype can report the same package twice (e.g. two copies of a jar); counts must survive a delta
+    duplicated = BASE_FINDINGS + [BASE_FINDINGS[0]]
+    first, _ = _store(db, image, duplicated)
+    second, storage = _store(db, image, duplicated + [BASE_FINDINGS[1]], base_scan_id=first.id, minutes=1)
+    assert storage == "delta"
+    assert Counter(load_findings(db, second.id)) == Counter(duplicated + [BASE_FINDINGS[1]])
+
+def test_snapshot_is_written_every_n_scans(db, image, delta_storage):
+    previous = None
+    storages = []
+    for minutes in range(5):
+        findings = BASE_FINDINGS + [Finding(f"CVE-2025-{minutes:04d}", "low", "tar", "1.34", None, None)]
+        previous, storage = _store(db, image, findings, previous.id if previous else None, minutes)
+        storages.append((storage, previous.delta_depth))
+    assert storages == [("full", 0), ("delta", 1), ("delta", 2), ("full", 0), ("delta", 1)]
+
+def test_large_change_is_stored_in_full(db, image, delta_storage):
+    first, _ = _store(db, image, BASE_FINDINGS)
+    replaced = [Finding(f"CVE-2025-{n:04d}", "low", "tar", "1.34", None, None) for n in range(3)]
+    second, storage = _store(db, image, replaced, base_scan_id=first.id, minutes=1)
+    assert storage == "full"
+    assert second.base_scan_id is None
+    assert Counter(load_findings(db, second.id)) == Counter(replaced)
+
+def test_copy_in_delta_mode_is_an_empty_delta(db, image, delta_storage):
+    source, _ = _store(db, image, BASE_FINDINGS)
+    target = Scan(image_id=image.id, scan_status="completed", scan_time=datetime(2026, 1, 2))
+    db.add(target)
+    db.flush()
+    copy_findings(db, source.id, target)
+    db.commit()
+    assert (target.findings_storage, target.base_scan_id) == ("delta", source.id)
+    assert _stored_changes(db, target.id) == {}
+    assert Counter(load_findings(db, target.id)) == Counter(BASE_FINDINGS)
+
+def test_ingest_in_delta_mode_reconstructs_grype_output(db, image, delta_storage, scan_data):
+    first = scanner.ingest_scan_data(db, image.id, scan_data(
+        dict(vulnerability_id="CVE-2024-0001", package="openssl", version="3.0.1", severity="Critical", fixed_in="3.0.2"),
+        dict(vulnerability_id="CVE-2024-0002", package="zlib", version="1.2", severity="Low"),
+        dict(vulnerability_id="CVE-2024-0003", package="curl", version="7.9", severity="High", fixed_in="8.0"),
+    ))
+    second = scanner.ingest_scan_data(db, image.id, scan_data(
+        dict(vulnerability_id="CVE-2024-0002", package="zlib", version="1.2", severity="Low"),
+        dict(vulnerability_id="CVE-2024-0003", package="curl", version="7.9", severity="High", fixed_in="8.0"),
+    ))
+    stored = db.get(Scan, second.scan_id)
+    assert (stored.findings_storage, stored.base_scan_id) == ("delta", first.scan_id)
+    assert sorted(finding.vulnerability_id for finding in load_findings(db, second.scan_id)) == ["CVE-2024-0002", "CVE-2024-0003"]
+    assert (second.critical_count, second.high_count, second.low_count) == (0, 1, 1)
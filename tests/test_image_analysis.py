@@ -0,0 +1,70 @@
+from datetime import datetime
+
+import pytest
+
+from models.database import Image
+from services import scan_pipeline
+from services.scan_pipeline import lookup_image_analysis, run_image_analysis
+
+OLD_DIGEST = "sha256:" + "1" * 64
+NEW_DIGEST = "sha256:" + "2" * 64
+
+@pytest.fixture
+def inspected(monkeypatch):
+    """Makes the Docker inspect of any image report the given content digest; counts the inspects."""
+    calls = []
+    def respond(digest: str):
+        def inspect_image(image_name):
+            calls.append(image_name)
+            return {"Id": digest, "Config": {"User": "1000"}}
+        monkeypatch.setattr(scan_pipeline, "inspect_image", inspect_image)
+    respond.calls = calls
+    return respond
+
+@pytest.fixture
+def analyzed_image(db, image):
+    image.digest = image.analyzed_digest = OLD_DIGEST
+    image.last_analyzed_at = datetime(2026, 3, 1)
+    image.is_shellless = True
+    db.commit()
+    return image
+
+def test_lookup_answers_from_results_for_the_same_content(db, analyzed_image, inspected):
+    inspected(OLD_DIGEST)
+    analysis, _ = lookup_image_analysis(db, analyzed_image.id)
+    assert (analysis.source, analysis.is_shellless, analysis.is_rootless) == ("cached", True, True)
+
+def test_moved_tag_keeps_the_scanned_digest_until_results_are_stored(db, analyzed_image, inspected):
+    inspected(NEW_DIGEST)
+
+    analysis, details = lookup_image_analysis(db, analyzed_image.id)
+
+    assert analysis is None
+    assert details["Id"] == NEW_DIGEST
+    db.expire_all()
+    assert db.get(Image, analyzed_image.id).digest == OLD_DIGEST
+
+def test_results_shared_from_an_image_with_the_new_content_move_the_digest(db, analyzed_image, inspected):
+    db.add(Image(id="98fe76dc54ba", name="other", tag="2.0", digest=NEW_DIGEST, analyzed_digest=NEW_DIGEST,
+                 last_analyzed_at=datetime(2026, 3, 2), is_shellless=False))
+    db.commit()
+    inspected(NEW_DIGEST)
+
+    analysis, _ = lookup_image_analysis(db, analyzed_image.id)
+
+    assert (analysis.source, analysis.is_shellless) == ("shared", False)
+    db.expire_all()
+    assert db.get(Image, analyzed_image.id).digest == NEW_DIGEST
+
+def test_analysis_after_a_miss_reuses_the_inspect(db, analyzed_image, inspected, monkeypatch):
+    inspected(NEW_DIGEST)
+    monkeypatch.setattr(scan_pipeline, "run_analysis", lambda func, image_name, work_dir: {
+        "is_rootless": True, "is_shellless": False, "is_distroless": False, "details": {"image_id": NEW_DIGEST}})
+    _, details = lookup_image_analysis(db, analyzed_image.id)
+
+    analysis = run_image_analysis(db, analyzed_image.id, details=details)
+
+    assert analysis.source == "analyzed"
+    assert len(inspected.calls) == 1
+    db.expire_all()
+    assert db.get(Image, analyzed_image.id).digest == NEW_DIGEST
@@ -0,0 +1,199 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from models.database import Scan, ScanJob
+from services import scan_pipeline
+from services.checkpoints import record_checkpoint, touch_checkpoints
+from services.job_queue import (
+    cancel_job, claim_next_job, complete_job, enqueue_job, fail_job, heartbeat_job, job_cancel_requested,
+)
+from services.scan_pipeline import ScanPipelineError, recover_image_scan
+
+def _expire_lease(db, job_id):
+    db.query(ScanJob).filter(ScanJob.id == job_id).update({"lease_expires_at": datetime.utcnow() - timedelta(seconds=1)})
+    db.commit()
+
+def test_enqueue_returns_the_active_job_of_an_image(db, image):
+    job = enqueue_job(db, image.id)
+    duplicate = enqueue_job(db, image.id, force=True, priority=5)
+    assert duplicate.id == job.id
+    assert (duplicate.force, duplicate.priority) == (True, 5)
+    assert enqueue_job(db, image.id, kind="rematch").id != job.id
+
+def test_claim_takes_highest_priority_first(db, image):
+    low = enqueue_job(db, image.id, kind="rematch")
+    high = enqueue_job(db, image.id, priority=1)
+    assert claim_next_job(db, "worker-a").id == high.id
+    assert claim_next_job(db, "worker-a").id == low.id
+    assert claim_next_job(db, "worker-a") is None
+
+def test_claimed_job_is_not_claimed_again_while_its_lease_holds(db, image):
+    job = enqueue_job(db, image.id)
+    claimed = claim_next_job(db, "worker-a")
+    assert (claimed.id, claimed.status, claimed.lease_owner, claimed.attempts) == (job.id, "claimed", "worker-a", 1)
+    assert claim_next_job(db, "worker-b") is None
+    assert heartbeat_job(db, job.id, "worker-a")
+
+def test_expired_lease_is_reclaimed_by_another_worker(db, image):
+    job = enqueue_job(db, image.id)
+    claim_next_job(db, "worker-a")
+    _expire_lease(db, job.id)
+
+    reclaimed = claim_next_job(db, "worker-b")
+
+    assert (reclaimed.id, reclaimed.lease_owner, reclaimed.attempts) == (job.id, "worker-b", 2)
+    # The previous holder finds out on its next heartbeat and cannot record a result
+    assert not heartbeat_job(db, job.id, "worker-a")
+    assert not complete_job(db, job.id, "worker-a", None)
+    assert not fail_job(db, job.id, "worker-a", "late failure")
+    assert complete_job(db, job.id, "worker-b", None)
+    db.expire_all()
+    assert db.get(ScanJob, job.id).status == "done"
+
+def test_job_is_given_up_after_max_attempts(db, image):
+    job = enqueue_job(db, image.id)
+    for worker in ("worker-a", "worker-b", "worker-c"):
+        assert claim_next_job(db, worker).id == job.id
+        _expire_lease(db, job.id)
+
+    assert claim_next_job(db, "worker-d") is None
+    db.expire_all()
+    job = db.get(ScanJob, job.id)
+    assert job.status == "failed"
+    assert "3 attempts" in job.error
+
+def test_concurrent_claims_hand_a_job_to_one_worker(database, db, image):
+    from database import SessionLocal
+    job = enqueue_job(db, image.id)
+    winners = []
+    start = threading.Barrier(4)
+
+    def claim(worker_id):
+        session = SessionLocal()
+        try:
+            start.wait()
+            claimed = claim_next_job(session, worker_id)
+            if claimed is not None:
+                winners.append((claimed.id, worker_id))
+        finally:
+            session.close()
+
+    threads = [threading.Thread(target=claim, args=(f"worker-{n}",)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert [job_id for job_id, _ in winners] == [job.id]
+    db.expire_all()
+    assert db.get(ScanJob, job.id).lease_owner == winners[0][1]
+
+def test_cancel_closes_a_queued_job(db, image):
+    job = enqueue_job(db, image.id)
+    assert cancel_job(db, job.id).status == "cancelled"
+    assert claim_next_job(db, "worker-a") is None
+
+def test_cancel_flags_a_claimed_job_for_its_worker(db, image):
+    job = enqueue_job(db, image.id)
+    claim_next_job(db, "worker-a")
+
+    cancel_job(db, job.id)
+
+    assert job_cancel_requested(db, job.id)
+    assert fail_job(db, job.id, "worker-a", "Job was cancelled", status="cancelled")
+    db.expire_all()
+    assert db.get(ScanJob, job.id).status == "cancelled"
+
+def test_cancelled_job_of_a_lost_worker_is_closed_instead_of_reclaimed(db, image):
+    job = enqueue_job(db, image.id)
+    claim_next_job(db, "worker-a")
+    cancel_job(db, job.id)
+    _expire_lease(db, job.id)
+
+    assert claim_next_job(db, "worker-b") is None
+    db.expire_all()
+    assert db.get(ScanJob, job.id).status == "cancelled"
+
+@pytest.fixture
+def running_scan(db, image):
+    def start(checkpoint: bool = True):
+        scan = Scan(image_id=image.id, scan_time=datetime.utcnow(), scan_status="running")
+        db.add(scan)
+        db.commit()
+        if checkpoint:
+            record_checkpoint(db, scan.id, image.id, "cataloged")
+        return scan.id
+    return start
+
+@pytest.fixture
+def resumed(monkeypatch):
+    """Records the scans recover_image_scan resumes instead of running the pipeline."""
+    scan_ids = []
+    monkeypatch.setattr(scan_pipeline, "_TAKEOVER_POLL_SECONDS", 0.05)
+    monkeypatch.setattr(scan_pipeline, "resume_scan", lambda db, scan_id, timeout=None: scan_ids.append(scan_id) or scan_id)
+    return scan_ids
+
+def test_recover_resumes_a_checkpoint_left_by_a_dead_worker(db, image, running_scan, resumed):
+    since = datetime.utcnow() - timedelta(minutes=1)
+    scan_id = running_scan()
+    time.sleep(0.3) # No heartbeat touched the checkpoint since
+
+    assert recover_image_scan(db, image.id, since, lease_seconds=0.2) == scan_id
+    assert resumed == [scan_id]
+
+@pytest.fixture
+def previous_holder():
+    """Keeps touching a scan's checkpoint from another session, as the heartbeat of its worker does."""
+    from database import SessionLocal
+    stop = threading.Event()
+    threads = []
+
+    def hold(scan_id: int):
+        def beat():
+            session = SessionLocal()
+            try:
+                while not stop.wait(0.05):
+                    touch_checkpoints(session, [scan_id])
+            finally:
+                session.close()
+        threads.append(threading.Thread(target=beat))
+        threads[-1].start()
+        return stop
+
+    yield hold
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+def test_recover_waits_for_a_checkpoint_still_being_updated(db, image, running_scan, resumed, previous_holder):
+    since = datetime.utcnow() - timedelta(minutes=1)
+    scan_id = running_scan()
+    # The previous holder stops shortly, as a worker does once its heartbeat sees the lost lease
+    threading.Timer(0.3, previous_holder(scan_id).set).start()
+    started = time.monotonic()
+
+    assert recover_image_scan(db, image.id, since, lease_seconds=0.5) == scan_id
+    assert time.monotonic() - started >= 0.3
+    assert resumed == [scan_id]
+
+def test_recover_gives_up_on_a_scan_that_keeps_being_worked_on(db, image, running_scan, resumed, previous_holder):
+    since = datetime.utcnow() - timedelta(minutes=1)
+    scan_id = running_scan()
+    previous_holder(scan_id)
+
+    with pytest.raises(ScanPipelineError) as error:
+        recover_image_scan(db, image.id, since, lease_seconds=0.2)
+    assert error.value.status_code == 409
+    assert resumed == []
+
+def test_recover_fails_scans_without_a_checkpoint(db, image, running_scan, resumed):
+    since = datetime.utcnow() - timedelta(minutes=1)
+    scan_id = running_scan(checkpoint=False)
+
+    assert recover_image_scan(db, image.id, since, lease_seconds=0.2) is None
+    db.expire_all()
+    assert db.get(Scan, scan_id).scan_status == "failed"
+    assert resumed == []
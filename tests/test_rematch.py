@@ -0,0 +1,108 @@
+import gzip
+
+import pytest
+
+from models.database import Image, ImageInventory, Scan, VulnerabilityCounts
+from services import rematch, scanner
+from services.grype_db import grype_db_manager
+from services.rematch import rematch_fleet, rematch_image
+from services.scanner import ScanCancelled, ScanTimedOut, ingest_scan_data
+
+MATCHES = (
+    dict(vulnerability_id="CVE-2024-0001", package="openssl", version="3.0.1", severity="Critical", fixed_in="3.0.2"),
+    dict(vulnerability_id="CVE-2024-0002", package="curl", version="7.9", severity="High"),
+    dict(vulnerability_id="CVE-2024-0003", package="bash", version="5.1", severity="Low"),
+)
+
+@pytest.fixture
+def inventory(db, image):
+    db.add(ImageInventory(image_id=image.id, image_digest=image.digest, sbom=gzip.compress(b"{}"), package_count=3))
+    db.commit()
+
+@pytest.fixture
+def grype(monkeypatch):
+    """Makes the re-match see the given Grype output, matched against the given DB build."""
+    def respond(scan_data: dict, build: str):
+        monkeypatch.setattr(grype_db_manager, "current_build", build)
+        monkeypatch.setattr(rematch, "run_grype", lambda scan_target, log_name: (scan_data, build))
+    return respond
+
+@pytest.fixture
+def high_threshold(monkeypatch):
+    monkeypatch.setattr(scanner, "FINDINGS_MIN_SEVERITY", "high")
+
+def _counts(db, scan_id):
+    return db.query(VulnerabilityCounts).filter(VulnerabilityCounts.scan_id == scan_id).one()
+
+def test_rematch_with_threshold_detects_change_below_it(db, image, inventory, grype, scan_data, high_threshold):
+    first = ingest_scan_data(db, image.id, scan_data(*MATCHES), "v6@build-1")
+    # Only a summarized (low) finding changes: it gained a fix
+    changed = list(MATCHES)
+    changed[2] = dict(MATCHES[2], fixed_in="5.2")
+    grype(scan_data(*changed), "v6@build-2")
+
+    outcome = rematch_image(db, image.id)
+
+    assert outcome["status"] == "changed"
+    assert outcome["scan_id"] != first.scan_id
+    assert (_counts(db, first.scan_id).fixable, _counts(db, outcome["scan_id"]).fixable) == (1, 2)
+
+def test_rematch_with_threshold_detects_added_summarized_finding(db, image, inventory, grype, scan_data, high_threshold):
+    ingest_scan_data(db, image.id, scan_data(*MATCHES), "v6@build-1")
+    grype(scan_data(*MATCHES, dict(vulnerability_id="CVE-2025-0009", package="tar", version="1.34", severity="Negligible")),
+          "v6@build-2")
+
+    outcome = rematch_image(db, image.id)
+
+    assert outcome["status"] == "changed"
+    assert _counts(db, outcome["scan_id"]).negligible == 1
+
+def test_rematch_with_threshold_and_same_findings_is_unchanged(db, image, inventory, grype, scan_data, high_threshold):
+    first = ingest_scan_data(db, image.id, scan_data(*MATCHES), "v6@build-1")
+    grype(scan_data(*reversed(MATCHES)), "v6@build-2")
+
+    outcome = rematch_image(db, image.id)
+
+    assert (outcome["status"], outcome["scan_id"]) == ("unchanged", first.scan_id)
+    assert db.query(Scan).count() == 1
+
+def test_unchanged_rematch_records_revalidation_beside_the_matched_build(db, image, inventory, grype, scan_data):
+    first = ingest_scan_data(db, image.id, scan_data(*MATCHES), "v6@build-1")
+    grype(scan_data(*MATCHES), "v6@build-2")
+
+    assert rematch_image(db, image.id)["status"] == "unchanged"
+
+    db.expire_all()
+    scan = db.get(Scan, first.scan_id)
+    assert (scan.grype_db_build, scan.revalidated_build) == ("v6@build-1", "v6@build-2")
+    assert scan.revalidated_at is not None
+
+def test_revalidated_scan_holds_for_the_new_build(db, image, inventory, grype, scan_data):
+    first = ingest_scan_data(db, image.id, scan_data(*MATCHES), "v6@build-1")
+    grype(scan_data(*MATCHES), "v6@build-2")
+    rematch_image(db, image.id)
+
+    # Nothing left to do against the same build, and scans of the same content may reuse it
+    assert rematch_image(db, image.id)["status"] == "up_to_date"
+    assert scanner.find_reusable_scan(db, image.digest, "v6@build-2").id == first.scan_id
+    assert scanner.find_reusable_scan(db, image.digest, "v6@build-1").id == first.scan_id
+    assert scanner.find_reusable_scan(db, image.digest, "v6@build-3") is None
+
+@pytest.mark.parametrize("error", [ScanTimedOut("Grype did not finish within 1s"), ScanCancelled("Scan was cancelled")])
+def test_fleet_rematch_carries_on_past_a_failed_image(db, image, inventory, scan_data, monkeypatch, error):
+    db.add(Image(id="98fe76dc54ba", name="other", tag="2.0", digest="sha256:98fe76dc54ba"))
+    db.add(ImageInventory(image_id="98fe76dc54ba", image_digest="sha256:98fe76dc54ba", sbom=gzip.compress(b"{}"),
+                          package_count=1))
+    db.commit()
+    monkeypatch.setattr(grype_db_manager, "current_build", "v6@build-2")
+
+    def run_grype(scan_target, log_name):
+        if image.id in log_name:
+            raise error
+        return scan_data(*MATCHES), "v6@build-2"
+    monkeypatch.setattr(rematch, "run_grype", run_grype)
+
+    summary = rematch_fleet(db)
+
+    assert (summary["failed"], summary["failed_image_ids"]) == (1, [image.id])
+    assert (summary["changed"], summary["changed_image_ids"]) == (1, ["98fe76dc54ba"])
@@ -0,0 +1,174 @@
+import json
+import os
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from models.database import Image, Scan, ScanCheckpoint
+from services import scan_pipeline, scanner
+from services.checkpoints import record_checkpoint
+from services.inventory import store_inventory
+from services.scan_pipeline import ScanPipelineError, recover_image_scan, resume_interrupted_scans, resume_scan
+from services.spool import spool_manager
+
+MATCHES = (
+    dict(vulnerability_id="CVE-2024-0001", package="openssl", version="3.0.1", severity="Critical", fixed_in="3.0.2"),
+    dict(vulnerability_id="CVE-2024-0002", package="curl", version="7.9", severity="High"),
+)
+SBOM = json.dumps({"artifacts": [{"type": "deb", "name": "openssl", "version": "3.0.1"}]}).encode()
+
+@pytest.fixture
+def grype_runs(monkeypatch, scan_data):
+    """Answers Grype runs with MATCHES and records their scan targets."""
+    targets = []
+    def run_grype(scan_target, log_name, scan_id=None, timeout=None):
+        targets.append(scan_target)
+        return scan_data(*MATCHES), "v6@build-2"
+    monkeypatch.setattr(scanner, "run_grype", run_grype)
+    return targets
+
+@pytest.fixture
+def exports(monkeypatch, image):
+    """Stands in for the export and analysis of the image (and Syft); records the exports made."""
+    made = []
+    def run_analysis(func, image_name, work_dir):
+        made.append(image_name)
+        tar_path = os.path.join(work_dir, "image.tar")
+        open(tar_path, "wb").close()
+        return {"is_rootless": True, "is_shellless": True, "is_distroless": False, "error": None,
+                "details": {"image_id": image.digest}, "image_tar_path": tar_path}
+    monkeypatch.setattr(scan_pipeline, "run_analysis", run_analysis)
+    monkeypatch.setattr(scan_pipeline, "catalog_image_archive", lambda tar_path, log_name=None: SBOM)
+    return made
+
+@pytest.fixture
+def stages(monkeypatch):
+    """Stages checkpointed by the pipeline, in order."""
+    recorded = []
+    def record(db, scan_id, image_id, stage, **kwargs):
+        recorded.append(stage)
+        return record_checkpoint(db, scan_id, image_id, stage, **kwargs)
+    monkeypatch.setattr(scan_pipeline, "record_checkpoint", record)
+    monkeypatch.setattr(scanner, "record_checkpoint", record)
+    return recorded
+
+@pytest.fixture
+def interrupted(db, image):
+    """A running scan a previous process left at the given checkpoint stage."""
+    def leave(stage: str, image_id: str = None, **kwargs) -> int:
+        scan = Scan(image_id=image_id or image.id, scan_time=datetime.utcnow(), scan_status="running")
+        db.add(scan)
+        db.commit()
+        record_checkpoint(db, scan.id, scan.image_id, stage, **kwargs)
+        return scan.id
+    return leave
+
+def _assert_completed(db, scan_id, build="v6@build-2"):
+    db.expire_all()
+    scan = db.get(Scan, scan_id)
+    assert (scan.scan_status, scan.grype_db_build) == ("completed", build)
+    assert db.get(ScanCheckpoint, scan_id) is None
+
+def test_matched_scan_is_only_ingested(db, interrupted, grype_runs, scan_data):
+    scan_id = interrupted("matched", scan_data=scan_data(*MATCHES), grype_db_build="v6@build-1")
+
+    summary = resume_scan(db, scan_id)
+
+    assert (summary.scan_id, summary.critical_count, summary.high_count) == (scan_id, 1, 1)
+    assert grype_runs == []
+    _assert_completed(db, scan_id, build="v6@build-1")
+
+def test_cataloged_scan_matches_the_stored_inventory(db, image, interrupted, grype_runs, exports):
+    store_inventory(db, image.id, image.digest, SBOM)
+    db.commit()
+    scan_id = interrupted("cataloged")
+
+    resume_scan(db, scan_id)
+
+    assert [target.split(":", 1)[0] for target in grype_runs] == ["sbom"]
+    assert exports == []
+    _assert_completed(db, scan_id)
+
+def test_exported_scan_matches_the_kept_archive(db, image, interrupted, grype_runs, exports):
+    left_behind = os.path.join(spool_manager.main_root.path, "grypeui-spool-deadbeef0000-0001")
+    os.makedirs(left_behind)
+    open(os.path.join(left_behind, "image.tar"), "wb").close()
+    scan_id = interrupted("exported", artifact_path=left_behind)
+
+    resume_scan(db, scan_id)
+
+    assert len(grype_runs) == 1 and grype_runs[0].startswith("docker-archive:")
+    assert grype_runs[0].endswith("image.tar")
+    assert exports == []
+    assert not os.path.exists(grype_runs[0].split(":", 1)[1]) # The adopted spool is released afterwards
+    _assert_completed(db, scan_id)
+
+def test_exported_scan_whose_archive_is_gone_starts_over(db, interrupted, grype_runs, exports):
+    scan_id = interrupted("exported", artifact_path="/nonexistent/spool")
+
+    resume_scan(db, scan_id)
+
+    assert len(exports) == 1
+    _assert_completed(db, scan_id)
+
+def test_started_scan_runs_the_remaining_stages(db, interrupted, grype_runs, exports, stages):
+    scan_id = interrupted("started")
+
+    resume_scan(db, scan_id)
+
+    assert stages == ["analyzed", "cataloged", "matched"]
+    assert len(exports) == 1
+    _assert_completed(db, scan_id)
+    assert db.get(Image, db.get(Scan, scan_id).image_id).is_shellless is True
+
+def test_forced_scan_stays_forced_when_resumed(db, image, interrupted, grype_runs, exports):
+    # Analysis and inventory are current, so only a forced scan exports the image again
+    image.analyzed_digest, image.last_analyzed_at = image.digest, datetime.utcnow()
+    store_inventory(db, image.id, image.digest, SBOM)
+    db.commit()
+    forced = interrupted("started", forced=True)
+    unforced = interrupted("started")
+
+    resume_scan(db, forced)
+    assert len(exports) == 1
+    resume_scan(db, unforced)
+    assert len(exports) == 1
+
+def test_scan_without_a_checkpoint_cannot_be_resumed(db, image):
+    scan = Scan(image_id=image.id, scan_time=datetime.utcnow(), scan_status="running")
+    db.add(scan)
+    db.commit()
+    with pytest.raises(ScanPipelineError) as error:
+        resume_scan(db, scan.id)
+    assert error.value.status_code == 404
+
+def test_startup_resumes_checkpointed_scans_and_fails_the_rest(db, image, interrupted, grype_runs, scan_data):
+    resumable = interrupted("matched", scan_data=scan_data(*MATCHES), grype_db_build="v6@build-1")
+    orphan = interrupted("cataloged", image_id="gone0000000") # Its image was deleted since
+    abandoned = Scan(image_id=image.id, scan_time=datetime.utcnow(), scan_status="running")
+    db.add(abandoned)
+    db.commit()
+
+    summary = resume_interrupted_scans(db)
+
+    assert (summary["resumed"], summary["failed"], summary["abandoned"]) == (1, 1, 1)
+    assert summary["failed_scan_ids"] == [orphan]
+    db.expire_all()
+    assert [db.get(Scan, scan_id).scan_status for scan_id in (resumable, orphan, abandoned.id)] == [
+        "completed", "failed", "failed"]
+    assert db.query(ScanCheckpoint).count() == 0
+
+def test_recovered_job_resumes_its_newest_checkpoint(db, image, interrupted, grype_runs, scan_data, monkeypatch):
+    monkeypatch.setattr(scan_pipeline, "_TAKEOVER_POLL_SECONDS", 0.05)
+    since = datetime.utcnow() - timedelta(minutes=1)
+    superseded = interrupted("cataloged")
+    newest = interrupted("matched", scan_data=scan_data(*MATCHES), grype_db_build="v6@build-1")
+    time.sleep(0.3) # The worker that left them stopped heartbeating
+
+    summary = recover_image_scan(db, image.id, since, lease_seconds=0.2)
+
+    assert summary.scan_id == newest
+    _assert_completed(db, newest, build="v6@build-1")
+    assert db.get(Scan, superseded).scan_status == "failed"
+    assert grype_runs == []
@@ -0,0 +1,170 @@
+import os
+import stat
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+import pytest
+
+from models.database import Scan, ScanCheckpoint
+from services import scan_pipeline, scanner
+from services.grype_db import grype_db_manager
+from services.image_analyzer import CANCEL_MARKER, ContainerAnalyzer, ExportCancelled
+from services.scan_pipeline import ScanPipelineError, prepare_image_scan
+from services.scanner import (
+    ScanCancelled, ScanTimedOut, cancel_scan, run_grype, set_scan_work_dir, start_scan, untrack_scan,
+)
+
+GRYPE_OUTPUT = {"matches": []}
+
+@pytest.fixture
+def fake_grype(tmp_path, monkeypatch):
+    """Puts a `grype` on the PATH of scan sessions that runs the given Python body."""
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+
+    def install(body: str):
+        script = bin_dir / "grype"
+        script.write_text(f"#!{sys.executable}\nimport json, sys, time\n{body}\n")
+        script.chmod(script.stat().st_mode | stat.S_IEXEC)
+
+    @contextmanager
+    def scan_session():
+        yield {**os.environ, "PATH": f"{bin_dir}{os.pathsep}{os.environ['PATH']}"}, "v6@build-1"
+
+    monkeypatch.setattr(grype_db_manager, "scan_session", scan_session)
+    install(f"print(json.dumps({GRYPE_OUTPUT!r}))")
+    return install
+
+@pytest.fixture
+def tracked_scan(db, image):
+    """A running Scan row registered with this process, as the pipeline creates it."""
+    scan = start_scan(db, image.id)
+    yield scan.id
+    untrack_scan(scan.id)
+
+def _cancel_later(scan_id: int, reason: str, delay: float = 0.3):
+    timer = threading.Timer(delay, cancel_scan, args=(scan_id, reason))
+    timer.start()
+    return timer
+
+def test_grype_output_and_db_build_are_returned(fake_grype):
+    assert run_grype("sbom:/tmp/none.json", "test") == (GRYPE_OUTPUT, "v6@build-1")
+
+def test_grype_run_past_its_timeout_is_killed(fake_grype):
+    fake_grype("time.sleep(30)")
+    started = time.monotonic()
+    with pytest.raises(ScanTimedOut, match="within 0.3s"):
+        run_grype("sbom:/tmp/none.json", "test", timeout=0.3)
+    assert time.monotonic() - started < 10
+
+def test_cancel_kills_a_running_grype(fake_grype, tracked_scan):
+    fake_grype("time.sleep(30)")
+    _cancel_later(tracked_scan, "Stopped by the user")
+    started = time.monotonic()
+    with pytest.raises(ScanCancelled, match="Stopped by the user"):
+        run_grype("sbom:/tmp/none.json", "test", scan_id=tracked_scan)
+    assert time.monotonic() - started < 10
+
+def test_cancel_before_grype_starts_stops_it_right_away(fake_grype, tracked_scan):
+    fake_grype("time.sleep(30)")
+    cancel_scan(tracked_scan, "Cancelled early")
+    started = time.monotonic()
+    with pytest.raises(ScanCancelled, match="Cancelled early"):
+        run_grype("sbom:/tmp/none.json", "test", scan_id=tracked_scan)
+    assert time.monotonic() - started < 10
+
+def test_grype_failure_without_a_cancel_is_reported_as_such(fake_grype, tracked_scan):
+    fake_grype("sys.stderr.write('db is corrupt'); sys.exit(2)")
+    with pytest.raises(subprocess.CalledProcessError):
+        run_grype("sbom:/tmp/none.json", "test", scan_id=tracked_scan)
+
+def test_cancel_of_an_unknown_scan_is_refused():
+    assert cancel_scan(987654, "nobody runs it") is False
+
+def test_timed_out_scan_is_recorded_as_timed_out(db, image, fake_grype, tracked_scan):
+    fake_grype("time.sleep(30)")
+    with pytest.raises(ScanTimedOut):
+        scanner.scan_image(image.id, db, sbom_path="/tmp/none.json", timeout=0.3, scan_id=tracked_scan)
+    db.expire_all()
+    assert db.get(Scan, tracked_scan).scan_status == "timed_out"
+    assert db.get(ScanCheckpoint, tracked_scan) is None
+
+def test_cancelled_scan_is_recorded_as_cancelled(db, image, fake_grype, tracked_scan):
+    fake_grype("time.sleep(30)")
+    _cancel_later(tracked_scan, "Stopped by the user")
+    with pytest.raises(ScanCancelled):
+        scanner.scan_image(image.id, db, sbom_path="/tmp/none.json", timeout=0, scan_id=tracked_scan)
+    db.expire_all()
+    scan = db.get(Scan, tracked_scan)
+    assert scan.scan_status == "cancelled"
+    assert scan.scan_details.startswith("Stopped by the user")
+
+class _SavedImage:
+    """Stands in for the Docker client: `docker save` output arrives in chunks."""
+    def __init__(self, on_chunk=None, chunks: int = 5):
+        self.written = 0
+        self._on_chunk = on_chunk
+        self._chunks = chunks
+        self.api = self
+
+    def get_image(self, image_id):
+        for n in range(self._chunks):
+            if self._on_chunk:
+                self._on_chunk(n)
+            self.written += 1
+            yield b"x" * 1024
+
+def _analyzer(client) -> ContainerAnalyzer:
+    analyzer = ContainerAnalyzer.__new__(ContainerAnalyzer) # Without connecting to Docker
+    analyzer.client = client
+    return analyzer
+
+def test_export_writes_the_whole_archive(tmp_path):
+    path = _analyzer(_SavedImage())._export_image_tar("sha256:abc", str(tmp_path))
+    assert os.path.getsize(path) == 5 * 1024
+
+def test_export_stops_at_the_cancel_marker(tmp_path, tracked_scan):
+    set_scan_work_dir(tracked_scan, str(tmp_path))
+    client = _SavedImage(on_chunk=lambda n: n == 2 and cancel_scan(tracked_scan, "Stopped by the user"))
+
+    with pytest.raises(ExportCancelled):
+        _analyzer(client)._export_image_tar("sha256:abc", str(tmp_path))
+
+    assert client.written == 3
+    assert os.path.getsize(tmp_path / "image.tar") == 2 * 1024
+
+def test_work_dir_of_an_already_cancelled_scan_is_marked(tmp_path, tracked_scan):
+    cancel_scan(tracked_scan, "Stopped by the user")
+    set_scan_work_dir(tracked_scan, str(tmp_path))
+    assert (tmp_path / CANCEL_MARKER).exists()
+
+def test_cancel_between_stages_ends_the_scan_before_exporting(db, image, tracked_scan, monkeypatch):
+    exports = []
+    monkeypatch.setattr(scan_pipeline, "run_analysis", lambda *args: exports.append(args))
+    cancel_scan(tracked_scan, "Stopped by the user")
+
+    with pytest.raises(ScanPipelineError) as error:
+        prepare_image_scan(db, image.id, force=True, scan_id=tracked_scan)
+
+    assert (error.value.status_code, error.value.detail) == (409, "Stopped by the user")
+    assert exports == []
+    db.expire_all()
+    assert db.get(Scan, tracked_scan).scan_status == "cancelled"
+
+def test_cancel_during_analysis_discards_its_results(db, image, tracked_scan, monkeypatch):
+    def analyze(func, image_name, work_dir):
+        cancel_scan(tracked_scan, "Stopped by the user") # Arrives while the export runs
+        return {"is_rootless": True, "is_shellless": True, "details": {"image_id": "sha256:abc"},
+                "image_tar_path": os.path.join(work_dir, "image.tar")}
+    monkeypatch.setattr(scan_pipeline, "run_analysis", analyze)
+
+    with pytest.raises(ScanPipelineError) as error:
+        prepare_image_scan(db, image.id, force=True, scan_id=tracked_scan)
+
+    assert error.value.status_code == 409
+    db.expire_all()
+    assert db.get(Scan, tracked_scan).scan_status == "cancelled"
+    assert image.last_analyzed_at is None
@@ -0,0 +1,78 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from models.database import Image, Scan
+from services.grype_db import grype_db_manager
+from services.job_queue import enqueue_job
+from services.scheduler import plan_due_scans
+
+NOW = datetime(2026, 3, 10, 12)
+MAX_AGE = timedelta(hours=24)
+
+@pytest.fixture(autouse=True)
+def new_db_build(monkeypatch):
+    # Every stored scan was matched against an older build, so age alone decides
+    monkeypatch.setattr(grype_db_manager, "current_build", "v6@build-2")
+
+@pytest.fixture
+def fleet(db):
+    """Adds images: fleet(image_id, size, scanned_hours_ago=None, status="completed")."""
+    def add(image_id: str, size: int = None, scanned_hours_ago: float = None, status: str = "completed",
+            digest: str = None, build: str = "v6@build-1"):
+        if db.get(Image, image_id) is None:
+            db.add(Image(id=image_id, name=image_id, tag="latest", size=size, digest=digest))
+        if scanned_hours_ago is not None:
+            db.add(Scan(image_id=image_id, scan_time=NOW - timedelta(hours=scanned_hours_ago), scan_status=status,
+                        grype_db_build=build, image_digest=digest))
+        db.commit()
+        return image_id
+    return add
+
+def _plan(db, running, **kwargs):
+    return plan_due_scans(db, set(running), MAX_AGE, now=NOW, **kwargs)
+
+def test_recent_scans_are_not_due(db, fleet):
+    fresh = fleet("fresh", scanned_hours_ago=3)
+    stale = fleet("stale", scanned_hours_ago=30)
+    assert _plan(db, [fresh, stale]) == [stale]
+
+def test_never_scanned_images_go_first(db, fleet):
+    stale = fleet("stale", size=10, scanned_hours_ago=24 * 30)
+    never = fleet("never", size=10_000_000)
+    assert _plan(db, [stale, never]) == [never, stale]
+
+def test_smaller_image_in_the_same_staleness_bucket_goes_first(db, fleet):
+    # Both are one whole period overdue; the smaller one is slightly less stale but quicker to cover
+    large = fleet("large", size=5_000_000_000, scanned_hours_ago=40)
+    small = fleet("small", size=50_000_000, scanned_hours_ago=30)
+    assert _plan(db, [large, small]) == [small, large]
+
+def test_images_overdue_by_more_periods_go_first(db, fleet):
+    small = fleet("small", size=50_000_000, scanned_hours_ago=30)
+    large = fleet("large", size=5_000_000_000, scanned_hours_ago=24 * 3 + 1)
+    unknown = fleet("unknown", scanned_hours_ago=31) # Images without a size sort last in their bucket
+    assert _plan(db, [small, large, unknown]) == [large, small, unknown]
+
+def test_current_results_are_not_rescanned(db, fleet):
+    same = fleet("same", scanned_hours_ago=30, digest="sha256:aa", build="v6@build-2")
+    moved = fleet("moved", scanned_hours_ago=30, digest="sha256:bb", build="v6@build-2")
+    db.get(Image, moved).digest = "sha256:cc"
+    db.commit()
+    assert _plan(db, [same, moved]) == [moved]
+
+def test_busy_and_recently_failed_images_are_left_out(db, fleet):
+    running = fleet("running", scanned_hours_ago=30)
+    fleet(running, scanned_hours_ago=0.1, status="running")
+    failed = fleet("failed", scanned_hours_ago=30)
+    fleet(failed, scanned_hours_ago=0.5, status="failed")
+    queued = fleet("queued", scanned_hours_ago=30)
+    enqueue_job(db, queued)
+    excluded = fleet("excluded", scanned_hours_ago=30)
+    due = fleet("due", scanned_hours_ago=30)
+    assert _plan(db, [running, failed, queued, excluded, due], exclude=frozenset([excluded])) == [due]
+
+def test_only_running_images_are_planned_by_default(db, fleet):
+    fleet("stopped", scanned_hours_ago=30)
+    running = fleet("running", scanned_hours_ago=30)
+    assert _plan(db, [running]) == [running]
@@ -0,0 +1,117 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import text
+
+from database import SEARCH_INDEX_TABLE, search_index_available
+from models.database import Image, ImageFinding, Scan, Vulnerability
+from services import search
+from services.scanner import ingest_scan_data
+from services.search import backfill_search_history, fts_match_expression, search_findings
+
+OPENSSL = dict(vulnerability_id="CVE-2024-0001", package="openssl", version="3.0.1", severity="Critical",
+               fixed_in="3.0.2", description="Buffer overflow in the X.509 parser")
+CURL = dict(vulnerability_id="CVE-2024-0002", package="curl", version="7.9", severity="High",
+            description="Cookie injection via crafted headers")
+
+def _indexed(db, expression: str) -> list:
+    return sorted(row.rowid for row in db.execute(
+        text(f"SELECT rowid FROM {SEARCH_INDEX_TABLE} WHERE {SEARCH_INDEX_TABLE} MATCH :match"), {"match": expression}))
+
+def _finding_id(db, vulnerability_id: str) -> int:
+    return db.query(ImageFinding.id).filter(ImageFinding.vulnerability_id == vulnerability_id).scalar()
+
+def test_fts_index_is_available_on_sqlite():
+    assert search_index_available()
+
+def test_triggers_index_inserted_findings(db, image, scan_data):
+    ingest_scan_data(db, image.id, scan_data(OPENSSL, CURL))
+
+    assert _indexed(db, '"overflow"') == [_finding_id(db, "CVE-2024-0001")]
+    assert _indexed(db, '"CVE-2024-0002"') == [_finding_id(db, "CVE-2024-0002")]
+    assert _indexed(db, '"curl" "7.9"') == [_finding_id(db, "CVE-2024-0002")]
+
+def test_triggers_reindex_a_changed_description(db, image, scan_data):
+    ingest_scan_data(db, image.id, scan_data(OPENSSL))
+    ingest_scan_data(db, image.id, scan_data(dict(OPENSSL, description="Use after free in the TLS stack")))
+
+    finding_id = _finding_id(db, "CVE-2024-0001")
+    assert _indexed(db, '"overflow"') == []
+    assert _indexed(db, '"free"') == [finding_id]
+    assert db.get(ImageFinding, finding_id).scan_count == 2
+
+def test_triggers_drop_deleted_findings(db, image, scan_data):
+    ingest_scan_data(db, image.id, scan_data(OPENSSL, CURL))
+
+    db.query(ImageFinding).filter(ImageFinding.vulnerability_id == "CVE-2024-0001").delete()
+    db.commit()
+
+    assert _indexed(db, '"openssl"') == []
+    assert _indexed(db, '"curl"') == [_finding_id(db, "CVE-2024-0002")]
+
+def test_search_matches_every_term_by_prefix(db, image, scan_data):
+    ingest_scan_data(db, image.id, scan_data(OPENSSL, CURL))
+
+    result = search_findings(db, "opens overfl")
+
+    assert (result.indexed, result.total) == (True, 1)
+    assert [finding.vulnerability_id for finding in result.results[0].findings] == ["CVE-2024-0001"]
+    assert search_findings(db, "openssl cookie").total == 0
+
+def test_search_reports_whether_the_latest_scan_has_the_finding(db, image, scan_data):
+    ingest_scan_data(db, image.id, scan_data(OPENSSL, CURL))
+    latest = ingest_scan_data(db, image.id, scan_data(CURL))
+
+    fixed = search_findings(db, "CVE-2024-0001").results[0]
+    present = search_findings(db, "CVE-2024-0002").results[0]
+
+    assert (fixed.in_latest_scan, fixed.latest_scan_id) == (False, latest.scan_id)
+    assert fixed.findings[0].in_latest_scan is False
+    assert (present.in_latest_scan, present.last_matched_scan_id) == (True, latest.scan_id)
+
+def test_search_pages_images_most_recently_seen_first(db, scan_data):
+    for n in range(5):
+        db.add(Image(id=f"image{n:07d}", name=f"app{n}", tag="latest", digest=f"sha256:{n}"))
+    db.commit()
+    for n in range(5):
+        ingest_scan_data(db, f"image{n:07d}", scan_data(OPENSSL))
+
+    pages = [search_findings(db, "openssl", limit=2, offset=offset) for offset in (0, 2, 4)]
+
+    assert {page.total for page in pages} == {5}
+    assert [[result.image_name for result in page.results] for page in pages] == [
+        ["app4:latest", "app3:latest"], ["app2:latest", "app1:latest"], ["app0:latest"]]
+
+def test_search_lists_a_few_findings_per_image(db, image, scan_data, monkeypatch):
+    monkeypatch.setattr(search, "SEARCH_SAMPLE_FINDINGS", 2)
+    ingest_scan_data(db, image.id, scan_data(*[
+        dict(vulnerability_id=f"CVE-2024-10{n:02d}", package="openssl", version="3.0.1", severity="High") for n in range(4)]))
+
+    result = search_findings(db, "openssl").results[0]
+
+    assert result.matches == 4
+    assert len(result.findings) == 2
+
+def test_search_without_terms_returns_none(db):
+    assert search_findings(db, "   ") is None
+
+@pytest.mark.parametrize("query", ['"openssl', "openssl OR curl", "NEAR(openssl)", "open*ssl", "-curl"])
+def test_query_syntax_is_matched_as_text(db, image, scan_data, query):
+    ingest_scan_data(db, image.id, scan_data(OPENSSL, CURL))
+    # Never an FTS5 syntax error, whatever the user types
+    assert search_findings(db, query).total in (0, 1)
+
+def test_match_expression_quotes_each_term():
+    assert fts_match_expression(["CVE-2024-0001", 'say"hi']) == '"CVE-2024-0001"* "say""hi"*'
+
+def test_backfill_builds_history_from_stored_scans(db, image):
+    scan = Scan(image_id=image.id, scan_time=datetime(2026, 3, 1), scan_status="completed")
+    db.add(scan)
+    db.flush()
+    db.add(Vulnerability(scan_id=scan.id, vulnerability_id="CVE-2024-0001", severity="critical",
+                         package_name="openssl", installed_version="3.0.1", description="Buffer overflow"))
+    db.commit()
+
+    assert backfill_search_history() == 1
+    assert search_findings(db, "overflow").total == 1
+    assert backfill_search_history() == 0
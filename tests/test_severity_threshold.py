@@ -0,0 +1,66 @@
+import pytest
+
+from models.database import Scan, Vulnerability, VulnerabilityCounts
+from services import scanner
+from services.scanner import find_reusable_scan, findings_fingerprint, ingest_scan_data
+
+MATCHES = (
+    dict(vulnerability_id="CVE-2024-0001", package="openssl", version="3.0.1", severity="Critical", fixed_in="3.0.2", cvss=9.8),
+    dict(vulnerability_id="CVE-2024-0002", package="curl", version="7.9", severity="High", fixed_in="8.0"),
+    dict(vulnerability_id="CVE-2024-0003", package="zlib", version="1.2", severity="Medium", fixed_in="1.3"),
+    dict(vulnerability_id="CVE-2024-0004", package="bash", version="5.1", severity="Low"),
+    dict(vulnerability_id="CVE-2024-0005", package="tar", version="1.34", severity="Negligible"),
+)
+
+@pytest.fixture
+def min_severity(monkeypatch):
+    def configure(severity: str):
+        monkeypatch.setattr(scanner, "FINDINGS_MIN_SEVERITY", severity)
+    return configure
+
+def test_threshold_stores_details_only_at_or_above_it(db, image, scan_data, min_severity):
+    min_severity("high")
+    summary = ingest_scan_data(db, image.id, scan_data(*MATCHES), "v6@build-1")
+
+    stored = db.query(Vulnerability.vulnerability_id, Vulnerability.severity).filter(Vulnerability.scan_id == summary.scan_id).all()
+    assert sorted(severity for _, severity in stored) == ["critical", "high"]
+    assert db.get(Scan, summary.scan_id).detail_min_severity == "high"
+    assert summary.summarized_severities == ["medium", "low", "negligible", "unknown"]
+
+def test_threshold_still_counts_every_finding(db, image, scan_data, min_severity):
+    min_severity("high")
+    summary = ingest_scan_data(db, image.id, scan_data(*MATCHES), "v6@build-1")
+
+    counts = db.query(VulnerabilityCounts).filter(VulnerabilityCounts.scan_id == summary.scan_id).one()
+    assert (counts.critical, counts.high, counts.medium, counts.low, counts.negligible) == (1, 1, 1, 1, 1)
+    # Fixability and risk aggregates cover the summarized findings too
+    assert counts.fixable == 3
+    assert counts.fixable_medium == 1
+    assert (summary.medium_count, summary.low_count) == (1, 1)
+
+def test_default_threshold_stores_everything(db, image, scan_data):
+    summary = ingest_scan_data(db, image.id, scan_data(*MATCHES), "v6@build-1")
+    assert db.query(Vulnerability).filter(Vulnerability.scan_id == summary.scan_id).count() == len(MATCHES)
+    assert db.get(Scan, summary.scan_id).detail_min_severity is None
+    assert summary.summarized_severities == []
+
+def test_fingerprint_covers_summarized_findings(scan_data):
+    base = findings_fingerprint(scan_data(*MATCHES))
+    low_fixed = list(MATCHES)
+    low_fixed[3] = dict(MATCHES[3], fixed_in="5.2")
+    negligible_gone = MATCHES[:4]
+    rescored = list(MATCHES)
+    rescored[0] = dict(MATCHES[0], cvss=7.0)
+
+    assert findings_fingerprint(scan_data(*reversed(MATCHES))) == base # Order does not matter
+    assert findings_fingerprint(scan_data(*low_fixed)) != base
+    assert findings_fingerprint(scan_data(*negligible_gone)) != base
+    assert findings_fingerprint(scan_data(*rescored)) != base
+
+def test_scans_with_another_threshold_are_not_reused(db, image, scan_data, min_severity):
+    min_severity("high")
+    summary = ingest_scan_data(db, image.id, scan_data(*MATCHES), "v6@build-1")
+    assert find_reusable_scan(db, image.digest, "v6@build-1").id == summary.scan_id
+
+    min_severity("unknown")
+    assert find_reusable_scan(db, image.digest, "v6@build-1") is None
@@ -0,0 +1,104 @@
+from datetime import date, datetime
+
+import pytest
+
+from models.database import Image, Scan, SeverityTrend, VulnerabilityCounts
+from services.scanner import ingest_scan_data
+from services.trends import FLEET_KEY, backfill_trends, get_trend, record_scan_trend
+
+@pytest.fixture
+def other_image(db):
+    db_image = Image(id="98fe76dc54ba", name="other", tag="2.0", digest="sha256:98fe76dc54ba")
+    db.add(db_image)
+    db.commit()
+    return db_image
+
+@pytest.fixture
+def scan_on(db):
+    """Completes a scan of an image at the given time and rolls it up."""
+    def complete(image, scan_time: datetime, fixable: int = 0, **counts):
+        scan = Scan(image_id=image.id, scan_time=scan_time, scan_status="completed")
+        db.add(scan)
+        db.flush()
+        record_scan_trend(db, scan, counts, fixable)
+        db.commit()
+        return scan
+    return complete
+
+def _bucket(db, key, day):
+    return db.get(SeverityTrend, (key, day))
+
+def _counts(bucket, *fields):
+    return tuple(bucket[field] if isinstance(bucket, dict) else getattr(bucket, field) for field in fields)
+
+def test_scan_fills_image_and_fleet_buckets(db, image, other_image, scan_on):
+    scan = scan_on(image, datetime(2026, 3, 1, 9), critical=2, high=1, fixable=2)
+    scan_on(other_image, datetime(2026, 3, 1, 10), high=3)
+
+    image_bucket = _bucket(db, image.id, date(2026, 3, 1))
+    assert _counts(image_bucket, "critical", "high", "fixable", "scan_id") == (2, 1, 2, scan.id)
+    assert _counts(_bucket(db, FLEET_KEY, date(2026, 3, 1)), "critical", "high", "fixable") == (2, 4, 2)
+
+def test_rescan_on_the_same_day_replaces_the_image_bucket(db, image, other_image, scan_on):
+    scan_on(other_image, datetime(2026, 3, 1, 8), high=3)
+    scan_on(image, datetime(2026, 3, 1, 9), critical=2, high=1)
+    scan_on(image, datetime(2026, 3, 1, 18), high=1, low=4)
+
+    assert _counts(_bucket(db, image.id, date(2026, 3, 1)), "critical", "high", "low") == (0, 1, 4)
+    # The fleet moved by the difference, so the earlier scan of the image is not counted twice
+    assert _counts(_bucket(db, FLEET_KEY, date(2026, 3, 1)), "critical", "high", "low") == (0, 4, 4)
+
+def test_fleet_bucket_of_a_new_day_starts_from_the_last_posture(db, image, other_image, scan_on):
+    scan_on(image, datetime(2026, 3, 1), critical=2)
+    scan_on(other_image, datetime(2026, 3, 1), high=3)
+    scan_on(image, datetime(2026, 3, 4), critical=1)
+
+    assert _counts(_bucket(db, FLEET_KEY, date(2026, 3, 4)), "critical", "high") == (1, 3)
+    assert _counts(_bucket(db, FLEET_KEY, date(2026, 3, 1)), "critical", "high") == (2, 3)
+
+def test_unchanged_rescan_leaves_the_fleet_alone(db, image, scan_on):
+    scan_on(image, datetime(2026, 3, 1), high=2)
+    scan_on(image, datetime(2026, 3, 2), high=2)
+
+    assert _bucket(db, image.id, date(2026, 3, 2)) is not None
+    assert _bucket(db, FLEET_KEY, date(2026, 3, 2)) is None
+
+def test_get_trend_carries_postures_forward(db, image, scan_on):
+    scan_on(image, datetime(2026, 2, 20), critical=5) # Before the window: the starting posture
+    scan_on(image, datetime(2026, 3, 3), critical=1, high=2)
+
+    trend = get_trend(db, image.id, days=5, today=date(2026, 3, 5))
+
+    assert [bucket["day"] for bucket in trend] == [date(2026, 3, day) for day in range(1, 6)]
+    assert [_counts(bucket, "critical", "high") for bucket in trend] == [(5, 0), (5, 0), (1, 2), (1, 2), (1, 2)]
+    assert get_trend(db, FLEET_KEY, days=2, today=date(2026, 3, 5))[-1]["critical"] == 1
+
+def test_get_trend_without_history_is_empty_buckets(db, image):
+    trend = get_trend(db, image.id, days=3, today=date(2026, 3, 5))
+    assert len(trend) == 3
+    assert all(bucket["critical"] == bucket["fixable"] == 0 for bucket in trend)
+
+def test_ingest_rolls_the_scan_up(db, image, scan_data):
+    summary = ingest_scan_data(db, image.id, scan_data(
+        dict(vulnerability_id="CVE-2024-0001", package="openssl", version="3.0.1", severity="Critical", fixed_in="3.0.2"),
+        dict(vulnerability_id="CVE-2024-0002", package="curl", version="7.9", severity="High"),
+    ))
+    today = db.get(Scan, summary.scan_id).scan_time.date()
+
+    assert _counts(_bucket(db, image.id, today), "critical", "high", "fixable") == (1, 1, 1)
+    assert _counts(_bucket(db, FLEET_KEY, today), "critical", "high", "fixable") == (1, 1, 1)
+
+def test_backfill_builds_roll_ups_from_scan_history(db, image, other_image):
+    for image_id, scan_time, critical in ((image.id, datetime(2026, 3, 1), 2), (other_image.id, datetime(2026, 3, 1), 1),
+                                          (image.id, datetime(2026, 3, 2), 0)):
+        scan = Scan(image_id=image_id, scan_time=scan_time, scan_status="completed")
+        db.add(scan)
+        db.flush()
+        db.add(VulnerabilityCounts(scan_id=scan.id, critical=critical, high=0, medium=0, low=0, negligible=0, unknown=0))
+    db.commit()
+
+    assert backfill_trends() == 3
+    assert _counts(_bucket(db, FLEET_KEY, date(2026, 3, 1)), "critical") == (3,)
+    assert _counts(_bucket(db, FLEET_KEY, date(2026, 3, 2)), "critical") == (1,)
+    # Roll-ups that already exist are left as they are
+    assert backfill_trends() == 0